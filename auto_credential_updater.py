@@ -14,6 +14,15 @@ from typing import Dict, List, Optional, Set, Tuple
 import threading
 import signal
 import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import metrics
+import profiler
+from fs_watcher import DirectoryWatcher
+import log_aggregator
+from config_repository import get_config_repository
+from state_store import get_state_store
 
 # Import protonvpn_service để lấy credentials
 try:
@@ -30,17 +39,53 @@ MIN_SERVICE_AGE_SECONDS = MIN_SERVICE_AGE_MINUTES * 60
 ERROR_CHECK_INTERVAL_SECONDS = 30
 CLEANUP_INTERVAL_SECONDS = 300  # 5 minutes
 RECENT_ERROR_THRESHOLD_SECONDS = 300  # 5 minutes
+TOKEN_EXPIRY_MARGIN_SECONDS = 300  # Cập nhật khi token còn < 5 phút
+FULL_SWEEP_INTERVAL_SECONDS = 300  # Event mode: quét toàn bộ định kỳ như lưới an toàn
+AUTH_ERROR_COOLDOWN_SECONDS = 30  # Không cập nhật lại cùng một port liên tục khi log còn lỗi cũ
+METRICS_WRITE_INTERVAL_SECONDS = 15  # Event mode: ghi metrics textfile theo timer, không theo từng file event
+TIMEOUT_ERROR_THRESHOLD = 3
+# Số port được cập nhật song song tối đa (mỗi port: ghi config + restart gost)
+CREDENTIAL_UPDATE_WORKERS = int(os.environ.get('CREDENTIAL_UPDATE_WORKERS', '8'))
+RESTART_TIMEOUT_SECONDS = 30
 API_TIMEOUT_SECONDS = 10
 PROFILES_API_URL = "https://g.proxyit.online/api/profiles/count-open"
 
+# Daemon không có HTTP server: metrics ghi ra logs/metrics/credential_updater.prom, web UI /metrics gộp vào
+UPDATER_METRICS = metrics.Registry()
+CREDENTIAL_UPDATE_TOTAL = UPDATER_METRICS.counter(
+    'credential_update_total', 'Cập nhật credentials cho từng port theo kết quả', ('outcome',))
+CREDENTIAL_CYCLE_SECONDS = UPDATER_METRICS.histogram(
+    'credential_update_cycle_duration_seconds', 'Thời gian một update cycle (lấy token + ghi config + restart)')
+CREDENTIAL_TOKEN_EXPIRY = UPDATER_METRICS.gauge(
+    'credential_token_expiry_timestamp_seconds',
+    'Thời điểm (epoch) token trong proxy_url của port hết hạn; time-to-expiry = giá trị - time()', ('port',))
+
 class AutoCredentialUpdater:
-    def __init__(self, base_dir: Optional[str] = None):
+    def __init__(self, base_dir: Optional[str] = None, event_driven: bool = True,
+                 max_workers: Optional[int] = None):
         """Initialize AutoCredentialUpdater with base directory"""
         self.base_dir = base_dir or self._detect_base_dir()
         self.log_dir = os.path.join(self.base_dir, "logs")
         self.config_dir = os.path.join(self.base_dir, "config")
+        # Runtime state (PID, restart) trong SQLite, config đọc qua cache (chỉ parse lại khi file thay đổi)
+        self.state_store = get_state_store(os.path.join(self.log_dir, "gost_state.db"))
+        self.config_repo = get_config_repository(self.config_dir, state_store=self.state_store)
         self.running = False
         self.monitor_thread: Optional[threading.Thread] = None
+        # Event mode: inotify trên config/ và logs/, fallback polling nếu không hỗ trợ
+        self.event_driven = event_driven
+        # Đọc log tăng dần + parse format gost một lần (dùng chung kind '407' / 'timeout' với web UI)
+        self.log_aggregator = log_aggregator.get_log_aggregator(
+            self.log_dir, resolver=lambda port: log_aggregator.upstream_from_config(self.config_repo.load(port)))
+        self._recent_timeouts: Dict[str, deque] = {}
+        self._last_update_time: Dict[str, float] = {}
+        self._token_deadlines: Dict[str, float] = {}
+        # Lỗi 407 đọc được khi port còn trong cooldown: {config_file: thời điểm hết cooldown} để cập nhật đúng lúc
+        self._pending_auth_retries: Dict[str, float] = {}
+        # Worker pool cho việc cập nhật credentials song song
+        self.max_workers = max(1, max_workers or CREDENTIAL_UPDATE_WORKERS)
+        self._update_executor: Optional[ThreadPoolExecutor] = None
+        self.last_cycle_metrics: Optional[Dict] = None
     
     @staticmethod
     def _detect_base_dir() -> str:
@@ -77,10 +122,20 @@ class AutoCredentialUpdater:
         self.running = False
         if self.monitor_thread:
             self.monitor_thread.join(timeout=5)
+        if self._update_executor:
+            self._update_executor.shutdown(wait=False)
+            self._update_executor = None
         print("🛑 Auto credential updater stopped")
         
     def _monitor_loop(self):
         """Vòng lặp monitoring chính"""
+        if self.event_driven:
+            self._event_loop()
+        else:
+            self._poll_loop()
+
+    def _poll_loop(self):
+        """Vòng lặp polling cũ (mỗi ERROR_CHECK_INTERVAL_SECONDS)"""
         last_cleanup = 0
         while self.running:
             try:
@@ -93,10 +148,235 @@ class AutoCredentialUpdater:
                     self._cleanup_unused_services()
                     last_cleanup = current_time
                 
+                self._write_metrics()
                 time.sleep(ERROR_CHECK_INTERVAL_SECONDS)
             except Exception as e:
                 print(f"❌ Error in monitor loop: {e}")
                 time.sleep(60)  # Wait longer on error
+
+    def _event_loop(self):
+        """
+        Vòng lặp event-driven: chỉ làm việc khi config/log thay đổi hoặc khi token sắp hết hạn.
+        Quét toàn bộ mỗi FULL_SWEEP_INTERVAL_SECONDS để không bỏ sót.
+        """
+        os.makedirs(self.config_dir, exist_ok=True)
+        os.makedirs(self.log_dir, exist_ok=True)
+        watcher = DirectoryWatcher([self.config_dir, self.log_dir])
+        print(f"👀 Watching {self.config_dir} and {self.log_dir} (mode: {watcher.mode})")
+
+        last_sweep = 0.0
+        last_cleanup = 0.0
+        last_metrics_write = 0.0
+        try:
+            while self.running:
+                try:
+                    current_time = time.time()
+                    if current_time - last_sweep >= FULL_SWEEP_INTERVAL_SECONDS:
+                        self._ensure_gost_7890_config()
+                        self._check_and_update_credentials()
+                        last_sweep = current_time
+
+                    # Token hết hạn theo thời gian, không có file event -> tự thức dậy đúng lúc
+                    self._update_expiring_tokens(current_time)
+                    self._retry_pending_auth_errors(current_time)
+
+                    if current_time - last_cleanup >= CLEANUP_INTERVAL_SECONDS:
+                        self._cleanup_unused_services()
+                        last_cleanup = current_time
+
+                    # Log gost ghi liên tục đánh thức vòng lặp: không ghi textfile mỗi lần thức
+                    if current_time - last_metrics_write >= METRICS_WRITE_INTERVAL_SECONDS:
+                        self._write_metrics()
+                        last_metrics_write = current_time
+                    next_wakeup = min(
+                        last_sweep + FULL_SWEEP_INTERVAL_SECONDS,
+                        last_cleanup + CLEANUP_INTERVAL_SECONDS,
+                        last_metrics_write + METRICS_WRITE_INTERVAL_SECONDS,
+                        min(self._token_deadlines.values(), default=float('inf')),
+                        min(self._pending_auth_retries.values(), default=float('inf'))
+                    )
+                    timeout = max(0.0, min(next_wakeup - time.time(), ERROR_CHECK_INTERVAL_SECONDS * 10))
+
+                    events = watcher.wait(timeout)
+                    if events:
+                        if any(event.kind == 'overflow' for event in events):
+                            last_sweep = 0.0
+                            continue
+                        self._handle_file_events(events)
+                except Exception as e:
+                    print(f"❌ Error in event loop: {e}")
+                    time.sleep(5)
+        finally:
+            watcher.close()
+
+    def _handle_file_events(self, events):
+        """Xử lý các file events từ config/ và logs/"""
+        changed_configs = set()
+        changed_logs = set()
+        for event in events:
+            name = event.name
+            if not name.startswith("gost_"):
+                continue
+            if event.directory == os.path.abspath(self.config_dir) and name.endswith(".config"):
+                changed_configs.add((event.path, event.kind))
+            elif event.directory == os.path.abspath(self.log_dir) and name.endswith(".log"):
+                port = name[5:-4]
+                if port.isdigit():
+                    changed_logs.add((port, event.kind))
+
+        for config_file, kind in changed_configs:
+            if kind == 'deleted':
+                self._token_deadlines.pop(config_file, None)
+                self._pending_auth_retries.pop(config_file, None)
+                if config_file.endswith(f"gost_{PROTECTED_PORT_WARP}.config"):
+                    self._ensure_gost_7890_config()
+                continue
+            self._refresh_token_deadline(config_file)
+
+        to_update: List[str] = []
+        for port, kind in changed_logs:
+            if kind == 'deleted':
+                self.log_aggregator.forget(port)
+                self._recent_timeouts.pop(port, None)
+                continue
+            config_file = os.path.join(self.config_dir, f"gost_{port}.config")
+            if self._has_new_authentication_errors(port) and self._is_protonvpn_config(config_file):
+                if self._in_update_cooldown(config_file):
+                    # Các dòng lỗi đã được đọc: không đợi lần quét toàn bộ, cập nhật khi hết cooldown
+                    self._pending_auth_retries[config_file] = (
+                        self._last_update_time.get(config_file, 0) + AUTH_ERROR_COOLDOWN_SECONDS)
+                    continue
+                print(f"🔄 Detected auth errors for {config_file}, updating credentials...")
+                self._pending_auth_retries.pop(config_file, None)
+                to_update.append(config_file)
+
+        if to_update:
+            self._run_update_cycle(to_update)
+
+    def _retry_pending_auth_errors(self, current_time: float):
+        """Cập nhật các port có lỗi auth bị hoãn vì cooldown, khi cooldown đã hết (event mode)"""
+        due = [path for path, retry_at in self._pending_auth_retries.items() if retry_at <= current_time]
+        to_update: List[str] = []
+        for config_file in due:
+            del self._pending_auth_retries[config_file]
+            if not os.path.exists(config_file) or not self._is_protonvpn_config(config_file):
+                continue
+            if self._in_update_cooldown(config_file):
+                self._pending_auth_retries[config_file] = (
+                    self._last_update_time.get(config_file, 0) + AUTH_ERROR_COOLDOWN_SECONDS)
+                continue
+            print(f"🔄 Retrying credentials update for {config_file} (auth errors during cooldown)...")
+            to_update.append(config_file)
+
+        if to_update:
+            self._run_update_cycle(to_update)
+
+    def _write_metrics(self):
+        """Ghi metrics textfile (expiry lấy từ _token_deadlines = exp - margin)"""
+        CREDENTIAL_TOKEN_EXPIRY.clear()
+        for config_file, deadline in self._token_deadlines.items():
+            port = self._extract_port_from_config_file(config_file)
+            if port:
+                CREDENTIAL_TOKEN_EXPIRY.set(deadline + TOKEN_EXPIRY_MARGIN_SECONDS, port=port)
+        metrics.write_textfile(os.path.join(self.log_dir, 'metrics', 'credential_updater.prom'), UPDATER_METRICS)
+
+    def _is_protonvpn_config(self, config_file: str) -> bool:
+        """Kiểm tra config có phải ProtonVPN không"""
+        config = self.config_repo.load_path(config_file)
+        return bool(config) and config.get('provider') == 'protonvpn'
+
+    def _in_update_cooldown(self, config_file: str) -> bool:
+        """Tránh cập nhật lại cùng một config trong AUTH_ERROR_COOLDOWN_SECONDS"""
+        last_update = self._last_update_time.get(config_file, 0)
+        return time.time() - last_update < AUTH_ERROR_COOLDOWN_SECONDS
+
+    def _has_new_authentication_errors(self, port: str) -> bool:
+        """Kiểm tra lỗi authentication trong các dòng log mới (event mode)"""
+        auth_error_count = 0
+        timeouts = self._recent_timeouts.setdefault(port, deque())
+        now = time.time()
+
+        for event in self.log_aggregator.ingest(port):
+            if now - event.time >= RECENT_ERROR_THRESHOLD_SECONDS:
+                continue
+            if event.kind == log_aggregator.KIND_AUTH:
+                auth_error_count += 1
+            elif event.kind == log_aggregator.KIND_TIMEOUT:
+                timeouts.append(now)
+
+        while timeouts and now - timeouts[0] >= RECENT_ERROR_THRESHOLD_SECONDS:
+            timeouts.popleft()
+
+        if auth_error_count > 0:
+            print(f"🔍 Found {auth_error_count} authentication errors (407) for port {port}")
+            return True
+
+        if len(timeouts) >= TIMEOUT_ERROR_THRESHOLD:
+            print(f"⚠️  Found {len(timeouts)} timeout errors for port {port} (may be auth issue)")
+            timeouts.clear()
+            return True
+
+        return False
+
+    def _get_token_expiry(self, config_file: str) -> Optional[float]:
+        """Lấy thời điểm hết hạn (epoch) của token trong proxy_url, None nếu không xác định"""
+        config = self.config_repo.load_path(config_file)
+        if config is None:
+            return None
+
+        if config.get('provider') != 'protonvpn':
+            return None
+        proxy_url = config.get('proxy_url', '')
+        if not proxy_url or 'https://' not in proxy_url:
+            return None
+
+        try:
+            import base64
+            user = proxy_url.split('https://')[1].split('@')[0].split(':', 1)[0]
+            parts = user.split('.')
+            if len(parts) < 2:
+                return None
+            payload = parts[1]
+            payload += '=' * (4 - len(payload) % 4)
+            exp = json.loads(base64.urlsafe_b64decode(payload)).get('exp', 0)
+            return float(exp) if exp else None
+        except (ValueError, IndexError, json.JSONDecodeError, base64.binascii.Error):
+            return None
+
+    def _refresh_token_deadline(self, config_file: str):
+        """Tính lại thời điểm cần cập nhật token cho một config"""
+        exp = self._get_token_expiry(config_file)
+        if exp is None:
+            self._token_deadlines.pop(config_file, None)
+        else:
+            self._token_deadlines[config_file] = exp - TOKEN_EXPIRY_MARGIN_SECONDS
+
+    def _update_expiring_tokens(self, current_time: float):
+        """Cập nhật các config có token đã tới hạn (event mode)"""
+        due = [path for path, deadline in self._token_deadlines.items() if deadline <= current_time]
+        to_update: List[str] = []
+        for config_file in due:
+            if not os.path.exists(config_file):
+                self._token_deadlines.pop(config_file, None)
+                continue
+            if self._in_update_cooldown(config_file):
+                # Thử lại sau cooldown
+                self._token_deadlines[config_file] = self._last_update_time[config_file] + AUTH_ERROR_COOLDOWN_SECONDS
+                continue
+            if self._is_token_expired_or_expiring_soon(config_file):
+                print(f"🔄 Token expired or expiring soon for {config_file}, updating credentials...")
+                to_update.append(config_file)
+
+        if to_update:
+            self._run_update_cycle(to_update)
+
+        for config_file in due:
+            if config_file not in self._token_deadlines:
+                continue
+            self._refresh_token_deadline(config_file)
+            if self._token_deadlines.get(config_file, float('inf')) <= current_time:
+                # Cập nhật không thành công -> thử lại sau cooldown
+                self._token_deadlines[config_file] = current_time + AUTH_ERROR_COOLDOWN_SECONDS
                 
     def _ensure_gost_7890_config(self):
         """Đảm bảo config cho port WARP luôn tồn tại (tự động tạo lại nếu bị mất)"""
@@ -113,9 +393,8 @@ class AutoCredentialUpdater:
                     "proxy_port": "8111",
                     "created_at": datetime.now().isoformat() + 'Z'
                 }
-                with open(gost_config, 'w') as f:
-                    json.dump(config_data, f, indent=2)
-                print(f"✅ Port {PROTECTED_PORT_WARP} config recreated")
+                if self.config_repo.save_path(gost_config, config_data, indent=2):
+                    print(f"✅ Port {PROTECTED_PORT_WARP} config recreated")
         except Exception as e:
             print(f"⚠️  Error ensuring gost {PROTECTED_PORT_WARP} config: {e}")
     
@@ -123,141 +402,150 @@ class AutoCredentialUpdater:
         """Kiểm tra và cập nhật credentials nếu cần"""
         # Tìm tất cả ProtonVPN config files
         protonvpn_configs = self._find_protonvpn_configs()
+        # Bắt kịp mọi log một lần, sau đó chỉ query bộ đếm
+        self.log_aggregator.poll()
+        self._token_deadlines = {}
+        to_update: List[str] = []
         
         for config_file in protonvpn_configs:
             # Kiểm tra token expiration trước (proactive)
             if self._is_token_expired_or_expiring_soon(config_file):
                 print(f"🔄 Token expired or expiring soon for {config_file}, updating credentials...")
-                self._update_credentials_for_config(config_file)
+                to_update.append(config_file)
             # Kiểm tra lỗi authentication trong log (reactive)
             elif self._has_authentication_errors(config_file):
                 print(f"🔄 Detected auth errors for {config_file}, updating credentials...")
-                self._update_credentials_for_config(config_file)
+                to_update.append(config_file)
+
+        if to_update:
+            self._run_update_cycle(to_update)
+
+        for config_file in protonvpn_configs:
+            self._refresh_token_deadline(config_file)
+
+    def _get_update_executor(self) -> ThreadPoolExecutor:
+        """Lazy-init worker pool (giới hạn bởi max_workers)"""
+        if self._update_executor is None:
+            self._update_executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="cred-update"
+            )
+        return self._update_executor
+
+    def _run_update_cycle(self, config_files: List[str]) -> Dict:
+        """
+        Cập nhật credentials cho nhiều port song song (tối đa max_workers cùng lúc).
+        Mỗi config chỉ được cập nhật một lần trong một cycle. Trả về thống kê của cycle.
+        """
+        started = time.time()
+        unique_configs = list(dict.fromkeys(config_files))
+        cycle_stats = {
+            'started_at': datetime.now().isoformat(),
+            'ports_requested': len(unique_configs),
+            'ports_updated': 0,
+            'failures': 0,
+            'updated_ports': [],
+            'failed_ports': [],
+            'time_to_recover_seconds': 0.0,
+            'duration_seconds': 0.0,
+            'max_workers': self.max_workers
+        }
+
+        # Lấy auth token một lần cho cả cycle
+        auth_token = self._get_fresh_auth_token()
+        if not auth_token:
+            print("❌ Failed to get fresh auth token")
+            for config_file in unique_configs:
+                self._last_update_time[config_file] = started
+            cycle_stats['failures'] = len(unique_configs)
+            cycle_stats['failed_ports'] = [self._extract_port_from_config_file(c) for c in unique_configs]
+            cycle_stats['duration_seconds'] = round(time.time() - started, 3)
+            self.last_cycle_metrics = cycle_stats
+            CREDENTIAL_UPDATE_TOTAL.inc(len(unique_configs), outcome='failure')
+            CREDENTIAL_CYCLE_SECONDS.observe(cycle_stats['duration_seconds'])
+            self._write_metrics()
+            return cycle_stats
+
+        executor = self._get_update_executor()
+        futures = {
+            executor.submit(self._update_credentials_for_config, config_file, auth_token): config_file
+            for config_file in unique_configs
+        }
+        for future in as_completed(futures):
+            config_file = futures[future]
+            port = self._extract_port_from_config_file(config_file)
+            try:
+                success = future.result()
+            except Exception as e:
+                print(f"❌ Error updating credentials for {config_file}: {e}")
+                success = False
+
+            if success:
+                cycle_stats['ports_updated'] += 1
+                cycle_stats['updated_ports'].append(port)
+                cycle_stats['time_to_recover_seconds'] = round(time.time() - started, 3)
+            else:
+                cycle_stats['failures'] += 1
+                cycle_stats['failed_ports'].append(port)
+
+        cycle_stats['duration_seconds'] = round(time.time() - started, 3)
+        self.last_cycle_metrics = cycle_stats
+        CREDENTIAL_UPDATE_TOTAL.inc(cycle_stats['ports_updated'], outcome='success')
+        CREDENTIAL_UPDATE_TOTAL.inc(cycle_stats['failures'], outcome='failure')
+        CREDENTIAL_CYCLE_SECONDS.observe(cycle_stats['duration_seconds'])
+        self._write_metrics()
+        print(f"📊 Update cycle: {cycle_stats['ports_updated']}/{cycle_stats['ports_requested']} ports updated, "
+              f"{cycle_stats['failures']} failures, recovered in {cycle_stats['time_to_recover_seconds']:.1f}s "
+              f"(workers: {self.max_workers})")
+        return cycle_stats
                 
     def _find_protonvpn_configs(self) -> List[str]:
         """Tìm tất cả ProtonVPN config files"""
-        configs = []
-        try:
-            for filename in os.listdir(self.config_dir):
-                if filename.startswith("gost_") and filename.endswith(".config"):
-                    config_path = os.path.join(self.config_dir, filename)
-                    try:
-                        with open(config_path, 'r') as f:
-                            config = json.load(f)
-                            if config.get('provider') == 'protonvpn':
-                                configs.append(config_path)
-                    except (json.JSONDecodeError, IOError):
-                        continue
-        except OSError:
-            pass
-        return configs
+        return [
+            self.config_repo.path_for(port)
+            for port, config in self.config_repo.load_all().items()
+            if config.get('provider') == 'protonvpn'
+        ]
         
     def _has_authentication_errors(self, config_file: str) -> bool:
-        """Kiểm tra xem có lỗi authentication trong log không"""
+        """Kiểm tra lỗi authentication gần đây (từ bộ đếm của log aggregator, không đọc lại file log)"""
         port = self._extract_port_from_config_file(config_file)
         if not port:
             return False
-            
-        log_file = os.path.join(self.log_dir, f"gost_{port}.log")
-        if not os.path.exists(log_file):
-            return False
-            
-        try:
-            with open(log_file, 'r') as f:
-                lines = f.readlines()
-                recent_lines = lines[-100:] if len(lines) > 100 else lines
-                
-                auth_error_count = 0
-                timeout_error_count = 0
-                
-                for line in recent_lines:
-                    if '407 Proxy Authentication Required' in line:
-                        if self._is_recent_error(line):
-                            auth_error_count += 1
-                    elif 'i/o timeout' in line:
-                        if self._is_recent_error(line):
-                            timeout_error_count += 1
-                
-                if auth_error_count > 0:
-                    print(f"🔍 Found {auth_error_count} authentication errors (407) for port {port}")
-                    return True
-                
-                if timeout_error_count >= 3:  # Giảm từ 5 xuống 3 để phát hiện sớm hơn
-                    print(f"⚠️  Found {timeout_error_count} timeout errors for port {port} (may be auth issue)")
-                    return True  # Return True để trigger update
-                    
-        except Exception as e:
-            print(f"❌ Error reading log file {log_file}: {e}")
-            
+
+        # Không tính lại lỗi đã có trước lần cập nhật credentials gần nhất
+        since = max(time.time() - RECENT_ERROR_THRESHOLD_SECONDS, self._last_update_time.get(config_file, 0))
+        auth_error_count = self.log_aggregator.count(port=port, kind=log_aggregator.KIND_AUTH, since=since)
+        if auth_error_count > 0:
+            print(f"🔍 Found {auth_error_count} authentication errors (407) for port {port}")
+            return True
+
+        timeout_error_count = self.log_aggregator.count(port=port, kind=log_aggregator.KIND_TIMEOUT, since=since)
+        if timeout_error_count >= TIMEOUT_ERROR_THRESHOLD:
+            print(f"⚠️  Found {timeout_error_count} timeout errors for port {port} (may be auth issue)")
+            return True
+
         return False
     
     def _is_token_expired_or_expiring_soon(self, config_file: str) -> bool:
         """Kiểm tra xem token có hết hạn hoặc sắp hết hạn không (proactive check)"""
-        try:
-            with open(config_file, 'r') as f:
-                config = json.load(f)
-            
-            proxy_url = config.get('proxy_url', '')
-            if not proxy_url or 'https://' not in proxy_url:
-                return False
-            
-            # Extract credentials từ proxy_url
-            try:
-                creds_part = proxy_url.split('https://')[1].split('@')[0]
-                user, pwd = creds_part.split(':', 1)
-                
-                # Decode JWT token payload (second part)
-                import base64
-                parts = user.split('.')
-                if len(parts) >= 2:
-                    payload = parts[1]
-                    # Add padding if needed
-                    payload += '=' * (4 - len(payload) % 4)
-                    decoded_bytes = base64.urlsafe_b64decode(payload)
-                    decoded = json.loads(decoded_bytes)
-                    exp = decoded.get('exp', 0)
-                    
-                    if exp:
-                        exp_time = datetime.fromtimestamp(exp)
-                        now = datetime.now()
-                        time_until_expiry = (exp_time - now).total_seconds()
-                        
-                        # Cập nhật nếu đã hết hạn hoặc còn < 5 phút
-                        if time_until_expiry < 300:  # 5 phút
-                            port = self._extract_port_from_config_file(config_file)
-                            if port:
-                                if time_until_expiry < 0:
-                                    hours_ago = abs(time_until_expiry) / 3600
-                                    print(f"⏰ Token for port {port} expired {hours_ago:.2f} hours ago")
-                                else:
-                                    print(f"⏰ Token for port {port} expiring in {time_until_expiry/60:.1f} minutes")
-                            return True
-            except (ValueError, IndexError, json.JSONDecodeError, base64.binascii.Error) as e:
-                # Nếu không parse được token, không coi là expired
-                pass
-                
-        except (IOError, json.JSONDecodeError) as e:
-            print(f"❌ Error checking token expiration for {config_file}: {e}")
-            
-        return False
+        exp = self._get_token_expiry(config_file)
+        if exp is None:
+            # Không parse được token: không coi là expired
+            return False
+
+        # Cập nhật nếu đã hết hạn hoặc còn < TOKEN_EXPIRY_MARGIN_SECONDS
+        time_until_expiry = exp - time.time()
+        if time_until_expiry >= TOKEN_EXPIRY_MARGIN_SECONDS:
+            return False
+        port = self._extract_port_from_config_file(config_file)
+        if port:
+            if time_until_expiry < 0:
+                print(f"⏰ Token for port {port} expired {abs(time_until_expiry) / 3600:.2f} hours ago")
+            else:
+                print(f"⏰ Token for port {port} expiring in {time_until_expiry / 60:.1f} minutes")
+        return True
     
-    def _is_recent_error(self, log_line: str) -> bool:
-        """Kiểm tra lỗi gần đây cho gost log format: 2025/11/17 18:25:55"""
-        try:
-            if log_line.startswith('20'):
-                parts = log_line.split(' ', 1)
-                if len(parts) >= 2:
-                    date_str = parts[0]  # 2025/11/17
-                    time_str = parts[1].split()[0] if parts[1] else ''  # 18:25:55 (first part)
-                    if time_str:
-                        datetime_str = f"{date_str} {time_str}"
-                        log_time = datetime.strptime(datetime_str, '%Y/%m/%d %H:%M:%S')
-                        time_diff = (datetime.now() - log_time).total_seconds()
-                        return time_diff < RECENT_ERROR_THRESHOLD_SECONDS
-        except (ValueError, IndexError):
-            pass
-        return True  # Nếu không parse được timestamp, coi như recent để trigger update
-        
     def _extract_port_from_config_file(self, config_file: str) -> Optional[str]:
         """Trích xuất port từ tên config file"""
         filename = os.path.basename(config_file)
@@ -265,16 +553,20 @@ class AutoCredentialUpdater:
             return filename[5:-7]  # Remove "gost_" and ".config"
         return None
         
-    def _update_credentials_for_config(self, config_file: str) -> bool:
+    def _update_credentials_for_config(self, config_file: str, auth_token: Optional[str] = None) -> bool:
         """Cập nhật credentials cho một config file"""
+        self._last_update_time[config_file] = time.time()
         try:
-            auth_token = self._get_fresh_auth_token()
+            if not auth_token:
+                auth_token = self._get_fresh_auth_token()
             if not auth_token:
                 print("❌ Failed to get fresh auth token")
                 return False
                 
-            with open(config_file, 'r') as f:
-                config = json.load(f)
+            config = self.config_repo.load_path(config_file)
+            if config is None:
+                print(f"❌ Cannot read config {config_file}")
+                return False
                 
             current_proxy_url = config.get('proxy_url', '')
             if not current_proxy_url:
@@ -291,12 +583,13 @@ class AutoCredentialUpdater:
             config['proxy_url'] = f"https://{auth_token}@{proxy_host}:{proxy_port}"
             config['updated_at'] = datetime.now().isoformat()
             
-            with open(config_file, 'w') as f:
-                json.dump(config, f, indent=2)
+            if not self.config_repo.save_path(config_file, config, indent=2):
+                return False
                 
             port = self._extract_port_from_config_file(config_file)
             if port:
-                self._restart_gost_service(port)
+                if not self._restart_gost_service(port):
+                    return False
                 print(f"✅ Updated credentials for port {port}")
                 return True
                     
@@ -335,17 +628,23 @@ class AutoCredentialUpdater:
             print(f"❌ Error getting fresh auth token: {e}")
         return None
         
-    def _restart_gost_service(self, port: str):
+    def _restart_gost_service(self, port: str) -> bool:
         """Restart gost service cho port cụ thể"""
         try:
             cmd = f"cd {self.base_dir} && ./manage_gost.sh restart-port {port}"
-            result = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=30)
+            result = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=RESTART_TIMEOUT_SECONDS)
             if result.returncode == 0:
                 print(f"✅ Restarted gost service on port {port}")
-            else:
-                print(f"❌ Failed to restart gost service on port {port}: {result.stderr}")
+                try:
+                    # Monitor dùng last_restart để tính cooldown
+                    self.state_store.record_restart(port)
+                except Exception as e:
+                    print(f"⚠️  Error recording restart for port {port}: {e}")
+                return True
+            print(f"❌ Failed to restart gost service on port {port}: {result.stderr}")
         except Exception as e:
             print(f"❌ Error restarting gost service on port {port}: {e}")
+        return False
             
     def _cleanup_unused_services(self):
         """Dọn dẹp các service không sử dụng dựa trên profile count API"""
@@ -506,18 +805,31 @@ class AutoCredentialUpdater:
         
         return False
     
+    def _get_gost_pid(self, port: int) -> Optional[int]:
+        """Lấy PID từ state store, fallback PID file"""
+        try:
+            pid = self.state_store.get_pid(port)
+            if pid:
+                return pid
+        except Exception as e:
+            print(f"⚠️  Error reading state store for port {port}: {e}")
+        
+        pid_file = os.path.join(self.log_dir, f"gost_{port}.pid")
+        try:
+            with open(pid_file, 'r') as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+    
     def _is_gost_process_running(self, port: int) -> bool:
         """Kiểm tra xem Gost process có đang chạy không"""
+        pid = self._get_gost_pid(port)
+        if not pid:
+            return False
         try:
-            pid_file = os.path.join(self.log_dir, f"gost_{port}.pid")
-            if not os.path.exists(pid_file):
-                return False
-            
-            with open(pid_file, 'r') as f:
-                pid = int(f.read().strip())
             os.kill(pid, 0)  # Signal 0 chỉ kiểm tra process có tồn tại không
             return True
-        except (OSError, ValueError, ProcessLookupError):
+        except (OSError, ProcessLookupError):
             return False
             
     def _stop_and_remove_gost_service(self, port: int):
@@ -536,14 +848,12 @@ class AutoCredentialUpdater:
     
     def _stop_gost_process(self, port: int):
         """Dừng Gost process"""
-        pid_file = os.path.join(self.log_dir, f"gost_{port}.pid")
-        if os.path.exists(pid_file):
+        pid = self._get_gost_pid(port)
+        if pid:
             try:
-                with open(pid_file, 'r') as f:
-                    pid = int(f.read().strip())
                 os.kill(pid, 15)  # SIGTERM
                 print(f"✅ Stopped Gost process {pid} on port {port}")
-            except (OSError, ValueError, ProcessLookupError):
+            except (OSError, ProcessLookupError):
                 pass
     
     @staticmethod
@@ -557,10 +867,8 @@ class AutoCredentialUpdater:
     
     def _remove_service_files(self, port: int):
         """Xóa các file liên quan đến service"""
-        # Remove config file
-        config_file = os.path.join(self.config_dir, f"gost_{port}.config")
-        if os.path.exists(config_file):
-            os.remove(config_file)
+        # Remove config file (và state của port trong state store)
+        if self.config_repo.delete(port):
             print(f"✅ Removed Gost config for port {port}")
         
         # Remove PID file
@@ -626,17 +934,16 @@ class AutoCredentialUpdater:
         
         # Kiểm tra thời gian tạo trong config file (nếu có)
         try:
-            with open(config_file, 'r') as f:
-                config = json.load(f)
-                created_at = config.get('created_at', '')
-                if created_at:
-                    created_at_str = created_at.replace('Z', '+00:00')
-                    config_time = datetime.fromisoformat(created_at_str)
-                    config_age_seconds = current_time - config_time.timestamp()
-                    # Chỉ sử dụng config time nếu hợp lệ (không âm và không quá lớn)
-                    if 0 <= config_age_seconds < 86400 * 365:  # Không quá 1 năm
-                        age_seconds = config_age_seconds
-        except (json.JSONDecodeError, ValueError, IOError):
+            config = self.config_repo.load_path(config_file) or {}
+            created_at = config.get('created_at', '')
+            if created_at:
+                created_at_str = created_at.replace('Z', '+00:00')
+                config_time = datetime.fromisoformat(created_at_str)
+                config_age_seconds = current_time - config_time.timestamp()
+                # Chỉ sử dụng config time nếu hợp lệ (không âm và không quá lớn)
+                if 0 <= config_age_seconds < 86400 * 365:  # Không quá 1 năm
+                    age_seconds = config_age_seconds
+        except ValueError:
             pass
         
         return age_seconds
@@ -657,10 +964,14 @@ def main():
         command = sys.argv[1]
         updater = AutoCredentialUpdater()
         
-        if command == "start":
+        if command in ("start", "start-poll"):
+            if command == "start-poll":
+                updater.event_driven = False
             # Setup signal handlers
             signal.signal(signal.SIGINT, signal_handler)
             signal.signal(signal.SIGTERM, signal_handler)
+            # kill -USR1 <pid>: CPU profile, kill -USR2 <pid>: memory snapshot -> logs/profiles/
+            profiler.install_signal_handlers(os.path.join(updater.log_dir, 'profiles'), 'credential_updater')
             
             updater.start_monitoring()
             try:
@@ -675,6 +986,8 @@ def main():
         elif command == "test":
             # Test mode - check once and exit
             updater._check_and_update_credentials()
+            if updater.last_cycle_metrics:
+                print(f"📊 Cycle metrics: {json.dumps(updater.last_cycle_metrics)}")
             
         elif command == "cleanup":
             # Manual cleanup mode
@@ -764,10 +1077,11 @@ def main():
             print("=" * 60)
             
         else:
-            print("Usage: python auto_credential_updater.py {start|update|test|cleanup|test-extract|test-cleanup}")
+            print("Usage: python auto_credential_updater.py {start|start-poll|update|test|cleanup|test-extract|test-cleanup}")
     else:
-        print("Usage: python auto_credential_updater.py {start|update|test|cleanup}")
-        print("  start   - Start auto monitoring")
+        print("Usage: python auto_credential_updater.py {start|start-poll|update|test|cleanup}")
+        print("  start   - Start auto monitoring (inotify event-driven, polling fallback)")
+        print("  start-poll - Start auto monitoring (legacy 30s polling)")
         print("  update  - Manual update all credentials")
         print("  test    - Test check once")
         print("  cleanup - Manual cleanup unused services")
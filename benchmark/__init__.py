@@ -0,0 +1,24 @@
+"""
+Benchmark package
+Đo latency/throughput qua direct, gost SOCKS5, gost HTTP và upstream HTTPS proxy,
+với origin server và upstream giả lập để chạy offline
+"""
+
+from .targets import Target
+from .client import BenchmarkError, http_get, open_tunnel
+from .servers import ConnectProxyServer, OriginServer
+from .gost import GostProcess, find_gost_bin
+from .histogram import Histogram, compare_results, mann_whitney_u
+from .runner import run_suite, load_results, write_results
+from .saturation import run_saturation
+from .codec import run_codec_benchmark
+from .fleet import BandwidthBudget, JsonlResultStore, PortPool, catalog_servers, run_fleet
+
+__all__ = [
+    'Target', 'BenchmarkError', 'http_get', 'open_tunnel',
+    'ConnectProxyServer', 'OriginServer', 'GostProcess', 'find_gost_bin',
+    'Histogram', 'compare_results', 'mann_whitney_u',
+    'run_suite', 'load_results', 'write_results', 'run_saturation',
+    'BandwidthBudget', 'JsonlResultStore', 'PortPool', 'catalog_servers', 'run_fleet',
+    'run_codec_benchmark',
+]
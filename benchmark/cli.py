@@ -0,0 +1,354 @@
+"""
+Benchmark CLI
+    python3 -m benchmark run gost=socks5://127.0.0.1:7890 warp=socks5://127.0.0.1:8111
+    python3 -m benchmark run --local gost=socks5://127.0.0.1:7891
+    python3 -m benchmark selftest [--tls]
+    python3 -m benchmark compare logs/benchmark_old.json logs/benchmark_new.json
+    python3 -m benchmark saturate --selftest --gost-count 4 --max-streams 32
+    python3 -m benchmark fleet protonvpn --country LK --concurrency 8 --bandwidth-mbps 200
+    python3 -m benchmark json [nordvpn_servers_cache.json] --repeat 10
+    python3 -m benchmark saturate --ports 7891-7899 --url https://speed.cloudflare.com/__down?bytes=1073741824
+"""
+
+import os
+import sys
+import socket
+import argparse
+import tempfile
+import contextlib
+from typing import List, Optional
+
+from .codec import DEFAULT_REPEAT, print_codec_report, run_codec_benchmark
+from .fleet import (DEFAULT_CONCURRENCY, DEFAULT_PORT_RANGE, JsonlResultStore, PortPool, catalog_servers,
+                    default_fleet_path, probe_reachable, run_fleet)
+from .gost import GostProcess, find_gost_bin
+from .histogram import DEFAULT_ALPHA, DEFAULT_THRESHOLD, compare_results, print_compare_report
+from .runner import (INTERNET_URLS, load_results, local_urls, new_results, print_comparison, run_suite,
+                     write_results)
+from .saturation import (DEFAULT_LEVEL_DURATION_SECONDS, DEFAULT_MAX_STREAMS, DEFAULT_PLATEAU_GAIN,
+                         default_levels, print_saturation_summary, run_saturation)
+from .servers import MAX_PAYLOAD_BYTES, ConnectProxyServer, OriginServer, generate_self_signed_cert
+from .targets import Target
+
+SELFTEST_USERNAME = 'bench'
+SELFTEST_PASSWORD = 'bench'
+
+
+def find_free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _parse_sizes(value: Optional[str]) -> Optional[List[int]]:
+    if not value:
+        return None
+    return [int(size) for size in value.split(',') if size.strip()]
+
+
+def run_targets(targets: List[Target], urls: dict, args, command: str, extra_config: Optional[dict] = None) -> dict:
+    results = new_results(command, {
+        'urls': urls, 'pings': args.pings, 'duration': args.duration, **(extra_config or {})
+    })
+    for target in targets:
+        results['results'].append(run_suite(target, urls, pings=args.pings, duration=args.duration))
+
+    if len(results['results']) > 1:
+        print_comparison(results['results'])
+    path = write_results(results, args.output)
+    print(f"\n💾 Results saved to: {path}")
+    return results
+
+
+def cmd_run(args) -> int:
+    targets = [Target.parse(spec) for spec in args.targets]
+    if args.local:
+        with OriginServer() as origin:
+            urls = local_urls(origin.base_url, _parse_sizes(args.download_bytes))
+            run_targets(targets, urls, args, 'run', {'origin': 'local'})
+    else:
+        urls = {'ping': args.ping_url or INTERNET_URLS['ping'],
+                'downloads': dict(INTERNET_URLS['downloads'])}
+        if args.download_url:
+            urls['downloads'] = {f"url{i + 1}": url for i, url in enumerate(args.download_url)}
+        run_targets(targets, urls, args, 'run', {'origin': 'internet'})
+    return 0
+
+
+@contextlib.contextmanager
+def selftest_environment(args, gost_kinds=('socks5', 'http'), gost_count: int = 1):
+    """
+    Origin local + upstream CONNECT proxy giả lập (+ các listener gost forward tới upstream).
+    Yield (origin, targets, config); targets gồm direct, upstream và gost-<kind>[-i]
+    """
+    gost_bin = args.gost_bin or find_gost_bin()
+    with tempfile.TemporaryDirectory(prefix='gost-bench-') as workdir:
+        cert = generate_self_signed_cert(workdir) if args.tls else None
+        if args.tls and not cert:
+            print("⚠️  openssl not available, upstream stand-in runs without TLS")
+
+        with OriginServer() as origin, ConnectProxyServer(
+                certfile=cert[0] if cert else None, keyfile=cert[1] if cert else None,
+                username=SELFTEST_USERNAME, password=SELFTEST_PASSWORD) as upstream:
+            host, port = upstream.address
+            targets = [
+                Target('direct', 'direct'),
+                Target('upstream', upstream.scheme, host, port, SELFTEST_USERNAME, SELFTEST_PASSWORD),
+            ]
+            gost_processes = []
+            if gost_bin:
+                for kind in gost_kinds:
+                    for index in range(gost_count):
+                        name = f'gost-{kind}' if gost_count == 1 else f'gost-{kind}-{index + 1}'
+                        gost = GostProcess(kind, find_free_port(), upstream.proxy_url(), gost_bin=gost_bin,
+                                           log_file=os.path.join(workdir, f'{name}.log'),
+                                           listener_options=args.listener_options or '')
+                        if gost.start():
+                            gost_processes.append(gost)
+                            targets.append(Target(name, kind, '127.0.0.1', gost.port))
+                        else:
+                            print(f"⚠️  Cannot start {name} listener")
+            else:
+                print("⚠️  gost binary not found, only direct and upstream targets are measured")
+
+            try:
+                yield origin, targets, {
+                    'origin': 'local',
+                    'upstream': upstream.proxy_url(redact=True),
+                    'gost_bin': gost_bin,
+                    'listener_options': args.listener_options or ''
+                }
+            finally:
+                for gost in gost_processes:
+                    gost.stop()
+
+
+def cmd_selftest(args) -> int:
+    """
+    Benchmark offline hoàn toàn: origin local + upstream CONNECT proxy giả lập,
+    so sánh direct / upstream / gost SOCKS5 / gost HTTP để đo overhead của gost
+    """
+    with selftest_environment(args) as (origin, targets, config):
+        urls = local_urls(origin.base_url, _parse_sizes(args.download_bytes))
+        run_targets(targets, urls, args, 'selftest', config)
+    return 0
+
+
+def _parse_levels(value: Optional[str]) -> Optional[List[int]]:
+    levels = _parse_sizes(value)
+    return sorted(set(levels)) if levels else None
+
+
+def _ports_targets(spec: Optional[str], kind: str) -> List[Target]:
+    """'7891-7895,7900' -> Target gost-<port> cho từng port"""
+    targets = []
+    for part in (spec or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        start, _, end = part.partition('-')
+        for port in range(int(start), int(end or start) + 1):
+            targets.append(Target(f'gost-{port}', kind, '127.0.0.1', port))
+    return targets
+
+
+def cmd_saturate(args) -> int:
+    """
+    Ramp số stream song song (1 -> N) qua các target cùng lúc.
+    Mặc định tải payload từ origin local (--url để dùng payload trên Internet)
+    """
+    levels = _parse_levels(args.levels) or default_levels(args.max_streams)
+
+    def run(targets, url, config):
+        if not targets:
+            print("❌ No targets")
+            return 1
+        print(f"🚀 Saturation test: {len(targets)} target(s), levels {levels}, {args.duration:.0f}s per level")
+        result = run_saturation(targets, url, levels=levels, duration=args.duration,
+                                plateau_gain=args.plateau_gain)
+        print_saturation_summary(result)
+        results = new_results('saturate', {**config, 'url': url, 'levels': levels, 'duration': args.duration})
+        results['saturation'] = result
+        path = write_results(results, args.output)
+        print(f"\n💾 Results saved to: {path}")
+        return 0
+
+    if args.selftest:
+        with selftest_environment(args, gost_kinds=(args.kind,), gost_count=args.gost_count) as (
+                origin, targets, config):
+            if args.gost_count and any(t.name.startswith('gost-') for t in targets):
+                targets = [t for t in targets if t.name.startswith('gost-')]
+            return run(targets, args.url or origin.url(f'/bytes/{MAX_PAYLOAD_BYTES}'), config)
+
+    targets = [Target.parse(spec) for spec in args.targets or []] + _ports_targets(args.ports, args.kind)
+    if args.url:
+        return run(targets, args.url, {'origin': 'internet'})
+    with OriginServer(host=args.origin_host) as origin:
+        return run(targets, origin.url(f'/bytes/{MAX_PAYLOAD_BYTES}'), {'origin': 'local'})
+
+
+def _parse_port_range(value: Optional[str]) -> tuple:
+    if not value:
+        return DEFAULT_PORT_RANGE
+    start, _, end = value.partition('-')
+    return int(start), int(end or start)
+
+
+def cmd_fleet(args) -> int:
+    """Benchmark song song các server trong catalog (ghi JSONL theo từng server)"""
+    servers = catalog_servers(args.provider, country=args.country, tier=args.tier,
+                              max_load=args.max_load, limit=args.limit)
+    if not servers:
+        print("❌ No servers match the catalog query")
+        return 1
+    # Kết quả cũng vào server history để apply endpoint xếp hạng server theo chất lượng đo được
+    from server_history import get_server_history
+    history = None if args.no_history else get_server_history()
+
+    if args.probe_first:
+        total = len(servers)
+        servers = probe_reachable(servers, max_rtt_ms=args.max_rtt_ms, history=history)
+        print(f"🔍 Entry probe: {len(servers)}/{total} server(s) reachable"
+              f"{f' under {args.max_rtt_ms:.0f}ms' if args.max_rtt_ms else ''}")
+        if not servers:
+            return 1
+
+    kinds = [kind.strip() for kind in args.kinds.split(',') if kind.strip()]
+    path = args.output or default_fleet_path()
+    print(f"🚀 Fleet benchmark: {len(servers)} {args.provider} server(s), {args.concurrency} concurrent, "
+          f"kinds {','.join(kinds)}, budget {args.bandwidth_mbps or 'unlimited'} Mbps")
+    print(f"   Streaming results to {path}")
+    records = run_fleet(servers, concurrency=args.concurrency, port_pool=PortPool(*_parse_port_range(args.port_range)),
+                        kinds=kinds, pings=args.pings, duration=args.duration,
+                        bandwidth_mbps=args.bandwidth_mbps, store=JsonlResultStore(path),
+                        gost_bin=args.gost_bin or find_gost_bin(),
+                        on_result=history.record_fleet_record if history else None)
+    ok = sum(1 for r in records if any((s.get('connection') or {}).get('ok') for s in r['results'].values()))
+    print(f"\n✅ {ok}/{len(records)} server(s) reachable, results in {path}")
+    return 0
+
+
+def cmd_compare(args) -> int:
+    """
+    So sánh baseline với candidate (vd trước/sau khi nâng cấp gost hoặc đổi listener options).
+    Exit code 2 nếu có regression có ý nghĩa thống kê
+    """
+    report = compare_results(load_results(args.baseline), load_results(args.candidate),
+                             alpha=args.alpha, threshold=args.threshold)
+    print_compare_report(report)
+    if args.output:
+        path = write_results(report, args.output)
+        print(f"\n💾 Report saved to: {path}")
+    return 2 if report['regressions'] else 0
+
+
+def cmd_json(args) -> int:
+    """Microbenchmark encode/decode JSON (stdlib vs fast_json) trên file catalog thật"""
+    report = run_codec_benchmark(args.file, repeat=args.repeat)
+    print_codec_report(report)
+    if args.output:
+        path = write_results(report, args.output)
+        print(f"\n💾 Report saved to: {path}")
+    return 0
+
+
+def add_selftest_options(parser):
+    parser.add_argument('--tls', action='store_true', help='Upstream dùng TLS (giống ProtonVPN HTTPS proxy)')
+    parser.add_argument('--gost-bin', help='Đường dẫn gost (mặc định bin/gost hoặc PATH)')
+    parser.add_argument('--listener-options', help="Query string cho listener gost, vd 'ttl=30s&so_keepalive=true'")
+
+
+def add_common_options(parser):
+    parser.add_argument('--pings', type=int, default=10, help='Số request nhỏ để đo latency (mặc định 10)')
+    parser.add_argument('--duration', type=float, default=10, help='Thời gian tối đa mỗi download (giây)')
+    parser.add_argument('--download-bytes', help='Kích thước payload local, phân cách bằng dấu phẩy')
+    parser.add_argument('-o', '--output', help='File JSON kết quả (mặc định logs/benchmark_<time>.json)')
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python3 -m benchmark', description='Gost/proxy benchmark suite')
+    subparsers = parser.add_subparsers(dest='command')
+
+    run = subparsers.add_parser('run', help='Benchmark các target (direct, socks5://, http://, https://)')
+    run.add_argument('targets', nargs='+', help="Target dạng name=url, vd gost=socks5://127.0.0.1:7890")
+    run.add_argument('--local', action='store_true', help='Dùng origin server local thay vì Internet')
+    run.add_argument('--ping-url', help='URL cho ping test (mặc định https://ipinfo.io/ip)')
+    run.add_argument('--download-url', action='append', help='URL download (có thể lặp lại)')
+    add_common_options(run)
+    run.set_defaults(func=cmd_run)
+
+    selftest = subparsers.add_parser('selftest', help='Benchmark offline với origin và upstream giả lập')
+    add_selftest_options(selftest)
+    add_common_options(selftest)
+    selftest.set_defaults(func=cmd_selftest)
+
+    saturate = subparsers.add_parser('saturate', help='Ramp số stream song song để tìm trần throughput')
+    saturate.add_argument('targets', nargs='*', help="Target dạng name=url, vd gost=socks5://127.0.0.1:7891")
+    saturate.add_argument('--ports', help="Các port gost local, vd '7891-7899,7905'")
+    saturate.add_argument('--kind', choices=('socks5', 'http'), default='socks5', help='Loại listener cho --ports')
+    saturate.add_argument('--url', help='URL payload lớn (mặc định origin local /bytes/...)')
+    saturate.add_argument('--origin-host', default='127.0.0.1', help='Địa chỉ bind cho origin local')
+    saturate.add_argument('--max-streams', type=int, default=DEFAULT_MAX_STREAMS,
+                          help=f'Số stream tối đa mỗi target (mặc định {DEFAULT_MAX_STREAMS})')
+    saturate.add_argument('--levels', help="Các mức concurrency, vd '1,2,4,8,16' (mặc định lũy thừa 2)")
+    saturate.add_argument('--duration', type=float, default=DEFAULT_LEVEL_DURATION_SECONDS,
+                          help='Thời gian mỗi mức (giây)')
+    saturate.add_argument('--plateau-gain', type=float, default=DEFAULT_PLATEAU_GAIN,
+                          help='Tăng trưởng tối thiểu giữa hai mức trước khi coi là plateau (mặc định 0.10)')
+    saturate.add_argument('--selftest', action='store_true',
+                          help='Chạy trên upstream giả lập + listener gost tạm thời (offline)')
+    saturate.add_argument('--gost-count', type=int, default=1, help='Số listener gost tạm thời khi --selftest')
+    add_selftest_options(saturate)
+    saturate.add_argument('-o', '--output', help='File JSON kết quả (mặc định logs/benchmark_<time>.json)')
+    saturate.set_defaults(func=cmd_saturate)
+
+    fleet = subparsers.add_parser('fleet', help='Benchmark song song nhiều server từ catalog')
+    fleet.add_argument('provider', choices=('protonvpn', 'nordvpn'))
+    fleet.add_argument('--country', help='Mã quốc gia, vd LK')
+    fleet.add_argument('--tier', type=int, help='Tier tối thiểu (ProtonVPN)')
+    fleet.add_argument('--max-load', type=int, help='Load tối đa (%%)')
+    fleet.add_argument('--limit', type=int, help='Số server tối đa (load thấp nhất trước)')
+    fleet.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                       help=f'Số server benchmark cùng lúc (mặc định {DEFAULT_CONCURRENCY})')
+    fleet.add_argument('--port-range', help=f'Pool port gost tạm thời (mặc định {DEFAULT_PORT_RANGE[0]}-{DEFAULT_PORT_RANGE[1]})')
+    fleet.add_argument('--kinds', default='socks5', help="Listener cần đo, vd 'socks5,http'")
+    fleet.add_argument('--bandwidth-mbps', type=float, help='Tổng băng thông download cho phép (Mbps)')
+    fleet.add_argument('--gost-bin', help='Đường dẫn gost (mặc định bin/gost hoặc PATH)')
+    fleet.add_argument('--pings', type=int, default=10, help='Số request nhỏ để đo latency (mặc định 10)')
+    fleet.add_argument('--duration', type=float, default=10, help='Thời gian tối đa mỗi download (giây)')
+    fleet.add_argument('--probe-first', action='store_true',
+                       help='Probe TCP/TLS tới mọi server trước, bỏ server không kết nối được')
+    fleet.add_argument('--max-rtt-ms', type=float, help='Với --probe-first: bỏ server có connect RTT lớn hơn')
+    fleet.add_argument('--no-history', action='store_true', help='Không ghi kết quả vào logs/server_history.db')
+    fleet.add_argument('-o', '--output', help='File JSONL kết quả (mặc định logs/fleet_<time>.jsonl)')
+    fleet.set_defaults(func=cmd_fleet)
+
+    compare = subparsers.add_parser('compare', help='So sánh hai file kết quả, đánh dấu regression')
+    compare.add_argument('baseline', help='File kết quả baseline')
+    compare.add_argument('candidate', help='File kết quả cần so sánh')
+    compare.add_argument('--alpha', type=float, default=DEFAULT_ALPHA, help='Mức ý nghĩa (mặc định 0.05)')
+    compare.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                         help='Thay đổi median tối thiểu để tính là regression (mặc định 0.05 = 5%%)')
+    compare.add_argument('-o', '--output', help='Ghi report JSON')
+    compare.set_defaults(func=cmd_compare)
+
+    codec = subparsers.add_parser('json', help='Đo encode/decode JSON (stdlib vs fast_json/orjson)')
+    codec.add_argument('file', nargs='?', help='File JSON (mặc định nordvpn_servers_cache.json)')
+    codec.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='Số lần đo, lấy lần nhanh nhất')
+    codec.add_argument('-o', '--output', help='Ghi report JSON')
+    codec.set_defaults(func=cmd_json)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not getattr(args, 'func', None):
+        parser.print_help()
+        return 1
+    return args.func(args) or 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,290 @@
+"""
+Raw socket HTTP client
+Đo từng giai đoạn của request (TCP connect, proxy handshake, TLS, TTFB, tổng) qua một Target
+mà không phụ thuộc requests/curl
+"""
+
+import ssl
+import time
+import base64
+import socket
+import struct
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from .targets import Target
+
+DEFAULT_TIMEOUT_SECONDS = 15
+RECV_BUFFER_SIZE = 64 * 1024
+
+SOCKS5_REPLY_ERRORS = {
+    0x01: 'general SOCKS server failure',
+    0x02: 'connection not allowed by ruleset',
+    0x03: 'network unreachable',
+    0x04: 'host unreachable',
+    0x05: 'connection refused',
+    0x06: 'TTL expired',
+    0x07: 'command not supported',
+    0x08: 'address type not supported',
+}
+
+
+class BenchmarkError(Exception):
+    """Lỗi ở một giai đoạn cụ thể (stage: connect | handshake | tls | request | response)"""
+
+    def __init__(self, stage: str, message: str):
+        super().__init__(f"{stage}: {message}")
+        self.stage = stage
+
+
+def _ms(start: float, end: float) -> float:
+    return round((end - start) * 1000, 3)
+
+
+def _mbps(size: int, seconds: float) -> float:
+    return round((size * 8) / (seconds * 1024 * 1024), 3)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError('connection closed by proxy')
+        data += chunk
+    return data
+
+
+def socks5_connect(sock: socket.socket, dest_host: str, dest_port: int,
+                   username: Optional[str] = None, password: Optional[str] = None):
+    """SOCKS5 greeting + (auth) + CONNECT trên socket đã kết nối. Raise BenchmarkError nếu lỗi"""
+    methods = b'\x00\x02' if username else b'\x00'
+    sock.sendall(b'\x05' + bytes([len(methods)]) + methods)
+    version, method = _recv_exact(sock, 2)
+    if version != 5:
+        raise BenchmarkError('handshake', f'not a SOCKS5 server (version {version})')
+    if method == 0x02:
+        user = (username or '').encode()
+        pwd = (password or '').encode()
+        sock.sendall(b'\x01' + bytes([len(user)]) + user + bytes([len(pwd)]) + pwd)
+        if _recv_exact(sock, 2)[1] != 0:
+            raise BenchmarkError('handshake', 'SOCKS5 authentication failed')
+    elif method != 0x00:
+        raise BenchmarkError('handshake', 'no acceptable SOCKS5 auth method')
+
+    host_bytes = dest_host.encode('idna')
+    sock.sendall(b'\x05\x01\x00\x03' + bytes([len(host_bytes)]) + host_bytes + struct.pack('!H', dest_port))
+    _, reply, _, atyp = _recv_exact(sock, 4)
+    if reply != 0:
+        raise BenchmarkError('handshake', SOCKS5_REPLY_ERRORS.get(reply, f'SOCKS5 reply {reply}'))
+    if atyp == 0x01:
+        _recv_exact(sock, 4 + 2)
+    elif atyp == 0x04:
+        _recv_exact(sock, 16 + 2)
+    else:
+        _recv_exact(sock, _recv_exact(sock, 1)[0] + 2)
+
+
+def http_connect(sock: socket.socket, dest_host: str, dest_port: int,
+                 username: Optional[str] = None, password: Optional[str] = None):
+    """HTTP CONNECT qua proxy (gost HTTP listener hoặc upstream HTTPS proxy)"""
+    request = f"CONNECT {dest_host}:{dest_port} HTTP/1.1\r\nHost: {dest_host}:{dest_port}\r\n"
+    if username:
+        token = base64.b64encode(f"{username}:{password or ''}".encode()).decode()
+        request += f"Proxy-Authorization: Basic {token}\r\n"
+    sock.sendall((request + "\r\n").encode())
+
+    response = b''
+    while b'\r\n\r\n' not in response:
+        chunk = sock.recv(4096)
+        if not chunk:
+            raise BenchmarkError('handshake', 'connection closed during CONNECT')
+        response += chunk
+        if len(response) > 65536:
+            raise BenchmarkError('handshake', 'CONNECT response too large')
+    status_line = response.split(b'\r\n', 1)[0].decode('latin-1')
+    parts = status_line.split(' ', 2)
+    if len(parts) < 2 or not parts[1].isdigit():
+        raise BenchmarkError('handshake', f'invalid CONNECT response: {status_line}')
+    if parts[1] != '200':
+        raise BenchmarkError('handshake', status_line)
+
+
+def open_tunnel(target: Target, dest_host: str, dest_port: int,
+                timeout: float = DEFAULT_TIMEOUT_SECONDS) -> Tuple[socket.socket, Dict[str, float]]:
+    """
+    Mở kết nối TCP tới dest qua target.
+    Trả về (socket, timings) với timings gồm connect_ms (TCP tới hop đầu) và handshake_ms (proxy handshake + CONNECT).
+    """
+    timings = {'connect_ms': 0.0, 'handshake_ms': 0.0}
+    first_hop = (dest_host, dest_port) if target.kind == 'direct' else (target.host, target.port)
+
+    start = time.perf_counter()
+    try:
+        sock = socket.create_connection(first_hop, timeout=timeout)
+    except socket.timeout:
+        raise BenchmarkError('connect', f'timeout connecting to {first_hop[0]}:{first_hop[1]}')
+    except OSError as e:
+        raise BenchmarkError('connect', f'{first_hop[0]}:{first_hop[1]}: {e}')
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    connected = time.perf_counter()
+    timings['connect_ms'] = _ms(start, connected)
+
+    try:
+        if target.kind == 'https':
+            context = ssl.create_default_context()
+            if not target.verify_tls:
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+            sock = context.wrap_socket(sock, server_hostname=target.host)
+        if target.kind == 'socks5':
+            socks5_connect(sock, dest_host, dest_port, target.username, target.password)
+        elif target.kind in ('http', 'https'):
+            http_connect(sock, dest_host, dest_port, target.username, target.password)
+    except BenchmarkError:
+        sock.close()
+        raise
+    except socket.timeout:
+        sock.close()
+        raise BenchmarkError('handshake', 'timeout')
+    except (OSError, ssl.SSLError) as e:
+        sock.close()
+        raise BenchmarkError('handshake', str(e))
+    timings['handshake_ms'] = _ms(connected, time.perf_counter())
+    return sock, timings
+
+
+def _parse_headers(head: bytes) -> Tuple[int, Dict[str, str]]:
+    lines = head.decode('latin-1').split('\r\n')
+    parts = lines[0].split(' ', 2)
+    if len(parts) < 2 or not parts[1].isdigit():
+        raise BenchmarkError('response', f'invalid status line: {lines[0]}')
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    return int(parts[1]), headers
+
+
+def http_get(target: Target, url: str, timeout: float = DEFAULT_TIMEOUT_SECONDS,
+             max_bytes: Optional[int] = None, deadline: Optional[float] = None,
+             keep_body: bool = False, sample_interval: Optional[float] = None,
+             throttle: Optional[Callable[[int], None]] = None) -> Dict:
+    """
+    GET url qua target và đo thời gian từng giai đoạn.
+    Đọc tối đa max_bytes hoặc tới deadline (time.perf_counter()) nếu có.
+    sample_interval: ghi throughput (Mbps) theo từng khoảng sample_interval giây vào 'throughput_mbps'
+    throttle: gọi với số byte vừa nhận sau mỗi chunk (có thể block để giới hạn băng thông)
+    """
+    parsed = urlparse(url)
+    secure = parsed.scheme == 'https'
+    dest_host = parsed.hostname
+    dest_port = parsed.port or (443 if secure else 80)
+    path = parsed.path or '/'
+    if parsed.query:
+        path += '?' + parsed.query
+
+    result = {
+        'ok': False, 'status': None, 'bytes': 0,
+        'connect_ms': None, 'handshake_ms': None, 'tls_ms': None,
+        'ttfb_ms': None, 'total_ms': None, 'error': None, 'stage': None
+    }
+    start = time.perf_counter()
+    sock = None
+    try:
+        sock, timings = open_tunnel(target, dest_host, dest_port, timeout)
+        result.update(timings)
+
+        if secure:
+            tls_start = time.perf_counter()
+            context = ssl.create_default_context()
+            try:
+                sock = context.wrap_socket(sock, server_hostname=dest_host)
+            except (OSError, ssl.SSLError) as e:
+                raise BenchmarkError('tls', str(e))
+            result['tls_ms'] = _ms(tls_start, time.perf_counter())
+
+        request = (f"GET {path} HTTP/1.1\r\nHost: {parsed.netloc}\r\n"
+                   f"User-Agent: mac-proxy-benchmark/1\r\nAccept: */*\r\nConnection: close\r\n\r\n")
+        sent = time.perf_counter()
+        try:
+            sock.sendall(request.encode())
+            first = sock.recv(RECV_BUFFER_SIZE)
+        except (OSError, ssl.SSLError) as e:
+            raise BenchmarkError('request', str(e))
+        if not first:
+            raise BenchmarkError('response', 'empty response')
+        result['ttfb_ms'] = _ms(sent, time.perf_counter())
+
+        buffer = first
+        while b'\r\n\r\n' not in buffer:
+            chunk = sock.recv(RECV_BUFFER_SIZE)
+            if not chunk:
+                raise BenchmarkError('response', 'connection closed in headers')
+            buffer += chunk
+        head, _, body = buffer.partition(b'\r\n\r\n')
+        status, headers = _parse_headers(head)
+        result['status'] = status
+
+        content_length = headers.get('content-length')
+        expected = int(content_length) if content_length and content_length.isdigit() else None
+        limit = max_bytes if max_bytes is not None else expected
+        if expected is not None and limit is not None:
+            limit = min(limit, expected)
+
+        received = len(body)
+        chunks = [body] if keep_body else None
+        throughput = [] if sample_interval else None
+        window_start = time.perf_counter()
+        window_bytes = received
+        while limit is None or received < limit:
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            try:
+                chunk = sock.recv(RECV_BUFFER_SIZE)
+            except (OSError, ssl.SSLError) as e:
+                raise BenchmarkError('response', str(e))
+            if not chunk:
+                break
+            received += len(chunk)
+            if chunks is not None:
+                chunks.append(chunk)
+            if throttle is not None:
+                throttle(len(chunk))
+            if throughput is not None:
+                window_bytes += len(chunk)
+                now = time.perf_counter()
+                if now - window_start >= sample_interval:
+                    throughput.append(_mbps(window_bytes, now - window_start))
+                    window_start, window_bytes = now, 0
+
+        if throughput is not None:
+            # Khoảng cuối chỉ tính nếu đủ dài để không làm méo phân phối
+            elapsed = time.perf_counter() - window_start
+            if window_bytes and elapsed >= sample_interval / 2:
+                throughput.append(_mbps(window_bytes, elapsed))
+            result['throughput_mbps'] = throughput
+        result['bytes'] = received
+        result['ok'] = 200 <= status < 300
+        if not result['ok']:
+            result['error'] = f'HTTP {status}'
+            result['stage'] = 'response'
+        if chunks is not None:
+            result['body'] = b''.join(chunks)
+    except BenchmarkError as e:
+        result['error'] = str(e)
+        result['stage'] = e.stage
+    except socket.timeout:
+        result['error'] = 'timeout'
+        result['stage'] = 'response'
+    except OSError as e:
+        result['error'] = str(e)
+        result['stage'] = 'response'
+    finally:
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+    result['total_ms'] = _ms(start, time.perf_counter())
+    return result
@@ -0,0 +1,73 @@
+"""
+JSON codec microbenchmark
+Đo thời gian encode/decode một file JSON thật (mặc định nordvpn_servers_cache.json) qua stdlib json
+(indent như bản cache cũ và compact) và qua fast_json (orjson nếu đã cài), kèm kích thước output
+"""
+
+import os
+import json
+import time
+from typing import Callable, Dict, Optional
+
+DEFAULT_JSON_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                 'nordvpn_servers_cache.json')
+DEFAULT_REPEAT = 5
+
+
+def _best_ms(func: Callable[[], object], repeat: int) -> float:
+    """Thời gian tốt nhất (ms) trong `repeat` lần chạy: ít bị nhiễu bởi GC/scheduler hơn trung bình"""
+    best = float('inf')
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def run_codec_benchmark(path: Optional[str] = None, repeat: int = DEFAULT_REPEAT) -> Dict:
+    """{'file', 'size_bytes', 'backend', 'items', 'results': [{'name', 'decode_ms', 'encode_ms', 'size_bytes'}]}"""
+    import fast_json
+
+    path = path or DEFAULT_JSON_FILE
+    with open(path, 'rb') as f:
+        raw = f.read()
+    obj = json.loads(raw)
+
+    codecs = [
+        ('json (indent=2)', json.loads,
+         lambda: json.dumps(obj, indent=2).encode('utf-8')),
+        ('json (compact)', json.loads,
+         lambda: json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')),
+        (f'fast_json [{fast_json.BACKEND}]', fast_json.loads, lambda: fast_json.dumps(obj)),
+    ]
+    results = []
+    for name, decode, encode in codecs:
+        encoded = encode()
+        results.append({
+            'name': name,
+            'decode_ms': _best_ms(lambda: decode(encoded), repeat),
+            'encode_ms': _best_ms(encode, repeat),
+            'size_bytes': len(encoded)
+        })
+    return {
+        'file': path,
+        'size_bytes': len(raw),
+        'backend': fast_json.BACKEND,
+        'items': len(obj) if isinstance(obj, (list, dict)) else 1,
+        'repeat': repeat,
+        'results': results
+    }
+
+
+def print_codec_report(report: Dict):
+    print(f"📄 {report['file']}: {report['size_bytes'] / 1024 / 1024:.2f} MB, {report['items']} item(s), "
+          f"backend {report['backend']}, best of {report['repeat']}")
+    print(f"{'codec':<24} {'decode ms':>10} {'encode ms':>10} {'size KB':>10}")
+    baseline = report['results'][0] if report['results'] else None
+    for row in report['results']:
+        speedup = ''
+        if baseline and row is not baseline and row['decode_ms'] and row['encode_ms']:
+            speedup = (f"  (decode x{baseline['decode_ms'] / row['decode_ms']:.1f}, "
+                       f"encode x{baseline['encode_ms'] / row['encode_ms']:.1f})")
+        print(f"{row['name']:<24} {row['decode_ms']:>10.1f} {row['encode_ms']:>10.1f} "
+              f"{row['size_bytes'] / 1024:>10.0f}{speedup}")
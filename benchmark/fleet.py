@@ -0,0 +1,297 @@
+"""
+Fleet benchmark scheduler
+Benchmark song song K server từ catalog ProtonVPN/NordVPN: mỗi job mượn port gost tạm thời từ pool,
+download chia chung một ngân sách băng thông, kết quả ghi ra JSONL ngay khi từng server xong
+"""
+
+import os
+import json
+import time
+import socket
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, List, Optional
+
+from .gost import GostProcess
+from .runner import DEFAULT_RESULTS_DIR, INTERNET_URLS, run_suite
+from .targets import Target
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_PORT_RANGE = (8000, 8199)
+NORDVPN_PROXY_PORT = 89
+PROTONVPN_PROXY_PORT_BASE = 4443
+
+
+class PortPool:
+    """Cấp port gost tạm thời trong [start, end], bỏ qua port đang bị chiếm"""
+
+    def __init__(self, start: int = DEFAULT_PORT_RANGE[0], end: int = DEFAULT_PORT_RANGE[1]):
+        self.start = start
+        self.end = end
+        self._free = list(range(start, end + 1))
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+
+    @staticmethod
+    def _is_free(port: int) -> bool:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            # Giống gost (Go): SO_REUSEADDR nên port còn TIME_WAIT vẫn dùng lại được
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            try:
+                sock.bind(('127.0.0.1', port))
+                return True
+            except OSError:
+                return False
+
+    def acquire(self, timeout: Optional[float] = None) -> Optional[int]:
+        """Lấy một port trống (block tới khi có hoặc hết timeout)"""
+        deadline = time.time() + timeout if timeout is not None else None
+        with self._available:
+            while True:
+                for port in list(self._free):
+                    # Port có thể đang bị process khác chiếm (gost thật, webui...)
+                    if self._is_free(port):
+                        self._free.remove(port)
+                        return port
+                remaining = deadline - time.time() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._available.wait(min(remaining, 1.0) if remaining is not None else 1.0)
+
+    def release(self, port: int):
+        with self._available:
+            if port not in self._free:
+                self._free.append(port)
+            self._available.notify()
+
+
+class BandwidthBudget:
+    """Token bucket dùng chung cho mọi download: tổng tốc độ không vượt quá mbps"""
+
+    def __init__(self, mbps: Optional[float] = None, burst_seconds: float = 0.1):
+        self.rate = mbps * 1024 * 1024 / 8 if mbps else None  # bytes/giây
+        self.capacity = self.rate * burst_seconds if self.rate else None
+        self._tokens = self.capacity or 0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, size: int):
+        """Trừ size byte, sleep nếu vượt ngân sách"""
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= size
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+
+class JsonlResultStore:
+    """Append từng record (một dòng JSON) và flush ngay để theo dõi được khi đang chạy"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+
+    def append(self, record: Dict):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(line + '\n')
+                f.flush()
+
+
+def load_jsonl(path: str) -> List[Dict]:
+    records = []
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    return records
+
+
+def default_fleet_path(prefix: str = 'fleet') -> str:
+    return os.path.join(DEFAULT_RESULTS_DIR, f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl")
+
+
+def protonvpn_proxy_endpoint(server: Dict) -> tuple:
+    """Host và port của ProtonVPN proxy (port = label + 4443)"""
+    proxy_port = PROTONVPN_PROXY_PORT_BASE
+    if server.get('servers'):
+        try:
+            proxy_port = PROTONVPN_PROXY_PORT_BASE + int(server['servers'][0].get('label', '0') or 0)
+        except (ValueError, TypeError):
+            pass
+    return server.get('domain', ''), proxy_port
+
+
+def fleet_server(provider: str, server: Dict) -> Dict:
+    """Chuẩn hóa server của ProtonVPNAPI/NordVPNAPI về một dạng chung"""
+    if provider == 'protonvpn':
+        host, proxy_port = protonvpn_proxy_endpoint(server)
+    else:
+        host, proxy_port = server.get('hostname', ''), NORDVPN_PROXY_PORT
+    country = server.get('country') or {}
+    return {
+        'provider': provider,
+        'name': server.get('name') or host,
+        'host': host,
+        'proxy_port': proxy_port,
+        'country_code': country.get('code') if isinstance(country, dict) else server.get('country_code'),
+        'load': server.get('load'),
+        'tier': server.get('tier'),
+    }
+
+
+def catalog_servers(provider: str, country: Optional[str] = None, tier: Optional[int] = None,
+                    max_load: Optional[int] = None, limit: Optional[int] = None,
+                    online_only: bool = True) -> List[Dict]:
+    """Lọc catalog ProtonVPNAPI/NordVPNAPI theo country/tier/load, sắp theo load tăng dần"""
+    if provider == 'protonvpn':
+        from protonvpn_api import ProtonVPNAPI
+        api = ProtonVPNAPI()
+    elif provider == 'nordvpn':
+        from nordvpn_api import NordVPNAPI
+        api = NordVPNAPI()
+    else:
+        raise ValueError(f"Unknown provider: {provider}")
+
+    from catalog_query import CatalogQuery
+    servers = CatalogQuery({provider: api}).query(country=country, tier=tier, max_load=max_load,
+                                                  status='online' if online_only else None,
+                                                  sort='load', limit=limit or None)['servers']
+    return [fleet_server(provider, s) for s in servers]
+
+
+def probe_reachable(servers: List[Dict], timeout: float = 3.0, tls: bool = True,
+                    max_rtt_ms: Optional[float] = None, history=None) -> List[Dict]:
+    """
+    Probe TCP/TLS tới host:proxy_port của mọi server (entry_probe) trước khi spawn gost.
+    Trả về các server reachable, RTT thấp trước; lưu kết quả vào history nếu có
+    """
+    from entry_probe import probe_all
+    from server_history import upstream_key
+    candidates = [{'upstream': upstream_key(s['host'], s['proxy_port']), 'host': s['host'],
+                   'port': s['proxy_port'], 'sni': s['host'], 'server_name': s['name']} for s in servers]
+    results = probe_all(candidates, timeout=timeout, tls=tls)
+    if history is not None:
+        history.record_entry_probes(results)
+    by_upstream = {r['upstream']: r for r in results}
+    reachable = []
+    for server in servers:
+        probe = by_upstream.get(upstream_key(server['host'], server['proxy_port']))
+        if probe and probe['ok'] and (max_rtt_ms is None or probe['connect_ms'] <= max_rtt_ms):
+            reachable.append(dict(server, entry_connect_ms=probe['connect_ms'], entry_tls_ms=probe['tls_ms']))
+    return sorted(reachable, key=lambda s: s['entry_connect_ms'])
+
+
+def default_upstream_url(server: Dict) -> Optional[str]:
+    """Proxy URL (kèm credentials) cho server, dùng ProxyAPI như webui"""
+    from proxy_api import ProxyAPI
+    api = ProxyAPI()
+    if server['provider'] == 'nordvpn':
+        return api.get_nordvpn_proxy(server['host'])
+    return api.get_protonvpn_proxy_with_port(server['host'], server['proxy_port'])
+
+
+def benchmark_server(server: Dict, upstream_url: str, port_pool: PortPool, urls: Dict,
+                     kinds: Iterable[str] = ('socks5',), pings: int = 10, duration: float = 10,
+                     budget: Optional[BandwidthBudget] = None, gost_bin: Optional[str] = None,
+                     log_dir: Optional[str] = None) -> Dict:
+    """Benchmark một server qua gost tạm thời cho từng kind (socks5/http)"""
+    record = dict(server, started_at=datetime.now().isoformat(), results={}, error=None)
+    start = time.perf_counter()
+    throttle = budget.consume if budget and budget.rate else None
+    for kind in kinds:
+        port = port_pool.acquire(timeout=60)
+        if port is None:
+            record['results'][kind] = {'error': 'No free port in pool'}
+            continue
+        log_file = os.path.join(log_dir, f"gost_fleet_{kind}_{port}.log") if log_dir else None
+        gost = GostProcess(kind, port, upstream_url, gost_bin=gost_bin, log_file=log_file)
+        try:
+            if not gost.start():
+                record['results'][kind] = {'error': 'Failed to start gost'}
+                continue
+            target = Target(f"{server['name']}/{kind}", kind, '127.0.0.1', port)
+            record['results'][kind] = run_suite(target, urls, pings=pings, duration=duration,
+                                                verbose=False, throttle=throttle)
+        finally:
+            gost.stop()
+            port_pool.release(port)
+    record['duration_s'] = time.perf_counter() - start
+    return record
+
+
+def _record_line(record: Dict) -> str:
+    parts = []
+    for kind, suite in record['results'].items():
+        ping = ((suite.get('ping') or {}).get('histograms') or {}).get('total_ms')
+        speeds = [d['speed_mbps'] for d in (suite.get('downloads') or {}).values() if d.get('success')]
+        if ping or speeds:
+            parts.append(f"{kind} p50 {ping['p50']:.0f}ms" if ping else f"{kind}")
+            if speeds:
+                parts[-1] += f" {speeds[-1]:.1f} Mbps"
+        else:
+            error = suite.get('error') or ((suite.get('connection') or {}).get('error'))
+            parts.append(f"{kind} ❌ {error}")
+    return ', '.join(parts) or (record.get('error') or 'no result')
+
+
+def run_fleet(servers: List[Dict], concurrency: int = DEFAULT_CONCURRENCY, port_pool: Optional[PortPool] = None,
+              urls: Optional[Dict] = None, kinds: Iterable[str] = ('socks5',), pings: int = 10,
+              duration: float = 10, bandwidth_mbps: Optional[float] = None,
+              store: Optional[JsonlResultStore] = None,
+              upstream_url_fn: Callable[[Dict], Optional[str]] = default_upstream_url,
+              gost_bin: Optional[str] = None, log_dir: Optional[str] = None,
+              on_result: Optional[Callable[[Dict], None]] = None, verbose: bool = True) -> List[Dict]:
+    """
+    Benchmark các server với tối đa `concurrency` server cùng lúc.
+    Mỗi record được ghi vào store (và gọi on_result) ngay khi server đó xong
+    """
+    port_pool = port_pool or PortPool()
+    urls = urls or INTERNET_URLS
+    kinds = tuple(kinds)
+    budget = BandwidthBudget(bandwidth_mbps)
+    records = []
+    total = len(servers)
+
+    def job(server):
+        try:
+            upstream_url = upstream_url_fn(server)
+        except Exception as e:
+            upstream_url = None
+            error = str(e)
+        else:
+            error = None if upstream_url else 'Cannot build upstream proxy URL'
+        if not upstream_url:
+            return dict(server, started_at=datetime.now().isoformat(), results={}, error=error, duration_s=0)
+        return benchmark_server(server, upstream_url, port_pool, urls, kinds=kinds, pings=pings,
+                                duration=duration, budget=budget, gost_bin=gost_bin, log_dir=log_dir)
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = {executor.submit(job, server): server for server in servers}
+        for done, future in enumerate(as_completed(futures), 1):
+            server = futures[future]
+            try:
+                record = future.result()
+            except Exception as e:
+                record = dict(server, results={}, error=str(e))
+            records.append(record)
+            if store is not None:
+                store.append(record)
+            if on_result is not None:
+                on_result(record)
+            if verbose:
+                print(f"  [{done}/{total}] {record['name']} ({record['host']}:{record['proxy_port']}): "
+                      f"{_record_line(record)}")
+    return records
@@ -0,0 +1,102 @@
+"""
+Gost process tạm thời cho benchmark (listener SOCKS5/HTTP -> forward tới upstream)
+"""
+
+import os
+import time
+import shutil
+import socket
+import subprocess
+from typing import List, Optional
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PORT_READY_TIMEOUT_SECONDS = 5.0
+PORT_POLL_INTERVAL_SECONDS = 0.05
+
+
+def find_gost_bin(base_dir: str = BASE_DIR) -> Optional[str]:
+    """bin/gost trong repo, fallback gost trong PATH"""
+    local = os.path.join(base_dir, 'bin', 'gost')
+    if os.path.exists(local):
+        return local
+    return shutil.which('gost')
+
+
+def wait_for_port(port: int, host: str = '127.0.0.1', timeout: float = PORT_READY_TIMEOUT_SECONDS,
+                  process: Optional[subprocess.Popen] = None) -> bool:
+    """Đợi tới khi port nhận kết nối (thay cho time.sleep cố định)"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            return False
+        try:
+            with socket.create_connection((host, port), timeout=PORT_POLL_INTERVAL_SECONDS * 4):
+                return True
+        except OSError:
+            time.sleep(PORT_POLL_INTERVAL_SECONDS)
+    return False
+
+
+class GostProcess:
+    """
+    Chạy gost -L <kind>://:<port> -F <forward_url>.
+    kind: 'socks5' | 'http'; listener_options: query string giống manage_gost.sh (vd 'ttl=30s&so_keepalive=true')
+    """
+
+    def __init__(self, kind: str, port: int, forward_url: str, gost_bin: Optional[str] = None,
+                 log_file: Optional[str] = None, listener_options: str = '', debug: bool = False):
+        self.kind = kind
+        self.port = int(port)
+        self.forward_url = forward_url
+        self.gost_bin = gost_bin or find_gost_bin()
+        self.log_file = log_file
+        self.listener_options = listener_options
+        self.debug = debug
+        self.process: Optional[subprocess.Popen] = None
+
+    @property
+    def command(self) -> List[str]:
+        listener = f"{self.kind}://:{self.port}"
+        if self.listener_options:
+            listener += '?' + self.listener_options
+        cmd = [self.gost_bin, '-L', listener, '-F', self.forward_url]
+        if self.debug:
+            cmd.insert(1, '-D')
+        return cmd
+
+    def start(self, timeout: float = PORT_READY_TIMEOUT_SECONDS) -> bool:
+        if not self.gost_bin:
+            return False
+        output = open(self.log_file, 'w') if self.log_file else subprocess.DEVNULL
+        try:
+            self.process = subprocess.Popen(self.command, stdout=output, stderr=subprocess.STDOUT)
+        except OSError:
+            return False
+        finally:
+            if self.log_file:
+                output.close()
+        if wait_for_port(self.port, timeout=timeout, process=self.process):
+            return True
+        self.stop()
+        return False
+
+    def stop(self):
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.process = None
+
+    def __enter__(self):
+        if not self.start():
+            raise RuntimeError(f"Cannot start gost {self.kind} on port {self.port}")
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
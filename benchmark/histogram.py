@@ -0,0 +1,256 @@
+"""
+Histogram và kiểm định thống kê cho kết quả benchmark
+- Histogram: bucket log-linear kiểu HDR (sai số tương đối cố định), percentile p50/p90/p99/p99.9
+- mann_whitney_u: kiểm định Mann-Whitney U hai phía (xấp xỉ chuẩn, có hiệu chỉnh ties)
+- compare_results: so sánh hai file kết quả, đánh dấu regression có ý nghĩa thống kê
+"""
+
+import math
+from typing import Dict, Iterable, List, Optional
+
+DEFAULT_PERCENTILES = (50, 90, 99, 99.9)
+DEFAULT_SIGNIFICANT_DIGITS = 2
+DEFAULT_ALPHA = 0.05
+DEFAULT_THRESHOLD = 0.05  # 5% thay đổi median mới coi là đáng kể
+
+# metric -> chiều "tốt" (True: càng thấp càng tốt)
+LATENCY_METRICS = ('connect_ms', 'ttfb_ms', 'total_ms')
+
+
+def percentile_key(p: float) -> str:
+    """50 -> 'p50', 99.9 -> 'p99.9'"""
+    return f"p{p:g}"
+
+
+class Histogram:
+    """
+    Histogram log-linear: mỗi bucket rộng (1 + 10^-significant_digits) lần bucket trước,
+    nên percentile có sai số tương đối ~1% (significant_digits=2) bất kể dải giá trị.
+    Giá trị <= lowest gom vào bucket 0.
+    """
+
+    def __init__(self, significant_digits: int = DEFAULT_SIGNIFICANT_DIGITS, lowest: float = 0.001):
+        self.significant_digits = significant_digits
+        self.lowest = lowest
+        self._log_base = math.log1p(10 ** -significant_digits)
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    @classmethod
+    def from_values(cls, values: Iterable[float], **kwargs) -> 'Histogram':
+        histogram = cls(**kwargs)
+        for value in values:
+            histogram.record(value)
+        return histogram
+
+    def _index(self, value: float) -> int:
+        if value <= self.lowest:
+            return 0
+        return int(math.log(value / self.lowest) / self._log_base) + 1
+
+    def _value_at(self, index: int) -> float:
+        """Giá trị đại diện (trung điểm) của bucket"""
+        if index == 0:
+            return self.lowest
+        low = self.lowest * math.exp((index - 1) * self._log_base)
+        high = self.lowest * math.exp(index * self._log_base)
+        return (low + high) / 2
+
+    def record(self, value: Optional[float]):
+        if value is None:
+            return
+        index = self._index(value)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other: 'Histogram'):
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Giá trị tại percentile p (0-100), kẹp trong [min, max]"""
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(p / 100 * self.count))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(max(self._value_at(index), self.min), self.max)
+        return self.max
+
+    def percentiles(self, points: Iterable[float] = DEFAULT_PERCENTILES) -> Dict[str, Optional[float]]:
+        return {percentile_key(p): self.percentile(p) for p in points}
+
+    def to_dict(self, points: Iterable[float] = DEFAULT_PERCENTILES) -> Optional[Dict]:
+        if not self.count:
+            return None
+        return {
+            'count': self.count,
+            'min': self.min,
+            'max': self.max,
+            'mean': self.mean,
+            **self.percentiles(points)
+        }
+
+
+def histogram_summary(values: List[float]) -> Optional[Dict]:
+    """count/min/max/mean + p50/p90/p99/p99.9 (None nếu rỗng)"""
+    return Histogram.from_values(values).to_dict()
+
+
+def format_percentiles(stats: Optional[Dict], unit: str = 'ms') -> str:
+    if not stats:
+        return 'n/a'
+    return '  '.join(f"{percentile_key(p)} {stats[percentile_key(p)]:.2f}{unit}" for p in DEFAULT_PERCENTILES)
+
+
+def mann_whitney_u(a: List[float], b: List[float]) -> Optional[Dict]:
+    """
+    Kiểm định Mann-Whitney U hai phía (xấp xỉ chuẩn, hiệu chỉnh ties và continuity).
+    Trả về u, z, p_value và prob_greater = P(b > a) (0.5 = không khác biệt). None nếu thiếu mẫu
+    """
+    n1, n2 = len(a), len(b)
+    if n1 < 2 or n2 < 2:
+        return None
+
+    pooled = sorted([(value, 0) for value in a] + [(value, 1) for value in b])
+    ranks_a = 0.0
+    tie_term = 0.0
+    i = 0
+    while i < len(pooled):
+        j = i
+        while j + 1 < len(pooled) and pooled[j + 1][0] == pooled[i][0]:
+            j += 1
+        rank = (i + j) / 2 + 1
+        ties = j - i + 1
+        tie_term += ties ** 3 - ties
+        ranks_a += rank * sum(1 for k in range(i, j + 1) if pooled[k][1] == 0)
+        i = j + 1
+
+    u_a = ranks_a - n1 * (n1 + 1) / 2
+    u_b = n1 * n2 - u_a
+    n = n1 + n2
+    mean_u = n1 * n2 / 2
+    variance = n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1)))
+    if variance <= 0:
+        z, p_value = 0.0, 1.0
+    else:
+        diff = u_b - mean_u
+        diff -= math.copysign(0.5, diff) if diff else 0.0
+        z = diff / math.sqrt(variance)
+        p_value = min(1.0, math.erfc(abs(z) / math.sqrt(2)))
+    return {'u': min(u_a, u_b), 'z': z, 'p_value': p_value, 'prob_greater': u_b / (n1 * n2)}
+
+
+def compare_samples(baseline: List[float], candidate: List[float], lower_is_better: bool = True,
+                    alpha: float = DEFAULT_ALPHA, threshold: float = DEFAULT_THRESHOLD) -> Dict:
+    """
+    So sánh hai dãy mẫu của cùng một metric.
+    verdict: regression | improvement | same | insufficient
+    (regression khi p < alpha VÀ median xấu đi quá threshold)
+    """
+    base_hist = Histogram.from_values(baseline)
+    cand_hist = Histogram.from_values(candidate)
+    result = {
+        'baseline': base_hist.to_dict(),
+        'candidate': cand_hist.to_dict(),
+        'change': None,
+        'test': mann_whitney_u(baseline, candidate),
+        'verdict': 'insufficient'
+    }
+    if result['test'] is None or not base_hist.percentile(50):
+        return result
+
+    change = (cand_hist.percentile(50) - base_hist.percentile(50)) / base_hist.percentile(50)
+    result['change'] = change
+    worse = change > threshold if lower_is_better else change < -threshold
+    better = change < -threshold if lower_is_better else change > threshold
+    if result['test']['p_value'] < alpha and worse:
+        result['verdict'] = 'regression'
+    elif result['test']['p_value'] < alpha and better:
+        result['verdict'] = 'improvement'
+    else:
+        result['verdict'] = 'same'
+    return result
+
+
+def _latency_samples(suite: Dict, metric: str) -> List[float]:
+    samples = ((suite.get('ping') or {}).get('samples')) or []
+    return [s[metric] for s in samples if s.get('ok') and s.get(metric) is not None]
+
+
+def _throughput_samples(download: Dict) -> List[float]:
+    samples = download.get('throughput_mbps') or []
+    if not samples and download.get('success') and download.get('speed_mbps') is not None:
+        samples = [download['speed_mbps']]
+    return samples
+
+
+def compare_results(baseline: Dict, candidate: Dict, alpha: float = DEFAULT_ALPHA,
+                    threshold: float = DEFAULT_THRESHOLD) -> Dict:
+    """So sánh hai file kết quả benchmark theo tên target"""
+    base_suites = {suite['target']['name']: suite for suite in baseline.get('results', [])}
+    report = {'alpha': alpha, 'threshold': threshold, 'targets': {}, 'regressions': 0, 'improvements': 0}
+
+    for suite in candidate.get('results', []):
+        name = suite['target']['name']
+        base_suite = base_suites.get(name)
+        if base_suite is None:
+            continue
+        metrics = {}
+        for metric in LATENCY_METRICS:
+            metrics[metric] = compare_samples(_latency_samples(base_suite, metric), _latency_samples(suite, metric),
+                                              lower_is_better=True, alpha=alpha, threshold=threshold)
+        base_downloads = base_suite.get('downloads') or {}
+        for label, download in (suite.get('downloads') or {}).items():
+            if label in base_downloads:
+                metrics[f"download_{label}_mbps"] = compare_samples(
+                    _throughput_samples(base_downloads[label]), _throughput_samples(download),
+                    lower_is_better=False, alpha=alpha, threshold=threshold)
+        for comparison in metrics.values():
+            if comparison['verdict'] == 'regression':
+                report['regressions'] += 1
+            elif comparison['verdict'] == 'improvement':
+                report['improvements'] += 1
+        report['targets'][name] = metrics
+    return report
+
+
+def print_compare_report(report: Dict):
+    verdict_icons = {'regression': '❌', 'improvement': '✅', 'same': '➖', 'insufficient': '❔'}
+    print(f"\n{'=' * 60}")
+    print(f"📊 COMPARE (Mann-Whitney U, alpha={report['alpha']}, threshold={report['threshold'] * 100:.0f}%)")
+    print(f"{'=' * 60}")
+    if not report['targets']:
+        print("   ⚠️  No common targets between the two result files")
+        return
+    for name, metrics in report['targets'].items():
+        print(f"\n   🎯 {name}")
+        for metric, comparison in metrics.items():
+            base = comparison['baseline'] or {}
+            cand = comparison['candidate'] or {}
+            line = f"     {verdict_icons[comparison['verdict']]} {metric:<22}"
+            if base and cand:
+                line += (f" p50 {base['p50']:9.2f} -> {cand['p50']:9.2f}"
+                         f"  p99 {base['p99']:9.2f} -> {cand['p99']:9.2f}")
+            if comparison['change'] is not None:
+                line += f"  ({comparison['change'] * 100:+.1f}%, p={comparison['test']['p_value']:.4f})"
+            print(line)
+    print(f"\n   Regressions: {report['regressions']}, Improvements: {report['improvements']}")
@@ -0,0 +1,221 @@
+"""
+Benchmark runner
+Chạy bộ test (connection, ping, download) cho từng target và ghi kết quả JSON
+"""
+
+import os
+import json
+import time
+import socket
+import statistics
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from .client import http_get
+from .histogram import LATENCY_METRICS, format_percentiles, histogram_summary
+from .targets import Target
+
+RESULTS_VERSION = 2
+DOWNLOAD_SAMPLE_INTERVAL_SECONDS = 0.25
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_RESULTS_DIR = os.path.join(BASE_DIR, 'logs')
+
+# URL mặc định khi benchmark qua Internet (giống các script test cũ)
+INTERNET_URLS = {
+    'ping': 'https://ipinfo.io/ip',
+    'downloads': {
+        '1MB': 'https://speed.cloudflare.com/__down?bytes=1048576',
+        '10MB': 'https://speed.cloudflare.com/__down?bytes=10485760',
+    }
+}
+
+
+def local_urls(origin_base_url: str, download_sizes: Optional[List[int]] = None) -> Dict:
+    """URL trên origin server local"""
+    sizes = download_sizes or [1024 * 1024, 10 * 1024 * 1024]
+    return {
+        'ping': f"{origin_base_url}/ip",
+        'downloads': {_size_label(size): f"{origin_base_url}/bytes/{size}" for size in sizes}
+    }
+
+
+def _size_label(size: int) -> str:
+    if size >= 1024 * 1024 and size % (1024 * 1024) == 0:
+        return f"{size // (1024 * 1024)}MB"
+    if size >= 1024 and size % 1024 == 0:
+        return f"{size // 1024}KB"
+    return f"{size}B"
+
+
+def summarize(values: List[float]) -> Optional[Dict]:
+    """avg/min/max/median của một dãy số (None nếu rỗng)"""
+    if not values:
+        return None
+    return {
+        'count': len(values),
+        'avg': statistics.mean(values),
+        'min': min(values),
+        'max': max(values),
+        'median': statistics.median(values)
+    }
+
+
+def test_ping(target: Target, url: str, num_tests: int = 10, timeout: float = 10) -> Dict:
+    """Gửi num_tests request nhỏ tuần tự, trả về samples + thống kê"""
+    samples = [http_get(target, url, timeout=timeout) for _ in range(num_tests)]
+    ok = [s for s in samples if s['ok']]
+    return {
+        'success': bool(ok),
+        'total_tests': num_tests,
+        'success_tests': len(ok),
+        'success_rate': len(ok) / num_tests * 100 if num_tests else 0,
+        'samples': samples,
+        'total_ms': summarize([s['total_ms'] for s in ok]),
+        'connect_ms': summarize([s['connect_ms'] for s in ok]),
+        'handshake_ms': summarize([s['handshake_ms'] for s in ok]),
+        'ttfb_ms': summarize([s['ttfb_ms'] for s in ok]),
+        'histograms': {
+            metric: histogram_summary([s[metric] for s in ok if s[metric] is not None])
+            for metric in LATENCY_METRICS
+        },
+        'errors': [s['error'] for s in samples if not s['ok']]
+    }
+
+
+def test_download(target: Target, url: str, duration: float = 10, timeout: float = 30,
+                  sample_interval: float = DOWNLOAD_SAMPLE_INTERVAL_SECONDS,
+                  throttle: Optional[Callable[[int], None]] = None) -> Dict:
+    """Download url (tối đa duration giây), trả về bytes/time/Mbps và phân phối throughput theo khoảng"""
+    start = time.perf_counter()
+    sample = http_get(target, url, timeout=timeout, deadline=start + duration, sample_interval=sample_interval,
+                      throttle=throttle)
+    elapsed = time.perf_counter() - start
+    result = {
+        'success': sample['ok'] and sample['bytes'] > 0,
+        'url': url,
+        'bytes': sample['bytes'],
+        'time': elapsed,
+        'ttfb_ms': sample['ttfb_ms'],
+        'throughput_mbps': sample.get('throughput_mbps') or [],
+        'throughput': histogram_summary(sample.get('throughput_mbps') or []),
+        'error': sample['error']
+    }
+    if result['success'] and elapsed > 0:
+        result['speed_mbps'] = (sample['bytes'] * 8) / (elapsed * 1024 * 1024)
+        result['speed_mb_s'] = sample['bytes'] / (elapsed * 1024 * 1024)
+    elif not result['error']:
+        result['error'] = 'No data received'
+    return result
+
+
+def run_suite(target: Target, urls: Dict, pings: int = 10, duration: float = 10,
+              verbose: bool = True, throttle: Optional[Callable[[int], None]] = None) -> Dict:
+    """Chạy bộ test đầy đủ cho một target (throttle: giới hạn băng thông cho phần download)"""
+    if verbose:
+        print(f"\n{'=' * 60}")
+        print(f"🧪 Testing {target.name}")
+        print(f"   Target: {target.url()}")
+        print(f"{'=' * 60}")
+
+    results = {'target': target.to_dict(), 'connection': None, 'ping': None, 'downloads': {}}
+
+    connection = http_get(target, urls['ping'], timeout=10, keep_body=True)
+    body = connection.pop('body', b'')
+    connection['ip'] = body.decode(errors='replace').strip() if connection['ok'] else None
+    results['connection'] = connection
+    if not connection['ok']:
+        if verbose:
+            print(f"  ❌ Connection failed: {connection['error']}")
+        return results
+    if verbose:
+        print(f"  ✅ Connected! IP: {connection['ip']}, Latency: {connection['total_ms']:.2f}ms")
+        print(f"  📍 Testing ping ({pings} requests)...")
+
+    results['ping'] = test_ping(target, urls['ping'], pings)
+    ping = results['ping']
+    if verbose:
+        if ping['success']:
+            stats = ping['total_ms']
+            print(f"     Avg: {stats['avg']:.2f}ms, Min: {stats['min']:.2f}ms, "
+                  f"Max: {stats['max']:.2f}ms, Median: {stats['median']:.2f}ms")
+            print(f"     Success Rate: {ping['success_rate']:.1f}%")
+            for metric in ('connect_ms', 'ttfb_ms', 'total_ms'):
+                print(f"     {metric:<11} {format_percentiles(ping['histograms'][metric])}")
+        else:
+            print("     ❌ Ping test failed")
+
+    for label, url in urls.get('downloads', {}).items():
+        if verbose:
+            print(f"  ⬇️  Download {label} ({duration:.0f}s max)...")
+        download = test_download(target, url, duration=duration, throttle=throttle)
+        results['downloads'][label] = download
+        if verbose:
+            if download['success']:
+                print(f"     Speed: {download['speed_mbps']:.2f} Mbps ({download['speed_mb_s']:.2f} MB/s), "
+                      f"{download['bytes'] / 1024 / 1024:.2f} MB in {download['time']:.2f}s")
+                if download['throughput']:
+                    print(f"     Throughput {format_percentiles(download['throughput'], ' Mbps')}")
+            else:
+                print(f"     ❌ Failed: {download['error']}")
+    return results
+
+
+def new_results(command: str, config: Optional[Dict] = None) -> Dict:
+    return {
+        'version': RESULTS_VERSION,
+        'command': command,
+        'created_at': datetime.now().isoformat(),
+        'hostname': socket.gethostname(),
+        'config': config or {},
+        'results': []
+    }
+
+
+def default_results_path(prefix: str = 'benchmark') -> str:
+    return os.path.join(DEFAULT_RESULTS_DIR, f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+
+
+def write_results(results: Dict, path: Optional[str] = None) -> str:
+    path = path or default_results_path()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    return path
+
+
+def load_results(path: str) -> Dict:
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def _total_histogram(suite: Dict) -> Optional[Dict]:
+    histograms = (suite.get('ping') or {}).get('histograms')
+    if histograms is not None:
+        return histograms.get('total_ms')
+    # Kết quả version 1 chỉ có samples
+    samples = ((suite.get('ping') or {}).get('samples')) or []
+    return histogram_summary([s['total_ms'] for s in samples if s.get('ok')])
+
+
+def print_comparison(suites: List[Dict]):
+    """In bảng so sánh các target (so với target đầu tiên)"""
+    print(f"\n{'=' * 60}")
+    print("📊 COMPARISON RESULTS")
+    print(f"{'=' * 60}")
+
+    baseline = suites[0] if suites else None
+    for suite in suites:
+        name = suite['target']['name']
+        stats = _total_histogram(suite)
+        line = f"   {name:<20}"
+        if stats:
+            line += f" ping p50 {stats['p50']:8.2f}ms  p99 {stats['p99']:8.2f}ms"
+            base_stats = _total_histogram(baseline) if baseline else None
+            if suite is not baseline and base_stats:
+                line += f" ({stats['p50'] - base_stats['p50']:+.2f}ms)"
+        else:
+            line += " ping n/a"
+        print(line)
+        for label, download in (suite.get('downloads') or {}).items():
+            if download.get('success'):
+                print(f"   {'':<20} download {label}: {download['speed_mbps']:.2f} Mbps")
@@ -0,0 +1,163 @@
+"""
+Saturation test: tăng dần số stream song song (1 -> N) qua một hoặc nhiều target
+Đo aggregate throughput, độ công bằng giữa các stream (Jain) và mức concurrency
+mà throughput chững lại hoặc bắt đầu có lỗi. Chạy nhiều port cùng lúc để tìm trần của cả host
+"""
+
+import time
+import threading
+from typing import Dict, List, Optional
+
+from .client import http_get
+from .histogram import histogram_summary
+from .targets import Target
+
+DEFAULT_MAX_STREAMS = 64
+DEFAULT_LEVEL_DURATION_SECONDS = 5.0
+DEFAULT_PLATEAU_GAIN = 0.10  # tăng < 10% so với mức trước -> coi là plateau
+STREAM_TIMEOUT_SECONDS = 15
+
+
+def default_levels(max_streams: int = DEFAULT_MAX_STREAMS) -> List[int]:
+    """1, 2, 4, 8, ... tới max_streams"""
+    levels = []
+    level = 1
+    while level < max_streams:
+        levels.append(level)
+        level *= 2
+    levels.append(max_streams)
+    return levels
+
+
+def jain_fairness(values: List[float]) -> Optional[float]:
+    """Chỉ số Jain: 1.0 = chia đều hoàn toàn, 1/n = một stream chiếm hết"""
+    if not values:
+        return None
+    squares = sum(v * v for v in values)
+    if squares == 0:
+        return None
+    return sum(values) ** 2 / (len(values) * squares)
+
+
+def _run_streams(jobs: List[tuple], duration: float) -> List[Dict]:
+    """
+    jobs: [(target, url), ...] - mỗi job là một stream.
+    Tất cả stream bắt đầu cùng lúc (barrier) và dừng ở cùng deadline
+    """
+    results: List[Optional[Dict]] = [None] * len(jobs)
+    barrier = threading.Barrier(len(jobs) + 1)
+    shared = {}
+
+    def worker(index, target, url):
+        barrier.wait()
+        start = time.perf_counter()
+        sample = http_get(target, url, timeout=STREAM_TIMEOUT_SECONDS, deadline=shared['deadline'])
+        sample['elapsed'] = time.perf_counter() - start
+        results[index] = sample
+
+    threads = [threading.Thread(target=worker, args=(i, target, url), daemon=True)
+               for i, (target, url) in enumerate(jobs)]
+    for thread in threads:
+        thread.start()
+    shared['deadline'] = time.perf_counter() + duration
+    barrier.wait()
+    for thread in threads:
+        thread.join(duration + STREAM_TIMEOUT_SECONDS * 2)
+    return [r or {'ok': False, 'bytes': 0, 'elapsed': duration, 'error': 'stream did not finish', 'stage': None}
+            for r in results]
+
+
+def summarize_level(streams: List[Dict], duration: float) -> Dict:
+    """Tổng hợp một mức concurrency của một target"""
+    per_stream = [(s['bytes'] * 8) / (duration * 1024 * 1024) for s in streams]
+    errors = [s['error'] for s in streams if not s['ok']]
+    return {
+        'streams': len(streams),
+        'bytes': sum(s['bytes'] for s in streams),
+        'aggregate_mbps': sum(per_stream),
+        'per_stream_mbps': histogram_summary(per_stream),
+        'fairness': jain_fairness(per_stream),
+        'errors': len(errors),
+        'error_samples': errors[:5],
+        'ttfb_ms': histogram_summary([s['ttfb_ms'] for s in streams if s.get('ttfb_ms') is not None])
+    }
+
+
+def analyze_ramp(levels: List[Dict], plateau_gain: float = DEFAULT_PLATEAU_GAIN) -> Dict:
+    """Tìm mức plateau, mức bắt đầu lỗi và throughput đỉnh"""
+    plateau = None
+    for previous, current in zip(levels, levels[1:]):
+        if previous['aggregate_mbps'] <= 0:
+            continue
+        gain = current['aggregate_mbps'] / previous['aggregate_mbps'] - 1
+        if gain < plateau_gain:
+            plateau = previous['streams']
+            break
+    error_onset = next((level['streams'] for level in levels if level['errors']), None)
+    peak = max(levels, key=lambda level: level['aggregate_mbps']) if levels else None
+    return {
+        'plateau_streams': plateau,
+        'error_onset_streams': error_onset,
+        'peak_mbps': peak['aggregate_mbps'] if peak else None,
+        'peak_streams': peak['streams'] if peak else None
+    }
+
+
+def run_saturation(targets: List[Target], url: str, levels: Optional[List[int]] = None,
+                   duration: float = DEFAULT_LEVEL_DURATION_SECONDS,
+                   plateau_gain: float = DEFAULT_PLATEAU_GAIN, verbose: bool = True) -> Dict:
+    """
+    Ramp concurrency trên tất cả target cùng lúc: ở mỗi mức, mỗi target mở `level` stream.
+    Trả về kết quả từng target và tổng của host
+    """
+    levels = levels or default_levels()
+    per_target = {target.name: [] for target in targets}
+    host_levels = []
+
+    for level in levels:
+        jobs = [(target, url) for target in targets for _ in range(level)]
+        if verbose:
+            print(f"\n🚦 Level {level} stream(s) x {len(targets)} target(s) = {len(jobs)} streams, {duration:.0f}s...")
+        streams = _run_streams(jobs, duration)
+
+        for i, target in enumerate(targets):
+            summary = summarize_level(streams[i * level:(i + 1) * level], duration)
+            per_target[target.name].append(summary)
+            if verbose:
+                fairness = f"{summary['fairness']:.3f}" if summary['fairness'] is not None else 'n/a'
+                print(f"   {target.name:<20} {summary['aggregate_mbps']:10.2f} Mbps  "
+                      f"fairness {fairness}  errors {summary['errors']}")
+
+        host = summarize_level(streams, duration)
+        host['streams_per_target'] = level
+        host['streams'] = level  # analyze_ramp so sánh theo số stream mỗi target
+        host_levels.append(host)
+        if verbose and len(targets) > 1:
+            print(f"   {'HOST TOTAL':<20} {host['aggregate_mbps']:10.2f} Mbps  errors {host['errors']}")
+
+    return {
+        'url': url,
+        'levels': levels,
+        'duration': duration,
+        'plateau_gain': plateau_gain,
+        'targets': {
+            target.name: {'target': target.to_dict(), 'levels': per_target[target.name],
+                          'analysis': analyze_ramp(per_target[target.name], plateau_gain)}
+            for target in targets
+        },
+        'host': {'levels': host_levels, 'analysis': analyze_ramp(host_levels, plateau_gain)}
+    }
+
+
+def print_saturation_summary(result: Dict):
+    print(f"\n{'=' * 60}")
+    print("📊 SATURATION SUMMARY")
+    print(f"{'=' * 60}")
+    rows = list(result['targets'].items())
+    if len(rows) > 1:
+        rows.append(('HOST TOTAL', result['host']))
+    for name, data in rows:
+        analysis = data['analysis']
+        peak = f"{analysis['peak_mbps']:.2f} Mbps @ {analysis['peak_streams']}" if analysis['peak_mbps'] else 'n/a'
+        print(f"   {name:<20} peak {peak}  plateau @ {analysis['plateau_streams'] or '-'}  "
+              f"errors from {analysis['error_onset_streams'] or '-'}")
@@ -0,0 +1,242 @@
+"""
+Local benchmark servers
+- OriginServer: HTTP origin trả payload theo kích thước (/bytes/<n>), thay cho speed.cloudflare.com / ipinfo.io
+- ConnectProxyServer: upstream HTTP(S) CONNECT proxy giả lập ProtonVPN (Basic auth, TLS tùy chọn)
+Dùng để đo overhead của đường đi gost trên máy Linux không có Internet
+"""
+
+import os
+import ssl
+import base64
+import select
+import socket
+import shutil
+import threading
+import subprocess
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from .targets import redact_username
+
+PAYLOAD_CHUNK = b'\0' * (256 * 1024)
+MAX_PAYLOAD_BYTES = 10 * 1024 * 1024 * 1024  # 10GB
+RELAY_BUFFER_SIZE = 64 * 1024
+
+
+class _OriginHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'mac-proxy-origin/1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path in ('/', '/ip'):
+            body = (self.client_address[0] + '\n').encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        if path.startswith('/bytes/'):
+            try:
+                size = int(path[len('/bytes/'):])
+            except ValueError:
+                size = -1
+            if 0 <= size <= MAX_PAYLOAD_BYTES:
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/octet-stream')
+                self.send_header('Content-Length', str(size))
+                self.end_headers()
+                remaining = size
+                try:
+                    while remaining > 0:
+                        chunk = PAYLOAD_CHUNK[:min(remaining, len(PAYLOAD_CHUNK))]
+                        self.wfile.write(chunk)
+                        remaining -= len(chunk)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                return
+
+        self.send_error(404)
+
+
+class OriginServer:
+    """HTTP origin chạy trong thread nền. Dùng làm context manager"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        self.httpd = ThreadingHTTPServer((host, port), _OriginHandler)
+        self.httpd.daemon_threads = True
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self):
+        return self.httpd.server_address[:2]
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.address
+        return f"http://{host}:{port}"
+
+    def url(self, path: str) -> str:
+        return self.base_url + path
+
+    def start(self) -> 'OriginServer':
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='bench-origin', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+
+def relay(left: socket.socket, right: socket.socket):
+    """Chuyển dữ liệu hai chiều cho tới khi một bên đóng"""
+    sockets = [left, right]
+    try:
+        while True:
+            readable, _, _ = select.select(sockets, [], [], 60)
+            if not readable:
+                return
+            for sock in readable:
+                data = sock.recv(RELAY_BUFFER_SIZE)
+                if not data:
+                    return
+                (right if sock is left else left).sendall(data)
+    except (OSError, ssl.SSLError):
+        return
+
+
+class _ConnectHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        server = self.server
+        sock = self.request
+        if server.ssl_context is not None:
+            try:
+                sock = server.ssl_context.wrap_socket(sock, server_side=True)
+            except (OSError, ssl.SSLError):
+                return
+
+        head = b''
+        while b'\r\n\r\n' not in head:
+            chunk = sock.recv(4096)
+            if not chunk or len(head) > 65536:
+                return
+            head += chunk
+        lines = head.split(b'\r\n\r\n', 1)[0].decode('latin-1').split('\r\n')
+        parts = lines[0].split(' ')
+        if len(parts) < 2 or parts[0] != 'CONNECT':
+            sock.sendall(b'HTTP/1.1 405 Method Not Allowed\r\nContent-Length: 0\r\n\r\n')
+            return
+
+        if server.expected_auth:
+            auth = ''
+            for line in lines[1:]:
+                name, _, value = line.partition(':')
+                if name.strip().lower() == 'proxy-authorization':
+                    auth = value.strip()
+            if auth != server.expected_auth:
+                sock.sendall(b'HTTP/1.1 407 Proxy Authentication Required\r\n'
+                             b'Proxy-Authenticate: Basic realm="proxy"\r\nContent-Length: 0\r\n\r\n')
+                return
+
+        host, _, port = parts[1].rpartition(':')
+        try:
+            upstream = socket.create_connection((host.strip('[]'), int(port)), timeout=10)
+        except (OSError, ValueError):
+            sock.sendall(b'HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\n\r\n')
+            return
+        upstream.settimeout(None)
+        try:
+            sock.sendall(b'HTTP/1.1 200 Connection established\r\n\r\n')
+            relay(sock, upstream)
+        finally:
+            upstream.close()
+
+
+class _ThreadingTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class ConnectProxyServer:
+    """
+    Upstream CONNECT proxy giả lập (ProtonVPN dùng HTTPS proxy với Basic auth).
+    certfile/keyfile: bật TLS; username/password: yêu cầu Proxy-Authorization (sai -> 407)
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0,
+                 certfile: Optional[str] = None, keyfile: Optional[str] = None,
+                 username: Optional[str] = None, password: Optional[str] = None):
+        self.server = _ThreadingTCPServer((host, port), _ConnectHandler)
+        self.server.ssl_context = None
+        if certfile:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile, keyfile)
+            self.server.ssl_context = context
+        self.server.expected_auth = None
+        if username:
+            token = base64.b64encode(f"{username}:{password or ''}".encode()).decode()
+            self.server.expected_auth = f"Basic {token}"
+        self.username = username
+        self.password = password
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self):
+        return self.server.server_address[:2]
+
+    @property
+    def scheme(self) -> str:
+        return 'https' if self.server.ssl_context else 'http'
+
+    def proxy_url(self, redact: bool = False) -> str:
+        host, port = self.address
+        auth = ''
+        if self.username:
+            auth = f"{redact_username(self.username)}:***@" if redact else f"{self.username}:{self.password or ''}@"
+        return f"{self.scheme}://{auth}{host}:{port}"
+
+    def start(self) -> 'ConnectProxyServer':
+        self.thread = threading.Thread(target=self.server.serve_forever, name='bench-upstream', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+
+def generate_self_signed_cert(directory: str) -> Optional[tuple]:
+    """Tạo cert tự ký bằng openssl (cho upstream TLS), trả về (certfile, keyfile) hoặc None"""
+    if not shutil.which('openssl'):
+        return None
+    certfile = os.path.join(directory, 'upstream.crt')
+    keyfile = os.path.join(directory, 'upstream.key')
+    result = subprocess.run(
+        ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+         '-subj', '/CN=127.0.0.1', '-keyout', keyfile, '-out', certfile],
+        capture_output=True, timeout=30
+    )
+    if result.returncode != 0:
+        return None
+    return certfile, keyfile
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Catalog Payloads
+Response danh sách server được format + encode JSON một lần cho mỗi version của catalog,
+chia sẵn theo country, lưu kèm bản gzip (và brotli nếu cài gói `brotli`) với ETag mạnh.
+Request lặp lại chỉ trả bytes đã có sẵn hoặc 304, không format/serialize lại hàng nghìn server.
+"""
+
+import gzip
+import hashlib
+import threading
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+import fast_json
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+class Payload:
+    """JSON đã encode + các bản nén, mỗi content-coding một ETag riêng (ETag mạnh theo từng representation)"""
+    __slots__ = ('body', 'gzip', 'br', 'etag')
+
+    def __init__(self, obj):
+        self.body = fast_json.dumps(obj)
+        self.gzip = gzip.compress(self.body, compresslevel=GZIP_LEVEL, mtime=0)
+        self.br = brotli.compress(self.body, quality=BROTLI_QUALITY) if brotli is not None else None
+        self.etag = hashlib.sha256(self.body).hexdigest()[:32]
+
+    def tag(self, encoding: Optional[str] = None) -> str:
+        return f'"{self.etag}-{encoding}"' if encoding else f'"{self.etag}"'
+
+
+def _accepted_encodings(accept_encoding: str) -> Dict[str, float]:
+    result = {}
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        result[name.strip().lower()] = quality
+    return result
+
+
+def negotiate(payload: Payload, accept_encoding: str = '', if_none_match: str = '') -> Tuple[bytes, int, Dict[str, str]]:
+    """(body, status, headers) cho request: 304 nếu ETag khớp, ưu tiên br > gzip > không nén"""
+    accepted = _accepted_encodings(accept_encoding)
+    wildcard = accepted.get('*', 0.0)
+    if payload.br is not None and accepted.get('br', wildcard) > 0:
+        encoding, body = 'br', payload.br
+    elif accepted.get('gzip', wildcard) > 0:
+        encoding, body = 'gzip', payload.gzip
+    else:
+        encoding, body = None, payload.body
+
+    headers = {'ETag': payload.tag(encoding), 'Vary': 'Accept-Encoding', 'Cache-Control': 'no-cache'}
+    if if_none_match:
+        candidates = {tag.strip() for tag in if_none_match.split(',')}
+        if '*' in candidates or candidates & {payload.tag(None), payload.tag('gzip'), payload.tag('br')}:
+            return b'', 304, headers
+
+    headers['Content-Type'] = 'application/json'
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return body, 200, headers
+
+
+class CatalogPayloads:
+    """
+    Cache payload của một provider: formatter(server) -> row cho /servers/formatted.
+    Đổi version (catalog mới) -> format lại một lần và bỏ toàn bộ payload cũ
+    """
+
+    def __init__(self, formatter: Callable[[Dict], Dict]):
+        self.formatter = formatter
+        self._version: Optional[Hashable] = None
+        self._rows: List[Dict] = []
+        self._by_country: Dict[str, List[Dict]] = {}
+        self._payloads: Dict[Hashable, Payload] = {}
+        self._empty = Payload({'success': True, 'servers': [], 'count': 0})
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def _ensure_version(self, servers: List[Dict], version: Hashable):
+        if version == self._version:
+            return
+        rows = [self.formatter(server) for server in servers]
+        by_country: Dict[str, List[Dict]] = {}
+        for row in rows:
+            by_country.setdefault((row.get('country_code') or '').lower(), []).append(row)
+        self._rows, self._by_country, self._payloads = rows, by_country, {}
+        self._version = version
+
+    def formatted(self, servers: List[Dict], version: Hashable, country: Optional[str] = None) -> Payload:
+        """
+        Payload {'success', 'servers', 'count'} cho cả catalog hoặc một country.
+        Country không có trong catalog (input tùy ý) dùng chung một payload rỗng, không cache theo giá trị
+        """
+        country = (country or '').lower()
+        with self._lock:
+            self._ensure_version(servers, version)
+            if country and country not in self._by_country:
+                return self._empty
+            key = ('formatted', country)
+            payload = self._payloads.get(key)
+            if payload is None:
+                rows = self._by_country[country] if country else self._rows
+                payload = Payload({'success': True, 'servers': rows, 'count': len(rows)})
+                self._payloads[key] = payload
+                self.builds += 1
+            return payload
+
+    def payload(self, servers: List[Dict], version: Hashable, key: Hashable, build: Callable[[], object]) -> Payload:
+        """Payload tùy ý (vd danh sách country) được memo theo version"""
+        with self._lock:
+            self._ensure_version(servers, version)
+            payload = self._payloads.get(key)
+            if payload is None:
+                payload = Payload(build())
+                self._payloads[key] = payload
+                self.builds += 1
+            return payload
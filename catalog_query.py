@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""
+Catalog Query
+Query layer trên catalog server NordVPN/ProtonVPN: filter theo country, city, tier (tối thiểu),
+max load, status, features (bitmask ProtonVPN) và provider; sort nhiều key; phân trang limit/cursor;
+projection field. Mỗi catalog có một CatalogIndex build một lần cho mỗi version (inverted index
+theo từng field + thứ tự sort memo sẵn) nên query chỉ giao các tập vị trí, không quét tuyến tính.
+
+CatalogIndex cũng là snapshot bất biến (list + index + version) mà CatalogStore publish: snapshot mới
+được build hoàn chỉnh ở bên ngoài rồi mới thay reference (một phép gán, nguyên tử), reader không lock.
+"""
+
+import json
+import base64
+import hashlib
+import zlib
+import threading
+from bisect import bisect_left, bisect_right
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+DEFAULT_SORT = 'load'
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 1000
+SORT_COLUMNS = ('load', 'score', 'tier', 'name', 'country', 'city')
+# Tập ứng viên nhỏ hơn 1/8 catalog: sort trực tiếp thay vì duyệt thứ tự sort đã memo
+_DIRECT_SORT_RATIO = 8
+
+
+def _values(value) -> List[str]:
+    """'JP,us' / ['JP', 'us'] -> ['jp', 'us']"""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.split(',')
+    return [str(item).strip().lower() for item in value if str(item).strip()]
+
+
+def parse_sort(sort: Optional[str]) -> List[Tuple[str, bool]]:
+    """'load,-score' -> [('load', False), ('score', True)]"""
+    spec = []
+    for item in _values(sort or DEFAULT_SORT):
+        descending = item.startswith('-')
+        column = item.lstrip('+-')
+        if column not in SORT_COLUMNS:
+            raise ValueError(f"Invalid sort key: {column} (allowed: {', '.join(SORT_COLUMNS)})")
+        spec.append((column, descending))
+    return spec
+
+
+def _number(value, default=0):
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else default
+
+
+def server_keys(server: Dict) -> Dict:
+    """Giá trị dùng để index/sort một server (chuẩn hóa khác biệt NordVPN/ProtonVPN)"""
+    country = server.get('country') or {}
+    if not isinstance(country, dict):
+        country = {'code': server.get('country_code', ''), 'city': server.get('city', '')}
+    return {
+        'load': _number(server.get('load'), 100),
+        'score': _number(server.get('score')),
+        'tier': int(_number(server.get('tier'))),
+        'name': (server.get('name') or '').lower(),
+        'country': (country.get('code') or '').lower(),
+        'city': (country.get('city') or server.get('city') or '').lower(),
+        'status': (server.get('status') or '').lower(),
+        'features': int(_number(server.get('features')))
+    }
+
+
+def name_hash(name: str) -> int:
+    return zlib.crc32(name.strip().lower().encode('utf-8'))
+
+
+class CatalogIndex:
+    """Index của một danh sách server (một provider, một version)"""
+
+    def __init__(self, provider: str, servers: Sequence[Dict], version=None):
+        self.provider = provider
+        # Tuple: snapshot được chia sẻ giữa mọi reader, không ai được sort/shuffle tại chỗ
+        self.servers = tuple(servers)
+        self.version = version
+
+        columns = {column: [] for column in SORT_COLUMNS}
+        self.by_country: Dict[str, List[int]] = {}
+        self.by_city: Dict[str, List[int]] = {}
+        self.by_status: Dict[str, List[int]] = {}
+        self.by_tier: Dict[int, List[int]] = {}
+        self.by_feature: Dict[int, List[int]] = {}
+        names = []
+        for position, server in enumerate(servers):
+            keys = server_keys(server)
+            for column in SORT_COLUMNS:
+                columns[column].append(keys[column])
+
+            self.by_country.setdefault(keys['country'], []).append(position)
+            self.by_city.setdefault(keys['city'], []).append(position)
+            self.by_status.setdefault(keys['status'], []).append(position)
+            self.by_tier.setdefault(keys['tier'], []).append(position)
+            features, bit = keys['features'], 1
+            while bit <= features:
+                if features & bit:
+                    self.by_feature.setdefault(bit, []).append(position)
+                bit <<= 1
+            for name in {server.get('name') or '', server.get('hostname') or server.get('domain') or ''}:
+                if name:
+                    names.append((name_hash(name), position))
+        self.columns = columns
+        self._orders: Dict[Tuple, List[int]] = {}
+        self._lock = threading.Lock()
+
+        # Vị trí sắp theo load + dãy load tương ứng: max_load = một lần bisect
+        self._load_order = self.order([('load', False)])
+        self._loads = [columns['load'][position] for position in self._load_order]
+        # Tra cứu theo name/hostname: crc32 đã sort + vị trí tương ứng (bisect, không dict string)
+        names.sort()
+        self._name_hashes = [entry[0] for entry in names]
+        self._name_positions = [entry[1] for entry in names]
+
+    def __len__(self):
+        return len(self.servers)
+
+    def sort_value(self, column: str, position: int):
+        """Giá trị sort so sánh được giữa các index (kể cả index của provider khác)"""
+        return self.columns[column][position]
+
+    def find(self, name: str) -> Optional[Dict]:
+        """Server có name hoặc hostname/domain = name (không phân biệt hoa thường)"""
+        wanted = name.strip().lower()
+        hashes, wanted_hash = self._name_hashes, name_hash(wanted)
+        i = bisect_left(hashes, wanted_hash)
+        while i < len(hashes) and hashes[i] == wanted_hash:
+            server = self.servers[self._name_positions[i]]
+            if wanted in ((server.get('name') or '').lower(),
+                          (server.get('hostname') or server.get('domain') or '').lower()):
+                return server
+            i += 1
+        return None
+
+    def _sorted(self, positions: Iterable[int], spec: List[Tuple[str, bool]]) -> List[int]:
+        # Sort ổn định nhiều lượt (key cuối trước), hòa thì giữ thứ tự trong catalog
+        result = sorted(positions)
+        for column, descending in reversed(spec):
+            result.sort(key=self.columns[column].__getitem__, reverse=descending)
+        return result
+
+    def order(self, spec: List[Tuple[str, bool]]) -> List[int]:
+        """Toàn bộ vị trí theo thứ tự sort, memo theo spec"""
+        key = tuple(spec)
+        result = self._orders.get(key)
+        if result is None:
+            result = self._sorted(range(len(self.servers)), spec)
+            with self._lock:
+                self._orders[key] = result
+        return result
+
+    def select(self, country=None, city=None, tier: Optional[int] = None, max_load: Optional[float] = None,
+               status=None, features: Optional[int] = None) -> Optional[Set[int]]:
+        """Tập vị trí khớp mọi filter (None = không có filter nào, tức toàn bộ catalog)"""
+        candidates = []
+        if country is not None:
+            candidates.append([p for code in _values(country) for p in self.by_country.get(code, ())])
+        if city is not None:
+            candidates.append([p for name in _values(city) for p in self.by_city.get(name, ())])
+        if status is not None:
+            candidates.append([p for name in _values(status) for p in self.by_status.get(name, ())])
+        if tier is not None:
+            candidates.append([p for value, positions in self.by_tier.items() if value >= tier for p in positions])
+        if max_load is not None:
+            candidates.append(self._load_order[:bisect_right(self._loads, max_load)])
+        if features:
+            bit = 1
+            while bit <= features:
+                if features & bit:
+                    candidates.append(self.by_feature.get(bit, ()))
+                bit <<= 1
+        if not candidates:
+            return None
+
+        candidates.sort(key=len)
+        result = set(candidates[0])
+        for positions in candidates[1:]:
+            if not result:
+                break
+            result.intersection_update(positions)
+        return result
+
+    def page(self, selected: Optional[Set[int]], spec: List[Tuple[str, bool]], offset: int = 0,
+             limit: Optional[int] = None) -> Tuple[List[int], int]:
+        """(vị trí của trang [offset, offset + limit) theo thứ tự sort, tổng số khớp)"""
+        end = None if limit is None else offset + limit
+        if selected is None:
+            return list(self.order(spec)[offset:end]), len(self.servers)
+        total = len(selected)
+        if end is None or total * _DIRECT_SORT_RATIO < len(self.servers):
+            return self._sorted(selected, spec)[offset:end], total
+        # Tập lớn: duyệt thứ tự đã memo, dừng khi đủ trang
+        result = []
+        for position in self.order(spec):
+            if position in selected:
+                result.append(position)
+                if len(result) >= end:
+                    break
+        return result[offset:], total
+
+    def servers_for(self, **filters) -> List[Dict]:
+        """Server khớp filter, giữ thứ tự trong catalog"""
+        selected = self.select(**filters)
+        if selected is None:
+            return list(self.servers)
+        return [self.servers[position] for position in sorted(selected)]
+
+
+class CatalogStore:
+    """
+    Snapshot catalog hiện tại của một provider + refresh single-flight:
+    - đọc `snapshot` không lock; refresh build snapshot mới ở bên ngoài rồi mới swap reference
+    - tại một thời điểm chỉ một thread chạy loader; thread khác đọc snapshot cũ thay vì chờ
+      (chỉ chờ khi chưa có snapshot nào, hoặc wait=True) và dùng luôn kết quả của lượt refresh đó
+    - bật CATALOG_SHARED_DIR (nhiều worker process): snapshot là file mmap dùng chung (catalog_shm),
+      loader chạy dưới flock nên cả host chỉ một process refresh
+    """
+
+    def __init__(self, provider: str, shared_dir: Optional[str] = None):
+        self.provider = provider
+        self.snapshot: Optional[CatalogIndex] = None
+        self._refresh_lock = threading.Lock()
+        from catalog_shm import shared_catalog
+        self.shared = shared_catalog(provider, shared_dir)
+
+    def publish(self, servers: Sequence[Dict], version) -> CatalogIndex:
+        """Build index cho servers (lưu thành tuple read-only) và swap vào"""
+        snapshot = CatalogIndex(self.provider, servers, version)
+        self.snapshot = snapshot
+        return snapshot
+
+    def get(self, loader: Callable[[Optional[CatalogIndex]], CatalogIndex], wait: bool = False) -> CatalogIndex:
+        """
+        loader(snapshot hiện tại) -> snapshot (trả lại chính nó nếu không có gì mới, publish() nếu có);
+        chạy dưới refresh lock
+        """
+        if self.shared is not None:
+            # Worker khác đã publish bản mới: chỉ cần map lại
+            self.snapshot = self.shared.current() or self.snapshot
+        current = self.snapshot
+        if not self._refresh_lock.acquire(blocking=current is None or wait):
+            # Thread khác đang refresh: trả snapshot hiện có, không chờ
+            return current
+        try:
+            latest = self.snapshot
+            if latest is not None and latest is not current:
+                # Thread khác vừa refresh xong trong lúc chờ lock: không build lại lần nữa
+                return latest
+            if self.shared is not None:
+                latest = self.shared.refresh(loader, current, wait=wait)
+            else:
+                latest = loader(current)
+            self.snapshot = latest
+            return latest
+        finally:
+            self._refresh_lock.release()
+
+
+def project(server: Dict, fields: Optional[List[str]]) -> Dict:
+    """Chỉ giữ các field yêu cầu, hỗ trợ đường dẫn lồng 'country.code'"""
+    if not fields:
+        return dict(server)
+    result: Dict = {}
+    for field in fields:
+        value, found = server, True
+        for part in field.split('.'):
+            if isinstance(value, dict) and part in value:
+                value = value[part]
+            else:
+                found = False
+                break
+        if not found:
+            continue
+        target = result
+        parts = field.split('.')
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = value
+    return result
+
+
+def encode_cursor(offset: int, fingerprint: str) -> str:
+    raw = json.dumps({'o': offset, 'v': fingerprint}, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, fingerprint: str) -> int:
+    """Offset trong cursor; ValueError nếu cursor hỏng hoặc catalog đã đổi từ lúc cấp cursor"""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        offset = int(data['o'])
+    except (ValueError, KeyError, TypeError):
+        raise ValueError('Invalid cursor')
+    if data.get('v') != fingerprint or offset < 0:
+        raise ValueError('Cursor expired: catalog changed, restart without cursor')
+    return offset
+
+
+def parse_query(args) -> Dict:
+    """Tham số query string (request.args) -> kwargs cho CatalogQuery.query; ValueError nếu sai"""
+    def number(name, cast):
+        value = args.get(name)
+        if value in (None, ''):
+            return None
+        try:
+            return cast(value)
+        except ValueError:
+            raise ValueError(f"Invalid {name}: {value}")
+
+    limit = number('limit', int)
+    if limit is None:
+        limit = DEFAULT_LIMIT
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ValueError(f"limit must be between 1 and {MAX_LIMIT}")
+    return {
+        'provider': args.get('provider') or None,
+        'country': args.get('country') or None,
+        'city': args.get('city') or None,
+        'tier': number('tier', int),
+        'max_load': number('max_load', float),
+        'status': args.get('status') or None,
+        # Bitmask: '12' hoặc '0xc'
+        'features': number('features', lambda value: int(value, 0)),
+        'sort': args.get('sort') or DEFAULT_SORT,
+        'limit': limit,
+        'cursor': args.get('cursor') or None,
+        'fields': [field.strip() for field in (args.get('fields') or '').split(',') if field.strip()] or None,
+        'refresh': (args.get('refresh') or 'false').lower() == 'true'
+    }
+
+
+class CatalogQuery:
+    """Query trên một hoặc nhiều provider: {'nordvpn': NordVPNAPI, 'protonvpn': ProtonVPNAPI}"""
+
+    def __init__(self, providers: Dict[str, object]):
+        self.providers = {name: api for name, api in providers.items() if api is not None}
+
+    def indexes(self, provider=None, refresh: bool = False) -> Tuple[List[CatalogIndex], Dict[str, str]]:
+        """
+        (index của các provider, lỗi theo provider): provider chỉ định rõ mà lỗi thì raise,
+        không chỉ định thì bỏ qua provider lỗi (vd ProtonVPN chưa có cache và không gọi được API)
+        """
+        names = _values(provider)
+        unknown = [name for name in names if name not in self.providers]
+        if unknown:
+            raise ValueError(f"Unknown provider: {', '.join(unknown)} (available: {', '.join(self.providers)})")
+        result, errors = [], {}
+        for name in names or list(self.providers):
+            api = self.providers[name]
+            try:
+                api.fetch_servers(force_refresh=refresh)
+                result.append(api.catalog_index())
+            except Exception as e:
+                if names:
+                    raise
+                errors[name] = str(e)
+        return result, errors
+
+    def query(self, provider=None, country=None, city=None, tier: Optional[int] = None,
+              max_load: Optional[float] = None, status=None, features: Optional[int] = None,
+              sort: str = DEFAULT_SORT, limit: Optional[int] = DEFAULT_LIMIT, cursor: Optional[str] = None,
+              fields: Optional[List[str]] = None, refresh: bool = False) -> Dict:
+        """
+        {'servers': [...], 'count', 'total', 'next_cursor', 'version'} (+ 'errors' nếu có provider bị bỏ qua):
+        server kèm field 'provider', limit=None trả toàn bộ (chỉ dùng nội bộ)
+        """
+        spec = parse_sort(sort)
+        indexes, errors = self.indexes(provider, refresh=refresh)
+        filters = {'country': country, 'city': city, 'tier': tier, 'max_load': max_load,
+                   'status': status, 'features': features}
+        fingerprint = hashlib.sha256(json.dumps(
+            [[index.provider, str(index.version), len(index)] for index in indexes]
+            + [filters, spec], sort_keys=True, default=str).encode()).hexdigest()[:16]
+        offset = decode_cursor(cursor, fingerprint) if cursor else 0
+
+        total = 0
+        rows: List[Tuple[CatalogIndex, int]] = []
+        for index in indexes:
+            # Mỗi provider chỉ cần offset + limit phần tử đầu: trang toàn cục nằm trong hợp của chúng
+            positions, matched = index.page(index.select(**filters), spec, 0,
+                                            None if limit is None else offset + limit)
+            total += matched
+            rows.extend((index, position) for position in positions)
+        if len(indexes) > 1:
+            for column, descending in reversed(spec):
+                rows.sort(key=lambda row: row[0].sort_value(column, row[1]), reverse=descending)
+
+        end = None if limit is None else offset + limit
+        page = rows[offset:end]
+        servers = [dict(project(index.servers[position], fields), provider=index.provider)
+                   for index, position in page]
+        result = {
+            'servers': servers,
+            'count': len(servers),
+            'total': total,
+            'next_cursor': encode_cursor(end, fingerprint) if end is not None and end < total else None,
+            'version': fingerprint
+        }
+        if errors:
+            result['errors'] = errors
+        return result
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Catalog Shared Memory
+Chia sẻ snapshot catalog (servers + index) giữa nhiều worker process qua một file memory-mapped
+(CATALOG_SHARED_DIR/<provider>.catalog):
+- một process giữ flock <provider>.catalog.lock làm "host" cho lượt refresh: gọi API/đọc cache,
+  build snapshot rồi ghi file mới (file tạm + rename, generation tăng dần) - mỗi host refresh đúng một lần
+- mọi worker mmap file read-only: index là memoryview trực tiếp trên page cache dùng chung
+  (không copy theo worker), server chỉ được decode JSON khi thực sự đọc tới dòng đó
+- file cũ bị rename đè vẫn hợp lệ với worker đang map nó cho tới khi worker chuyển sang file mới
+
+Layout: MAGIC | uint32 độ dài header | header JSON | các mảng (căn 8 byte): offset dòng (Q),
+dữ liệu dòng (JSON compact), cột sort (d/q/I), posting list (I), thứ tự sort (I), hash tên (I)
+"""
+
+import os
+import mmap
+import time
+import fcntl
+import struct
+import threading
+from array import array
+from typing import Callable, Dict, List, Optional
+
+import fast_json
+from catalog_query import SORT_COLUMNS, CatalogIndex, server_keys
+
+SHARED_DIR = os.environ.get('CATALOG_SHARED_DIR', '')
+MAGIC = b'MPCATLG1'
+FORMAT_VERSION = 1
+_HEADER_LENGTH = struct.Struct('<I')
+_ALIGN = 8
+# Cột chuỗi được lưu dưới dạng thứ hạng (uint32) trong tập giá trị đã sort: sort theo hạng = sort theo chuỗi
+_STRING_COLUMNS = ('name', 'country', 'city')
+_COLUMN_CODES = {'load': 'd', 'score': 'd', 'tier': 'q', 'name': 'I', 'country': 'I', 'city': 'I'}
+_POSTINGS = ('by_country', 'by_city', 'by_status', 'by_tier', 'by_feature')
+
+
+class _Builder:
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.size = 0
+
+    def add(self, data: bytes) -> int:
+        offset = self.size
+        self.chunks.append(data)
+        self.size += len(data)
+        padding = -self.size % _ALIGN
+        if padding:
+            self.chunks.append(b'\0' * padding)
+            self.size += padding
+        return offset
+
+    def add_array(self, code: str, values) -> List:
+        values = array(code, values)
+        return [code, self.add(values.tobytes()), len(values)]
+
+
+def encode_catalog(index: CatalogIndex, generation: int) -> bytes:
+    """Serialize một CatalogIndex (list Python) thành nội dung file catalog dùng chung"""
+    body = _Builder()
+    rows = [fast_json.dumps(server) for server in index.servers]
+    offsets = [0]
+    for row in rows:
+        offsets.append(offsets[-1] + len(row))
+    header = {
+        'format': FORMAT_VERSION,
+        'provider': index.provider,
+        'version': index.version,
+        'generation': generation,
+        'published_at': time.time(),
+        'pid': os.getpid(),
+        'count': len(rows),
+        'row_offsets': body.add_array('Q', offsets),
+        'rows': body.add(b''.join(rows)),
+        'columns': {},
+        'postings': {},
+        'orders': {}
+    }
+    for column in SORT_COLUMNS:
+        values = index.columns[column]
+        if column in _STRING_COLUMNS:
+            rank = {value: i for i, value in enumerate(sorted(set(values)))}
+            values = [rank[value] for value in values]
+        header['columns'][column] = body.add_array(_COLUMN_CODES[column], values)
+    for name in _POSTINGS:
+        header['postings'][name] = {str(key): body.add_array('I', positions)
+                                    for key, positions in getattr(index, name).items()}
+    for column in SORT_COLUMNS:
+        header['orders'][column] = body.add_array('I', index.order([(column, False)]))
+    header['loads'] = body.add_array('d', index._loads)
+    header['name_hashes'] = body.add_array('I', index._name_hashes)
+    header['name_positions'] = body.add_array('I', index._name_positions)
+
+    encoded = fast_json.dumps(header)
+    prefix = MAGIC + _HEADER_LENGTH.pack(len(encoded)) + encoded
+    prefix += b'\0' * (-len(prefix) % _ALIGN)
+    # Offset trong header tính từ đầu vùng dữ liệu (ngay sau prefix)
+    return prefix + b''.join(body.chunks)
+
+
+class MappedRows:
+    """Sequence server read-only trên mmap: mỗi lần truy cập decode một dòng JSON"""
+
+    def __init__(self, view: memoryview, offsets: memoryview):
+        self._view = view
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        return fast_json.loads(self._view[self._offsets[position]:self._offsets[position + 1]])
+
+    def __iter__(self):
+        for position in range(len(self)):
+            yield self[position]
+
+    def __bool__(self):
+        return len(self) > 0
+
+
+class MappedCatalog(CatalogIndex):
+    """CatalogIndex trên file catalog dùng chung đã mmap (read-only, không copy index vào process)"""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"Not a catalog file: {path}")
+        (header_length,) = _HEADER_LENGTH.unpack_from(self._mmap, len(MAGIC))
+        start = len(MAGIC) + _HEADER_LENGTH.size
+        header = fast_json.loads(self._mmap[start:start + header_length])
+        if header.get('format') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported catalog format: {header.get('format')}")
+        base = start + header_length
+        base += -base % _ALIGN
+        view = memoryview(self._mmap)[base:]
+
+        def mapped_array(spec):
+            code, offset, count = spec
+            itemsize = array(code).itemsize
+            return view[offset:offset + count * itemsize].cast(code)
+
+        self.header = header
+        self.provider = header['provider']
+        self.version = header['version']
+        self.generation = header['generation']
+        offsets = mapped_array(header['row_offsets'])
+        self.servers = MappedRows(view[header['rows']:], offsets)
+        self.columns = {column: mapped_array(spec) for column, spec in header['columns'].items()}
+        for name in _POSTINGS:
+            numeric = name in ('by_tier', 'by_feature')
+            setattr(self, name, {int(key) if numeric else key: mapped_array(spec)
+                                 for key, spec in header['postings'][name].items()})
+        self._orders = {((column, False),): mapped_array(spec) for column, spec in header['orders'].items()}
+        self._lock = threading.Lock()
+        self._load_order = self._orders[(('load', False),)]
+        self._loads = mapped_array(header['loads'])
+        self._name_hashes = mapped_array(header['name_hashes'])
+        self._name_positions = mapped_array(header['name_positions'])
+
+    def sort_value(self, column: str, position: int):
+        # Cột chuỗi chỉ có thứ hạng trong file này: lấy lại giá trị thật để so với index khác
+        if column in _STRING_COLUMNS:
+            return server_keys(self.servers[position])[column]
+        return self.columns[column][position]
+
+
+class SharedCatalog:
+    """File catalog dùng chung của một provider: map bản mới nhất, refresh dưới flock liên process"""
+
+    def __init__(self, path: str, provider: str):
+        self.path = path
+        self.provider = provider
+        self._mapped: Optional[MappedCatalog] = None
+        self._lock_file = None
+
+    def current(self) -> Optional[MappedCatalog]:
+        """Snapshot đã publish mới nhất (map lại khi file đổi, một os.stat mỗi lần gọi)"""
+        mapped = self._mapped
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return mapped
+        if mapped is None or mapped.key != (stat.st_ino, stat.st_mtime_ns, stat.st_size):
+            try:
+                mapped = MappedCatalog(self.path)
+            except (OSError, ValueError) as e:
+                print(f"⚠️  Cannot map shared catalog {self.path}: {e}")
+                return self._mapped
+            self._mapped = mapped
+        return mapped
+
+    def publish(self, index: CatalogIndex) -> MappedCatalog:
+        """Ghi snapshot thành file mới (generation + 1) rồi rename đè, trả về bản đã map"""
+        previous = self.current()
+        data = encode_catalog(index, (previous.generation if previous is not None else 0) + 1)
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.tmp.{os.getpid()}"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+        return self.current()
+
+    def _acquire(self, blocking: bool) -> bool:
+        if self._lock_file is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._lock_file = open(f"{self.path}.lock", 'a')
+        try:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            return True
+        except BlockingIOError:
+            return False
+
+    def _release(self):
+        fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def refresh(self, loader: Callable[[Optional[CatalogIndex]], CatalogIndex],
+                current: Optional[CatalogIndex], wait: bool = False) -> Optional[CatalogIndex]:
+        """
+        Chạy loader dưới flock (một process trên cả host); process khác đang refresh thì trả current
+        (hoặc chờ nếu wait) và dùng luôn bản nó publish
+        """
+        if not self._acquire(blocking=wait or current is None):
+            return current
+        try:
+            latest = self.current()
+            if latest is not None and latest is not current:
+                return latest
+            result = loader(latest)
+            if result is latest or isinstance(result, MappedCatalog):
+                return result
+            return self.publish(result)
+        finally:
+            self._release()
+
+
+def shared_catalog(provider: str, shared_dir: Optional[str] = None) -> Optional[SharedCatalog]:
+    """SharedCatalog cho provider nếu bật CATALOG_SHARED_DIR, None nếu chạy một process"""
+    shared_dir = SHARED_DIR if shared_dir is None else shared_dir
+    if not shared_dir:
+        return None
+    return SharedCatalog(os.path.join(os.path.abspath(shared_dir), f'{provider}.catalog'), provider)
+
+
+def main(argv: List[str]) -> int:
+    """python3 catalog_shm.py FILE: in header của file catalog dùng chung"""
+    if not argv:
+        print("Usage: catalog_shm.py CATALOG_FILE")
+        return 1
+    catalog = MappedCatalog(argv[0])
+    info = {key: value for key, value in catalog.header.items()
+            if key in ('provider', 'version', 'generation', 'published_at', 'pid', 'count')}
+    info['size_bytes'] = catalog.key[2]
+    print(fast_json.dumps_str(info, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Config Repository
+Đọc/ghi config/gost_<port>.config qua cache trong bộ nhớ (invalidate theo mtime_ns + size)
+"""
+
+import os
+import re
+import copy
+import tempfile
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import fast_json
+
+CONFIG_FILE_PATTERN = re.compile(r'^gost_(\d+)\.config$')
+
+
+class ConfigRepository:
+    """
+    Cache các gost config đã parse, key theo path.
+    Mỗi lần đọc chỉ tốn một os.stat(); file chỉ được parse lại khi (mtime_ns, size) thay đổi.
+    Ghi qua temp file + os.replace nên reader không bao giờ thấy file ghi dở.
+    """
+
+    def __init__(self, config_dir: str, state_store=None):
+        self.config_dir = os.path.abspath(config_dir)
+        self._cache: Dict[str, Tuple[Tuple[int, int], dict]] = {}
+        self._lock = threading.Lock()
+        # Nếu có state store thì config được ghi đồng thời vào SQLite
+        self.state_store = state_store
+
+    def _port_from_path(self, path: str) -> Optional[str]:
+        match = CONFIG_FILE_PATTERN.match(os.path.basename(path))
+        return match.group(1) if match else None
+
+    def _sync_state_store(self, path: str, config: Optional[dict]):
+        port = self._port_from_path(path)
+        if self.state_store is None or port is None:
+            return
+        try:
+            if config is None:
+                self.state_store.delete_port(port)
+            else:
+                self.state_store.set_config(port, config)
+        except Exception as e:
+            print(f"⚠️  Error syncing config {port} to state store: {e}")
+
+    def path_for(self, port) -> str:
+        return os.path.join(self.config_dir, f'gost_{port}.config')
+
+    def _load_path(self, path: str) -> Optional[dict]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            with self._lock:
+                self._cache.pop(path, None)
+            return None
+
+        key = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            cached = self._cache.get(path)
+        if cached and cached[0] == key:
+            return cached[1]
+
+        try:
+            config = fast_json.load_file(path)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(config, dict):
+            return None
+
+        with self._lock:
+            self._cache[path] = (key, config)
+        return config
+
+    def load(self, port) -> Optional[dict]:
+        """Trả về bản copy config của port (None nếu không có hoặc lỗi parse)"""
+        config = self._load_path(self.path_for(port))
+        return copy.deepcopy(config) if config is not None else None
+
+    def load_path(self, path: str) -> Optional[dict]:
+        """Giống load() nhưng nhận đường dẫn file"""
+        config = self._load_path(os.path.abspath(path))
+        return copy.deepcopy(config) if config is not None else None
+
+    def ports(self) -> List[str]:
+        """Danh sách port có file config (đã sort)"""
+        try:
+            names = os.listdir(self.config_dir)
+        except OSError:
+            return []
+        ports = []
+        for name in names:
+            match = CONFIG_FILE_PATTERN.match(name)
+            if match:
+                ports.append(match.group(1))
+        return sorted(ports)
+
+    def load_all(self) -> Dict[str, dict]:
+        """Đọc toàn bộ config: {port: config}. Chỉ parse lại những file đã thay đổi"""
+        result = {}
+        for port in self.ports():
+            config = self._load_path(self.path_for(port))
+            if config is not None:
+                result[port] = copy.deepcopy(config)
+
+        # Bỏ các entry của file đã bị xóa
+        live = {self.path_for(port) for port in result}
+        with self._lock:
+            for path in list(self._cache):
+                if path not in live and os.path.dirname(path) == self.config_dir:
+                    self._cache.pop(path, None)
+        return result
+
+    def save(self, port, config: dict, indent: Optional[int] = 4) -> bool:
+        """Ghi config (atomic) và cập nhật cache"""
+        return self.save_path(self.path_for(port), config, indent=indent)
+
+    def save_path(self, path: str, config: dict, indent: Optional[int] = 4) -> bool:
+        path = os.path.abspath(path)
+        directory = os.path.dirname(path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix='.gost_', suffix='.tmp', dir=directory)
+            try:
+                # Config người dùng có thể mở/sửa tay: giữ indent (mặc định 4)
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(fast_json.dumps(config, indent=indent))
+                os.replace(tmp_path, path)
+            except BaseException:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                raise
+            st = os.stat(path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"⚠️  Error saving config {path}: {e}")
+            return False
+
+        with self._lock:
+            self._cache[path] = ((st.st_mtime_ns, st.st_size), copy.deepcopy(config))
+        self._sync_state_store(path, config)
+        return True
+
+    def delete(self, port) -> bool:
+        """Xóa file config của port"""
+        path = self.path_for(port)
+        with self._lock:
+            self._cache.pop(path, None)
+        self._sync_state_store(path, None)
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    def invalidate(self, path: Optional[str] = None):
+        """Xóa cache của một file (hoặc toàn bộ)"""
+        with self._lock:
+            if path is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(os.path.abspath(path), None)
+
+
+_repositories: Dict[str, ConfigRepository] = {}
+_repositories_lock = threading.Lock()
+
+
+def get_config_repository(config_dir: str, state_store=None) -> ConfigRepository:
+    """Repository dùng chung trong process cho mỗi thư mục config"""
+    config_dir = os.path.abspath(config_dir)
+    with _repositories_lock:
+        repo = _repositories.get(config_dir)
+        if repo is None:
+            repo = ConfigRepository(config_dir, state_store=state_store)
+            _repositories[config_dir] = repo
+        elif state_store is not None and repo.state_store is None:
+            repo.state_store = state_store
+        return repo
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Entry Probe
+Probe hàng nghìn entry point trong catalog (Proton entry_ip:4443+label, NordVPN station:89) đồng thời bằng asyncio:
+TCP connect RTT và (tùy chọn) thời gian TLS handshake, timeout chặt. Kết quả lưu vào bảng entry_probes
+của server history để bỏ qua server chết/quá xa trước khi spawn gost.
+"""
+
+import os
+import sys
+import ssl
+import time
+import socket
+import asyncio
+import argparse
+from typing import Dict, List, Optional
+
+from server_history import get_server_history, upstream_key
+
+DEFAULT_CONCURRENCY = int(os.environ.get('ENTRY_PROBE_CONCURRENCY', '2000'))
+DEFAULT_TIMEOUT_SECONDS = 3.0
+NORDVPN_PROXY_PORT = 89
+PROTONVPN_PROXY_PORT_BASE = 4443
+# Số file descriptor dự phòng ngoài các socket probe
+FD_HEADROOM = 256
+
+
+def raise_nofile_limit(wanted: int) -> int:
+    """Nâng soft limit RLIMIT_NOFILE (macOS mặc định 256) cho đủ số socket đồng thời"""
+    try:
+        import resource
+    except ImportError:
+        return wanted
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    target = wanted + FD_HEADROOM
+    if soft != resource.RLIM_INFINITY and soft < target:
+        new_soft = target if hard == resource.RLIM_INFINITY else min(target, hard)
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (new_soft, hard))
+            soft = new_soft
+        except (ValueError, OSError):
+            pass
+    if soft == resource.RLIM_INFINITY:
+        return wanted
+    return max(1, min(wanted, soft - FD_HEADROOM))
+
+
+def candidates_from_catalog(provider: str, servers: List[Dict]) -> List[Dict]:
+    """
+    Các entry point cần probe: {upstream, host, port, server_name, sni}.
+    Proton: mỗi physical server (entry_ip, port 4443+label); NordVPN: station:89
+    """
+    candidates = []
+    for server in servers:
+        if provider == 'protonvpn':
+            for physical in server.get('servers') or [{}]:
+                try:
+                    proxy_port = PROTONVPN_PROXY_PORT_BASE + int(physical.get('label') or 0)
+                except (ValueError, TypeError):
+                    proxy_port = PROTONVPN_PROXY_PORT_BASE
+                domain = server.get('domain', '')
+                host = physical.get('entry_ip') or server.get('entry_ip') or domain
+                if host:
+                    candidates.append({'upstream': upstream_key(domain, proxy_port), 'host': host,
+                                       'port': proxy_port, 'server_name': server.get('name', ''), 'sni': domain})
+        else:
+            hostname = server.get('hostname', '')
+            host = server.get('station') or hostname
+            if host:
+                candidates.append({'upstream': upstream_key(hostname, NORDVPN_PROXY_PORT), 'host': host,
+                                   'port': NORDVPN_PROXY_PORT, 'server_name': server.get('name', ''),
+                                   'sni': hostname})
+    # Proton có thể trùng upstream giữa các physical server: giữ entry đầu tiên
+    return list({c['upstream']: c for c in reversed(candidates)}.values())[::-1]
+
+
+class _ProbeProtocol(asyncio.Protocol):
+    """Ghi thời điểm connection_made/handshake xong ngay trong callback của loop (không chờ coroutine resume)"""
+
+    def __init__(self):
+        self.connected_at: Optional[float] = None
+
+    def connection_made(self, transport):
+        if self.connected_at is None:
+            self.connected_at = time.perf_counter()
+
+
+def _tls_context(verify: bool) -> ssl.SSLContext:
+    context = ssl.create_default_context()
+    if not verify:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+async def probe_endpoint(candidate: Dict, timeout: float = DEFAULT_TIMEOUT_SECONDS,
+                         tls_context: Optional[ssl.SSLContext] = None) -> Dict:
+    """
+    TCP connect (+ TLS handshake nếu có tls_context) tới candidate['host']:candidate['port'].
+    stage lỗi: connect | tls; connect_ms/tls_ms đo riêng
+    """
+    loop = asyncio.get_running_loop()
+    result = dict(candidate, ok=False, connect_ms=None, tls_ms=None, stage=None, error=None,
+                  probed_at=time.time())
+    transport = None
+    try:
+        start = time.perf_counter()
+        try:
+            transport, protocol = await asyncio.wait_for(
+                loop.create_connection(_ProbeProtocol, candidate['host'], candidate['port']), timeout)
+        except asyncio.TimeoutError:
+            result.update(stage='connect', error='timeout')
+            return result
+        except socket.gaierror as e:
+            result.update(stage='dns', error=str(e))
+            return result
+        except OSError as e:
+            result.update(stage='connect', error=e.strerror or str(e))
+            return result
+        connected = protocol.connected_at or time.perf_counter()
+        result['connect_ms'] = round((connected - start) * 1000, 3)
+
+        if tls_context is not None:
+            connected = time.perf_counter()
+            remaining = max(0.05, timeout - (connected - start))
+            try:
+                transport = await asyncio.wait_for(
+                    loop.start_tls(transport, protocol, tls_context,
+                                   server_hostname=candidate.get('sni') or candidate['host']),
+                    remaining)
+            except asyncio.TimeoutError:
+                result.update(stage='tls', error='timeout')
+                return result
+            except (OSError, ssl.SSLError, ConnectionError) as e:
+                result.update(stage='tls', error=str(e) or e.__class__.__name__)
+                return result
+            result['tls_ms'] = round((time.perf_counter() - connected) * 1000, 3)
+
+        result['ok'] = True
+        return result
+    finally:
+        if transport is not None:
+            transport.abort()
+
+
+async def probe_many(candidates: List[Dict], concurrency: int = DEFAULT_CONCURRENCY,
+                     timeout: float = DEFAULT_TIMEOUT_SECONDS, tls: bool = False,
+                     verify_tls: bool = False, on_result=None) -> List[Dict]:
+    """Probe tất cả candidates với tối đa concurrency socket đồng thời"""
+    concurrency = raise_nofile_limit(max(1, concurrency))
+    semaphore = asyncio.Semaphore(concurrency)
+    tls_context = _tls_context(verify_tls) if tls else None
+
+    async def run(candidate):
+        async with semaphore:
+            result = await probe_endpoint(candidate, timeout, tls_context)
+        if on_result is not None:
+            on_result(result)
+        return result
+
+    return await asyncio.gather(*[run(candidate) for candidate in candidates])
+
+
+def probe_all(candidates: List[Dict], **kwargs) -> List[Dict]:
+    """Bản đồng bộ của probe_many (dùng từ code không async)"""
+    return asyncio.run(probe_many(candidates, **kwargs))
+
+
+def summarize_results(results: List[Dict]) -> Dict:
+    ok = [r for r in results if r['ok']]
+    rtts = sorted(r['connect_ms'] for r in ok)
+    stages: Dict[str, int] = {}
+    for r in results:
+        if not r['ok']:
+            stages[r['stage']] = stages.get(r['stage'], 0) + 1
+    return {
+        'total': len(results),
+        'reachable': len(ok),
+        'failures_by_stage': stages,
+        'connect_ms_p50': rtts[len(rtts) // 2] if rtts else None,
+        'connect_ms_p90': rtts[int(len(rtts) * 0.9)] if rtts else None,
+    }
+
+
+async def _local_selftest(listeners: int, closed: int, concurrency: int, timeout: float, tls: bool) -> List[Dict]:
+    """Mở `listeners` listener local (+ `closed` port đã đóng) rồi probe tất cả"""
+    ssl_context = None
+    workdir = None
+    if tls:
+        import tempfile
+        from benchmark.servers import generate_self_signed_cert
+        workdir = tempfile.TemporaryDirectory(prefix='entry-probe-')
+        cert = generate_self_signed_cert(workdir.name)
+        if cert:
+            ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            ssl_context.load_cert_chain(*cert)
+
+    async def handle(reader, writer):
+        writer.close()
+
+    raise_nofile_limit(listeners * 3 + concurrency)
+    servers = [await asyncio.start_server(handle, '127.0.0.1', 0, ssl=ssl_context) for _ in range(listeners)]
+    candidates = [{'upstream': f'listener-{i}:{s.sockets[0].getsockname()[1]}', 'host': '127.0.0.1',
+                   'port': s.sockets[0].getsockname()[1], 'server_name': f'listener-{i}', 'sni': 'localhost'}
+                  for i, s in enumerate(servers)]
+    for i in range(closed):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        candidates.append({'upstream': f'closed-{i}:{port}', 'host': '127.0.0.1', 'port': port,
+                           'server_name': f'closed-{i}', 'sni': 'localhost'})
+    try:
+        return await probe_many(candidates, concurrency=concurrency, timeout=timeout, tls=tls)
+    finally:
+        for server in servers:
+            server.close()
+        if workdir is not None:
+            workdir.cleanup()
+
+
+def _load_catalog(provider: str, country: Optional[str]) -> List[Dict]:
+    if provider == 'protonvpn':
+        from protonvpn_api import ProtonVPNAPI
+        api = ProtonVPNAPI()
+    else:
+        from nordvpn_api import NordVPNAPI
+        api = NordVPNAPI()
+    servers = api.get_servers_by_country(country) if country else api.get_all_servers()
+    return [s for s in servers if s.get('status', 'online') == 'online']
+
+
+def print_summary(results: List[Dict], elapsed: float, top: int = 10):
+    summary = summarize_results(results)
+    print(f"\n📊 Probed {summary['total']} entry points in {elapsed:.2f}s")
+    print(f"   ✅ Reachable: {summary['reachable']}/{summary['total']}")
+    if summary['connect_ms_p50'] is not None:
+        print(f"   ⏱️  Connect RTT p50 {summary['connect_ms_p50']:.1f}ms, p90 {summary['connect_ms_p90']:.1f}ms")
+    for stage, count in sorted(summary['failures_by_stage'].items()):
+        print(f"   ❌ {stage}: {count}")
+    fastest = sorted((r for r in results if r['ok']), key=lambda r: r['connect_ms'])[:top]
+    if fastest:
+        print(f"\n🏆 Fastest {len(fastest)}:")
+        for r in fastest:
+            tls = f", TLS {r['tls_ms']:.1f}ms" if r['tls_ms'] is not None else ''
+            print(f"   {r['upstream']:<40} {r['connect_ms']:7.1f}ms{tls}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Mass TCP/TLS probe cho entry point của catalog')
+    parser.add_argument('provider', choices=('protonvpn', 'nordvpn', 'selftest'))
+    parser.add_argument('--country', help='Mã quốc gia, vd LK')
+    parser.add_argument('--tls', action='store_true', help='Hoàn tất TLS handshake sau khi connect')
+    parser.add_argument('--verify-tls', action='store_true', help='Kiểm tra certificate khi --tls')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT_SECONDS)
+    parser.add_argument('--limit', type=int, help='Số entry point tối đa')
+    parser.add_argument('--no-save', action='store_true', help='Không lưu vào logs/server_history.db')
+    parser.add_argument('--listeners', type=int, default=1000, help='selftest: số listener local')
+    parser.add_argument('--closed', type=int, default=100, help='selftest: số port đóng')
+    args = parser.parse_args(argv)
+
+    started = time.time()
+    if args.provider == 'selftest':
+        results = asyncio.run(_local_selftest(args.listeners, args.closed, args.concurrency, args.timeout, args.tls))
+        print_summary(results, time.time() - started, top=5)
+        return 0
+
+    candidates = candidates_from_catalog(args.provider, _load_catalog(args.provider, args.country))
+    if args.limit:
+        candidates = candidates[:args.limit]
+    if not candidates:
+        print("❌ No entry points to probe")
+        return 1
+    print(f"🔍 Probing {len(candidates)} {args.provider} entry points "
+          f"(concurrency {args.concurrency}, timeout {args.timeout}s{', TLS' if args.tls else ''})...")
+    started = time.time()
+    results = probe_all(candidates, concurrency=args.concurrency, timeout=args.timeout,
+                        tls=args.tls, verify_tls=args.verify_tls)
+    print_summary(results, time.time() - started)
+    if not args.no_save:
+        get_server_history().record_entry_probes(results)
+        print("\n💾 Saved to server history (entry_probes)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Fast JSON
+Backend JSON dùng chung cho catalog, config, payload API và Flask: orjson nếu đã cài (`pip install orjson`),
+không thì stdlib json với cùng hành vi (UTF-8, không escape ASCII, compact mặc định).
+JSON_BACKEND=json để ép dùng stdlib (vd so sánh hoặc khi nghi lỗi từ orjson).
+"""
+
+import os
+import json
+from typing import Any, Callable, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if os.environ.get('JSON_BACKEND', '').lower() == 'json':
+    orjson = None
+
+BACKEND = 'orjson' if orjson is not None else 'json'
+
+
+def dumps(obj: Any, indent: Optional[int] = None, sort_keys: bool = False,
+          default: Optional[Callable[[Any], Any]] = None) -> bytes:
+    """obj -> UTF-8 bytes; compact nếu indent=None (file máy đọc, payload API)"""
+    if orjson is not None and indent in (None, 2):
+        option = orjson.OPT_NON_STR_KEYS
+        if indent == 2:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            return orjson.dumps(obj, default=default, option=option)
+        except TypeError:
+            # Kiểu orjson không hỗ trợ (vd int > 64 bit): để stdlib xử lý giống trước
+            pass
+    separators = (',', ':') if indent is None else None
+    return json.dumps(obj, ensure_ascii=False, indent=indent, sort_keys=sort_keys, default=default,
+                      separators=separators).encode('utf-8')
+
+
+def dumps_str(obj: Any, **kwargs) -> str:
+    return dumps(obj, **kwargs).decode('utf-8')
+
+
+def loads(data) -> Any:
+    """bytes / bytearray / memoryview / str -> object"""
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
+
+
+def load_file(path: str) -> Any:
+    with open(path, 'rb') as f:
+        return loads(f.read())
+
+
+def dump_file(obj: Any, path: str, indent: Optional[int] = None):
+    """Ghi qua file tạm + rename: reader (kể cả process khác) không thấy file ghi dở"""
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(dumps(obj, indent=indent))
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+File System Watcher
+Theo dõi thay đổi file trong các thư mục bằng inotify (Linux), fallback sang polling
+"""
+
+import os
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# inotify constants (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct('iIII')
+READ_BUFFER_SIZE = 64 * 1024
+DEFAULT_POLL_INTERVAL_SECONDS = 1.0
+
+
+class FileEvent(NamedTuple):
+    directory: str
+    name: str
+    kind: str  # 'created' | 'modified' | 'deleted' | 'overflow'
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.directory, self.name)
+
+
+def _load_libc():
+    """Load libc với inotify, trả về None nếu không hỗ trợ (macOS, ...)"""
+    try:
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name:
+            return None
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            return None
+        return libc
+    except OSError:
+        return None
+
+
+class DirectoryWatcher:
+    """
+    Theo dõi các thư mục (không đệ quy).
+    Dùng inotify khi có thể để idle CPU gần bằng 0, nếu không thì so sánh (mtime_ns, size) định kỳ.
+    """
+
+    def __init__(self, directories: List[str], force_poll: bool = False,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL_SECONDS):
+        self.directories = [os.path.abspath(d) for d in directories]
+        self.poll_interval = poll_interval
+        self._fd: Optional[int] = None
+        self._watches: Dict[int, str] = {}
+        self._snapshot: Dict[str, Tuple[int, int]] = {}
+
+        if not force_poll:
+            self._init_inotify()
+        if self._fd is None:
+            self._snapshot = self._scan()
+
+    @property
+    def mode(self) -> str:
+        return 'inotify' if self._fd is not None else 'poll'
+
+    def _init_inotify(self):
+        libc = _load_libc()
+        if libc is None:
+            return
+
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return
+
+        for directory in self.directories:
+            if not os.path.isdir(directory):
+                continue
+            wd = libc.inotify_add_watch(fd, directory.encode(), WATCH_MASK)
+            if wd >= 0:
+                self._watches[wd] = directory
+
+        if not self._watches:
+            os.close(fd)
+            return
+        self._fd = fd
+
+    def wait(self, timeout: Optional[float] = None) -> List[FileEvent]:
+        """Đợi tối đa timeout giây, trả về danh sách events (đã gộp trùng lặp)"""
+        if self._fd is not None:
+            return self._wait_inotify(timeout)
+        return self._wait_poll(timeout)
+
+    def _wait_inotify(self, timeout: Optional[float]) -> List[FileEvent]:
+        try:
+            readable, _, _ = select.select([self._fd], [], [], timeout)
+        except InterruptedError:
+            return []
+        if not readable:
+            return []
+
+        events: List[FileEvent] = []
+        seen = set()
+        while True:
+            try:
+                data = os.read(self._fd, READ_BUFFER_SIZE)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+
+            offset = 0
+            while offset + EVENT_HEADER.size <= len(data):
+                wd, mask, _cookie, name_len = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                raw_name = data[offset:offset + name_len]
+                offset += name_len
+
+                if mask & IN_Q_OVERFLOW:
+                    # Queue tràn: caller nên quét lại toàn bộ
+                    event = FileEvent('', '', 'overflow')
+                else:
+                    directory = self._watches.get(wd)
+                    name = raw_name.rstrip(b'\0').decode('utf-8', errors='replace')
+                    if not directory or not name:
+                        continue
+                    if mask & (IN_DELETE | IN_MOVED_FROM):
+                        kind = 'deleted'
+                    elif mask & (IN_CREATE | IN_MOVED_TO):
+                        kind = 'created'
+                    else:
+                        kind = 'modified'
+                    event = FileEvent(directory, name, kind)
+
+                if event not in seen:
+                    seen.add(event)
+                    events.append(event)
+        return events
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        snapshot = {}
+        for directory in self.directories:
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        try:
+                            st = entry.stat()
+                            snapshot[entry.path] = (st.st_mtime_ns, st.st_size)
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+        return snapshot
+
+    def _wait_poll(self, timeout: Optional[float]) -> List[FileEvent]:
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            current = self._scan()
+            events: List[FileEvent] = []
+            for path, stat in current.items():
+                previous = self._snapshot.get(path)
+                if previous is None:
+                    events.append(FileEvent(os.path.dirname(path), os.path.basename(path), 'created'))
+                elif previous != stat:
+                    events.append(FileEvent(os.path.dirname(path), os.path.basename(path), 'modified'))
+            for path in self._snapshot.keys() - current.keys():
+                events.append(FileEvent(os.path.dirname(path), os.path.basename(path), 'deleted'))
+            self._snapshot = current
+
+            if events:
+                return events
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return []
+                time.sleep(min(self.poll_interval, remaining))
+            else:
+                time.sleep(self.poll_interval)
+
+    def close(self):
+        if self._fd is not None:
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+            self._fd = None
+            self._watches = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
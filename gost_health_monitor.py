@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+"""
+Gost Health Monitor
+Kiểm tra tất cả gost ports đồng thời (asyncio) và tự động restart port không hoạt động.
+Thay cho vòng lặp tuần tự trong gost_monitor.sh: thời gian kiểm tra toàn bộ ports ~ một probe timeout.
+"""
+
+import os
+import sys
+import time
+import signal
+import asyncio
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import metrics
+from config_repository import get_config_repository
+from log_rotator import LogRotator
+from proxy_probe import (DEFAULT_TARGET as PROBE_TARGET, LISTENER_DOWN, LISTENER_TIMEOUT,
+                         SOCKS_ERROR, probe_port)
+from server_history import config_upstream_key, get_server_history
+from state_store import get_state_store
+
+# Constants (giữ nguyên semantics của gost_monitor.sh)
+PROTECTED_PORT_WARP = 7890  # Có monitor riêng (gost_7890_monitor.sh)
+CHECK_INTERVAL_SECONDS = 10
+RECONNECT_COOLDOWN_SECONDS = 120
+MAX_FAILURES = 3
+PROBE_TIMEOUT_SECONDS = float(os.environ.get('GOST_MONITOR_PROBE_TIMEOUT', '10'))
+RESTART_SETTLE_SECONDS = 3
+RESTART_TIMEOUT_SECONDS = 90
+# Số probe chạy đồng thời tối đa; mặc định đủ lớn để cả fleet xong trong một probe timeout
+PROBE_CONCURRENCY = int(os.environ.get('GOST_MONITOR_CONCURRENCY', '128'))
+RESTART_CONCURRENCY = int(os.environ.get('GOST_MONITOR_RESTART_CONCURRENCY', '4'))
+# Xóa sample server history quá RETENTION_SECONDS định kỳ (monitor là nơi ghi nhiều nhất)
+HISTORY_PRUNE_INTERVAL_SECONDS = 3600
+
+# Monitor chạy riêng (không có HTTP): metrics ghi ra logs/metrics/gost_monitor.prom sau mỗi vòng,
+# web UI /metrics gộp vào. Restart mỗi port export từ state store (restart_count) nên không đếm ở đây
+MONITOR_METRICS = metrics.Registry()
+PROBE_SECONDS = MONITOR_METRICS.histogram(
+    'gost_monitor_probe_duration_seconds', 'Thời gian SOCKS5 probe một port theo kết quả', ('status',))
+PROBE_CONNECT_SECONDS = MONITOR_METRICS.histogram(
+    'gost_monitor_probe_connect_seconds', 'Thời gian CONNECT qua upstream của các probe thành công')
+PROBES_TOTAL = MONITOR_METRICS.counter('gost_monitor_probes_total', 'Số probe theo kết quả', ('status',))
+ROUND_SECONDS = MONITOR_METRICS.gauge('gost_monitor_round_duration_seconds', 'Thời gian vòng kiểm tra gần nhất')
+PORTS_GAUGE = MONITOR_METRICS.gauge('gost_monitor_ports', 'Số port đang được monitor')
+
+
+class PortHealth:
+    """Trạng thái in-memory của một port"""
+    __slots__ = ('failures', 'last_restart')
+
+    def __init__(self, failures: int = 0, last_restart: float = 0.0):
+        self.failures = failures
+        self.last_restart = last_restart
+
+
+class GostHealthMonitor:
+    def __init__(self, base_dir: Optional[str] = None,
+                 concurrency: Optional[int] = None,
+                 interval: float = CHECK_INTERVAL_SECONDS):
+        self.base_dir = base_dir or os.path.dirname(os.path.abspath(__file__))
+        self.log_dir = os.path.join(self.base_dir, "logs")
+        self.config_dir = os.path.join(self.base_dir, "config")
+        self.log_file = os.path.join(self.log_dir, "gost_monitor.log")
+        self.manage_script = os.path.join(self.base_dir, "manage_gost.sh")
+        os.makedirs(self.log_dir, exist_ok=True)
+
+        self.state_store = get_state_store(os.path.join(self.log_dir, "gost_state.db"))
+        self.config_repo = get_config_repository(self.config_dir, state_store=self.state_store)
+        self.server_history = get_server_history(os.path.join(self.log_dir, "server_history.db"))
+        self.concurrency = max(1, concurrency or PROBE_CONCURRENCY)
+        self.interval = interval
+        self.health: Dict[str, PortHealth] = {}
+        self.running = False
+        self.last_round_seconds = 0.0
+        self._probe_samples: Dict[str, Dict] = {}
+        self._last_history_prune = 0.0
+        # Restart chạy nền (tối đa RESTART_CONCURRENCY cùng lúc): vòng probe không chờ restart,
+        # port đang restart được bỏ qua ở các vòng sau cho tới khi task xong
+        self._restarting: Dict[str, asyncio.Task] = {}
+        self._restart_lock: Optional[asyncio.Semaphore] = None
+        self._restart_loop = None
+        # Rotate + nén logs/gost_<port>.log theo kích thước cho mọi port (thread riêng, không chặn vòng probe)
+        self.log_rotator = LogRotator(self.log_dir, log=self.log)
+
+    def log(self, message: str):
+        line = f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {message}"
+        print(line, flush=True)
+        try:
+            with open(self.log_file, 'a') as f:
+                f.write(line + "\n")
+        except OSError:
+            pass
+
+    def get_ports(self) -> List[str]:
+        """Các gost ports cần monitor (bỏ port 7890)"""
+        return [port for port in self.config_repo.ports() if port != str(PROTECTED_PORT_WARP)]
+
+    def load_states(self, ports: List[str]) -> Dict[str, Dict]:
+        """State của các ports từ state store (một query), {} nếu lỗi"""
+        try:
+            return self.state_store.get_port_states(ports)
+        except Exception as e:
+            self.log(f"⚠️  Error reading state store: {e}")
+            return {}
+
+    def _sync_health(self, ports: List[str], states: Dict[str, Dict]):
+        """
+        Đồng bộ state in-memory với state store mỗi vòng: process khác (auto_credential_updater)
+        cũng restart port và ghi last_restart/failures, monitor phải thấy để tôn trọng cooldown
+        """
+        for port in list(self.health):
+            if port not in ports:
+                del self.health[port]
+        for port in ports:
+            state = states.get(port)
+            health = self.health.get(port)
+            if health is None:
+                state = state or {}
+                self.health[port] = PortHealth(state.get('failures') or 0, state.get('last_restart') or 0.0)
+            elif state is not None:
+                health.failures = state.get('failures') or 0
+                health.last_restart = max(health.last_restart, state.get('last_restart') or 0.0)
+
+    def load_pids(self, ports: List[str], states: Optional[Dict[str, Dict]] = None) -> Dict[str, Optional[int]]:
+        """PID của các ports từ state store (một query, hoặc states đã đọc), fallback PID file"""
+        if states is None:
+            states = self.load_states(ports)
+        pids = {port: state.get('pid') for port, state in states.items()}
+        for port in ports:
+            if pids.get(port):
+                continue
+            try:
+                with open(os.path.join(self.log_dir, f"gost_{port}.pid"), 'r') as f:
+                    pids[port] = int(f.read().strip())
+            except (OSError, ValueError):
+                pids[port] = None
+        return pids
+
+    # ----- Probes -----
+
+    def check_process(self, port: str, pids: Dict[str, Optional[int]]) -> bool:
+        pid = pids.get(port)
+        if not pid:
+            return False
+        try:
+            os.kill(int(pid), 0)
+            return True
+        except (OSError, ValueError):
+            return False
+
+    async def check_proxy(self, port: str) -> Dict:
+        """
+        Probe proxy ở mức SOCKS5 (greeting + CONNECT, không fork curl).
+        Khi lỗi nằm sau listener, probe kiểm tra thẳng upstream để phân loại (407, DNS, timeout)
+        """
+        try:
+            config = self.config_repo.load(port)
+        except Exception:
+            config = None
+        result = await probe_port(port, config, target=PROBE_TARGET, timeout=PROBE_TIMEOUT_SECONDS)
+        PROBES_TOTAL.inc(status=result['status'])
+        PROBE_SECONDS.observe(result['total_ms'] / 1000, status=result['status'])
+        if result['ok']:
+            PROBE_CONNECT_SECONDS.observe(result['connect_ms'] / 1000)
+        return result
+
+    async def restart_port(self, port: str, restart_lock: asyncio.Semaphore) -> bool:
+        async with restart_lock:
+            self.log(f"🔄 Restarting gost on port {port}...")
+            if not os.path.exists(self.manage_script):
+                self.log("❌ manage_gost.sh not found!")
+                return False
+            try:
+                proc = await asyncio.create_subprocess_exec(
+                    'bash', self.manage_script, 'restart-port', port,
+                    cwd=self.base_dir,
+                    stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+                )
+                output, _ = await asyncio.wait_for(proc.communicate(), timeout=RESTART_TIMEOUT_SECONDS)
+            except (OSError, asyncio.TimeoutError) as e:
+                self.log(f"❌ Failed to restart gost on port {port}: {e}")
+                return False
+
+            if proc.returncode != 0:
+                self.log(f"❌ Failed to restart gost on port {port}: {output.decode(errors='replace').strip()}")
+                return False
+
+        # Đợi một chút để gost khởi động rồi kiểm tra lại
+        await asyncio.sleep(RESTART_SETTLE_SECONDS)
+        if self.check_process(port, self.load_pids([port])) and (await self.check_proxy(port))['ok']:
+            self.log(f"✅ Gost on port {port} restarted successfully")
+            return True
+        self.log(f"⚠️  Gost on port {port} restarted but may not be working yet")
+        return False
+
+    # ----- Vòng kiểm tra -----
+
+    def _start_restart(self, port: str):
+        """Restart port trong task nền; state store được cập nhật khi restart xong"""
+        loop = asyncio.get_running_loop()
+        if self._restart_loop is not loop:
+            self._restart_lock = asyncio.Semaphore(RESTART_CONCURRENCY)
+            self._restart_loop = loop
+        self._restarting[port] = loop.create_task(self._restart_and_record(port))
+
+    async def _restart_and_record(self, port: str):
+        try:
+            await self.restart_port(port, self._restart_lock)
+        finally:
+            self._restarting.pop(port, None)
+            last_restart = time.time()
+            health = self.health.get(port)
+            if health is not None:
+                health.last_restart = last_restart
+                health.failures = 0
+            try:
+                self.state_store.update_monitor_states([{'port': port, 'failures': 0, 'restarted': True,
+                                                         'last_restart': last_restart}])
+            except Exception as e:
+                self.log(f"⚠️  Failed to save monitor state: {e}")
+
+    async def wait_restarts(self):
+        """Chờ các restart đang chạy nền (lệnh check one-time)"""
+        while self._restarting:
+            await asyncio.gather(*list(self._restarting.values()), return_exceptions=True)
+
+    async def _check_port(self, port: str, pids: Dict[str, Optional[int]], now: float,
+                          probe_lock: asyncio.Semaphore) -> Tuple[str, bool]:
+        """Kiểm tra một port, trả về (port, restart đã được bắt đầu)"""
+        health = self.health[port]
+        process_ok = self.check_process(port, pids)
+        proxy_ok = False
+        problem = "not running"
+        if process_ok:
+            async with probe_lock:
+                result = await self.check_proxy(port)
+            proxy_ok = result['ok']
+            problem = f"proxy failed: {result['status']}"
+            # Chỉ ghi history khi lỗi nằm ở upstream: listener down là lỗi local
+            if result['status'] not in (LISTENER_DOWN, LISTENER_TIMEOUT, SOCKS_ERROR):
+                self._probe_samples[port] = {'ok': proxy_ok, 'latency_ms': result['connect_ms'],
+                                             'error': None if proxy_ok else result['error']}
+
+        if process_ok and proxy_ok:
+            if health.failures > 0:
+                self.log(f"✅ Gost on port {port} is working again")
+            health.failures = 0
+            return port, False
+
+        time_since_restart = now - health.last_restart
+        if time_since_restart < RECONNECT_COOLDOWN_SECONDS:
+            remaining = int(RECONNECT_COOLDOWN_SECONDS - time_since_restart)
+            self.log(f"⏳ Gost on port {port} {problem} (cooldown {remaining}s), waiting...")
+            health.failures = 0
+            return port, False
+
+        health.failures += 1
+        if health.failures < MAX_FAILURES:
+            self.log(f"⚠️  Gost on port {port} {problem} ({health.failures}/{MAX_FAILURES}), waiting...")
+            return port, False
+
+        self.log(f"⚠️  Gost on port {port} {problem} (failures: {health.failures})")
+        # Cooldown tính từ lúc bắt đầu restart, được đặt lại khi restart xong
+        health.last_restart = time.time()
+        health.failures = 0
+        self._start_restart(port)
+        return port, True
+
+    async def check_all(self, force: bool = False) -> List[str]:
+        """
+        Kiểm tra tất cả ports đồng thời, chỉ chờ các probe. Trả về danh sách ports bắt đầu restart
+        (restart chạy nền, xem wait_restarts). Port đang restart được bỏ qua.
+        force=True: restart ngay port lỗi (bỏ qua cooldown/max_failures) - dùng cho lệnh check.
+        """
+        started = time.time()
+        ports = self.get_ports()
+        states = self.load_states(ports) if ports else {}
+        self._sync_health(ports, states)
+        if not ports:
+            return []
+
+        pids = self.load_pids(ports, states)
+        check_ports = [port for port in ports if port not in self._restarting]
+        if force:
+            for port in check_ports:
+                self.health[port] = PortHealth(MAX_FAILURES - 1, 0.0)
+
+        probe_lock = asyncio.Semaphore(self.concurrency)
+        previous = {port: self.health[port].failures for port in check_ports}
+        self._probe_samples = {}
+        results = await asyncio.gather(*[
+            self._check_port(port, pids, started, probe_lock) for port in check_ports
+        ])
+        restarted = [port for port, did_restart in results if did_restart]
+        self._record_probe_history()
+
+        # Ghi thay đổi failures vào state store trong một transaction (restart tự ghi khi xong)
+        updates = []
+        for port in check_ports:
+            health = self.health[port]
+            if port not in restarted and not force and health.failures != previous[port]:
+                updates.append({'port': port, 'failures': health.failures})
+        if updates:
+            try:
+                self.state_store.update_monitor_states(updates)
+            except Exception as e:
+                self.log(f"⚠️  Failed to save monitor state: {e}")
+
+        self.last_round_seconds = time.time() - started
+        ROUND_SECONDS.set(self.last_round_seconds)
+        PORTS_GAUGE.set(len(ports))
+        metrics.write_textfile(os.path.join(self.log_dir, 'metrics', 'gost_monitor.prom'), MONITOR_METRICS)
+        return restarted
+
+    def _record_probe_history(self):
+        """Ghi kết quả probe vòng này vào server history theo upstream (proxy_host:proxy_port)"""
+        if not self._probe_samples:
+            return
+        try:
+            configs = self.config_repo.load_all()
+            samples = []
+            for port, sample in self._probe_samples.items():
+                upstream = config_upstream_key(configs.get(port))
+                if upstream:
+                    samples.append(dict(sample, upstream=upstream, source='probe'))
+            self.server_history.record_many(samples)
+        except Exception as e:
+            self.log(f"⚠️  Failed to record probe history: {e}")
+        self._prune_history()
+
+    def _prune_history(self):
+        now = time.time()
+        if now - self._last_history_prune < HISTORY_PRUNE_INTERVAL_SECONDS:
+            return
+        self._last_history_prune = now
+        try:
+            removed = self.server_history.prune()
+            if removed:
+                self.log(f"🧹 Pruned {removed} old server history samples")
+        except Exception as e:
+            self.log(f"⚠️  Failed to prune server history: {e}")
+
+    async def run(self):
+        self.running = True
+        self.log(f"🛡️  Gost monitor started (check interval: {self.interval}s, concurrency: {self.concurrency})")
+        if not self.get_ports():
+            self.log("⚠️  No gost configs found, monitor will check periodically")
+
+        self.log_rotator.start()
+        try:
+            while self.running:
+                try:
+                    await self.check_all()
+                except Exception as e:
+                    # Monitor loop phải chạy liên tục
+                    self.log(f"❌ Error in monitor loop: {e}")
+                await asyncio.sleep(max(0.0, self.interval - self.last_round_seconds))
+        finally:
+            self.log_rotator.stop()
+
+    def stop(self):
+        self.running = False
+
+
+def main():
+    usage = (
+        "Usage: python3 gost_health_monitor.py {run|check|status}\n"
+        "\nCommands:\n"
+        "  run    - Chạy monitor (foreground, dùng bởi gost_monitor.sh start)\n"
+        "  check  - Kiểm tra và restart gost nếu cần (one-time, exit 1 nếu có restart)\n"
+        "  status - Kiểm tra tất cả ports một lần (không restart)"
+    )
+    if len(sys.argv) < 2:
+        print(usage)
+        sys.exit(1)
+
+    command = sys.argv[1]
+    monitor = GostHealthMonitor()
+
+    if command == "run":
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+
+        def handle_signal(signum):
+            monitor.log(f"⚠️  Monitor loop exiting (PID: {os.getpid()}, signal: {signal.Signals(signum).name})")
+            monitor.stop()
+            for task in asyncio.all_tasks(loop):
+                task.cancel()
+
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, handle_signal, signum)
+        try:
+            loop.run_until_complete(monitor.run())
+        except asyncio.CancelledError:
+            pass
+        finally:
+            loop.close()
+
+    elif command == "check":
+        async def check():
+            restarted_ports = await monitor.check_all(force=True)
+            await monitor.wait_restarts()
+            return restarted_ports
+
+        restarted = asyncio.run(check())
+        if restarted:
+            for port in restarted:
+                print(f"⚠️  Gost on port {port} không hoạt động, đã restart")
+            sys.exit(1)
+        print("✅ Tất cả gost services đang hoạt động tốt")
+
+    elif command == "status":
+        async def probe_all():
+            ports = monitor.get_ports()
+            pids = monitor.load_pids(ports)
+            lock = asyncio.Semaphore(monitor.concurrency)
+
+            async def probe(port):
+                if not monitor.check_process(port, pids):
+                    return port, {'ok': False, 'status': 'not_running', 'error': 'process not running'}
+                async with lock:
+                    return port, await monitor.check_proxy(port)
+
+            return await asyncio.gather(*[probe(port) for port in ports])
+
+        results = asyncio.run(probe_all())
+        for port, result in results:
+            if result['ok']:
+                print(f"   ✅ Port {port}: Running và hoạt động "
+                      f"(handshake {result['handshake_ms']:.0f}ms, connect {result['connect_ms']:.0f}ms)")
+            else:
+                print(f"   ⚠️  Port {port}: Có vấn đề ({result['status']}: {result['error']})")
+        if all(result['ok'] for _, result in results):
+            print("   ✅ Tất cả gost services đang hoạt động tốt")
+
+    else:
+        print(usage)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -63,7 +63,7 @@ if systemctl is-active --quiet auto-credential-updater.service; then
     echo "   • Logs: $SCRIPT_DIR/logs/auto_updater.log"
     echo ""
     echo "🔧 Chức năng:"
-    echo "   • Tự động cập nhật ProtonVPN credentials mỗi 30 giây"
+    echo "   • Tự động cập nhật ProtonVPN credentials ngay khi config/log thay đổi (inotify)"
     echo "   • Tự động dọn dẹp Gost services không sử dụng mỗi 5 phút"
     echo ""
     echo "🔧 Lệnh quản lý:"
@@ -41,6 +41,7 @@ echo ""
 echo "📌 Killing Gost Monitor..."
 pkill -9 -f "gost_monitor.sh" 2>/dev/null || true
 pkill -9 -f "bash.*gost_monitor" 2>/dev/null || true
+pkill -9 -f "gost_health_monitor.py" 2>/dev/null || true
 echo "✅ Gost Monitor killed"
 
 # 5. Kill WARP Monitor
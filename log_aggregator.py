@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+Log Aggregator
+Tail tăng dần tất cả logs/gost_<port>.log, parse format log của gost một lần duy nhất
+và giữ bộ đếm lỗi/thành công theo (port, upstream, kind) trong bộ nhớ (bucket theo phút).
+Thay cho việc mỗi nơi tự grep file log: credential updater (407 / i/o timeout),
+chrome handler, /api/logs/errors trên web UI.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import threading
+from collections import deque, namedtuple
+from typing import Callable, Dict, List, Optional, Tuple
+
+import log_tail
+from fs_watcher import DirectoryWatcher
+
+BUCKET_SECONDS = 60
+RETENTION_SECONDS = int(os.environ.get('LOG_AGGREGATOR_RETENTION_SECONDS', str(6 * 3600)))
+# Lần đầu thấy một file: chỉ đọc phần cuối (không parse lại cả file 50MB)
+INITIAL_BACKFILL_BYTES = 256 * 1024
+RECENT_ERRORS_PER_PORT = 50
+FULL_SCAN_INTERVAL_SECONDS = 30
+
+KIND_OK = 'ok'
+KIND_AUTH = '407'
+KIND_TIMEOUT = 'timeout'
+KIND_REFUSED = 'refused'
+KIND_RESET = 'reset'
+KIND_DNS = 'dns'
+KIND_TLS = 'tls'
+KIND_EOF = 'eof'
+KIND_OTHER = 'error'
+
+# Thứ tự quan trọng: kind đầu tiên khớp sẽ được dùng
+ERROR_RULES: List[Tuple[str, Tuple[str, ...]]] = [
+    (KIND_AUTH, ('407 proxy authentication required', ' 407 ')),
+    (KIND_TIMEOUT, ('i/o timeout', 'deadline exceeded', 'timed out')),
+    (KIND_REFUSED, ('connection refused',)),
+    (KIND_RESET, ('connection reset', 'broken pipe')),
+    (KIND_DNS, ('no such host', 'server misbehaving')),
+    (KIND_TLS, ('tls:', 'x509', 'handshake failure')),
+    (KIND_EOF, ('eof',)),
+]
+
+# gost v2: "2025/11/17 18:25:55 socks.go:1037: [socks5] 127.0.0.1:53214 -> https://host:4443 -> example.com:443 : <lỗi>"
+LINE_PATTERN = re.compile(r'^(\d{4}/\d{2}/\d{2} \d{2}:\d{2}:\d{2})(?:\.\d+)?\s+(?:[\w.-]+\.go:\d+:\s+)?(.*)$')
+UPSTREAM_PATTERN = re.compile(r'\b[a-z][a-z0-9+]*://(?:[^@\s/]*@)?([^\s/@:][^\s/@]*)', re.IGNORECASE)
+LOG_NAME_PATTERN = re.compile(r'^gost_(\d+)\.log$')
+
+LogEvent = namedtuple('LogEvent', ['port', 'time', 'kind', 'upstream', 'message'])
+
+_ts_cache: Dict[str, float] = {}
+
+
+def _parse_timestamp(value: str) -> Optional[float]:
+    cached = _ts_cache.get(value)
+    if cached is None:
+        try:
+            cached = time.mktime(time.strptime(value, '%Y/%m/%d %H:%M:%S'))
+        except ValueError:
+            return None
+        if len(_ts_cache) > 4096:
+            _ts_cache.clear()
+        _ts_cache[value] = cached
+    return cached
+
+
+def classify(message: str) -> Optional[str]:
+    """Kind của một message gost: 'ok' (kết nối thành công), một kind lỗi, hoặc None (log thông tin)"""
+    lowered = message.lower()
+    if ' <-> ' in message:
+        return KIND_OK
+    if '>-<' in message:
+        return None
+    for kind, needles in ERROR_RULES:
+        if any(needle in lowered for needle in needles):
+            return kind
+    if ' : ' in message or 'error' in lowered or 'failed' in lowered:
+        return KIND_OTHER
+    return None
+
+
+def parse_line(line: str) -> Optional[Tuple[Optional[float], str, str, str]]:
+    """(timestamp, kind, upstream trong dòng hoặc '', message) hoặc None nếu dòng không đáng đếm"""
+    match = LINE_PATTERN.match(line)
+    if match:
+        timestamp, message = _parse_timestamp(match.group(1)), match.group(2)
+    else:
+        timestamp, message = None, line
+    kind = classify(message)
+    if kind is None:
+        return None
+    upstream = UPSTREAM_PATTERN.search(message)
+    return timestamp, kind, upstream.group(1) if upstream else '', message
+
+
+def upstream_from_config(config: Optional[dict]) -> str:
+    """host:port của upstream trong proxy_url của config (dùng khi dòng log không ghi hop)"""
+    if not config:
+        return ''
+    match = UPSTREAM_PATTERN.search(config.get('proxy_url') or '')
+    if match:
+        return match.group(1)
+    host, port = config.get('proxy_host'), config.get('proxy_port')
+    return f"{host}:{port}" if host and port else (host or '')
+
+
+class LogAggregator:
+    """
+    resolver(port) -> upstream của port (vd lấy từ config), có thể None.
+    Thread-safe: ingest từ thread nền (start()) hoặc từ vòng lặp event của caller.
+    """
+
+    def __init__(self, log_dir: str, resolver: Optional[Callable[[str], str]] = None,
+                 retention: int = RETENTION_SECONDS):
+        self.log_dir = os.path.abspath(log_dir)
+        self.resolver = resolver
+        self.retention = retention
+        self._files: Dict[str, Tuple[int, Optional[int]]] = {}
+        self._counters: Dict[Tuple[str, str, str], deque] = {}
+        self._recent: Dict[str, deque] = {}
+        self._lock = threading.RLock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.lines_parsed = 0
+
+    # ----- Ingest -----
+
+    def path_for(self, port) -> str:
+        return os.path.join(self.log_dir, f"gost_{port}.log")
+
+    def ingest(self, port) -> List[LogEvent]:
+        """Đọc và đếm các dòng mới của gost_<port>.log, trả về events mới (đã parse)"""
+        return self.ingest_file(self.path_for(port))
+
+    def ingest_file(self, path: str) -> List[LogEvent]:
+        match = LOG_NAME_PATTERN.match(os.path.basename(path))
+        if not match:
+            return []
+        port = match.group(1)
+
+        with self._lock:
+            state = self._files.get(path)
+            if state is None:
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    return []
+                # Bắt đầu giữa dòng cũng không sao: mảnh dòng đầu không khớp format sẽ bị bỏ qua
+                state = (max(0, size - INITIAL_BACKFILL_BYTES), None)
+            offset, inode = state
+
+            lines: List[str] = []
+            while True:
+                try:
+                    result = log_tail.read_from(path, offset, inode=inode)
+                except OSError:
+                    self._files.pop(path, None)
+                    return []
+                offset, inode = result['offset'], result['inode']
+                lines.extend(result['lines'])
+                if not result['has_more']:
+                    break
+            self._files[path] = (offset, inode)
+
+            if not lines:
+                return []
+            # Upstream theo config của port; hop trong dòng log chỉ dùng khi không có config
+            # (dòng thành công '<->' không ghi hop nên trộn hai nguồn sẽ tách đôi một upstream)
+            configured = self._resolve(port)
+            events: List[LogEvent] = []
+            now = time.time()
+            for line in lines:
+                parsed = parse_line(line)
+                if parsed is None:
+                    continue
+                timestamp, kind, upstream, message = parsed
+                upstream = configured or upstream
+                event = LogEvent(port, timestamp or now, kind, upstream, message)
+                self._record(event)
+                events.append(event)
+            self.lines_parsed += len(lines)
+            return events
+
+    def _resolve(self, port: str) -> str:
+        if self.resolver is None:
+            return ''
+        try:
+            return self.resolver(port) or ''
+        except Exception:
+            return ''
+
+    def _record(self, event: LogEvent):
+        bucket = int(event.time // BUCKET_SECONDS) * BUCKET_SECONDS
+        buckets = self._counters.setdefault((event.port, event.upstream, event.kind), deque())
+        if buckets and buckets[-1][0] == bucket:
+            buckets[-1][1] += 1
+        elif buckets and buckets[-1][0] > bucket:
+            # Dòng log cũ hơn bucket cuối (backfill không theo thứ tự): cộng vào bucket gần nhất đã có
+            for entry in reversed(buckets):
+                if entry[0] <= bucket:
+                    entry[1] += 1
+                    break
+            else:
+                buckets.appendleft([bucket, 1])
+        else:
+            buckets.append([bucket, 1])
+        if event.kind != KIND_OK:
+            self._recent.setdefault(event.port, deque(maxlen=RECENT_ERRORS_PER_PORT)).append(event)
+
+    def poll(self) -> int:
+        """Quét cả thư mục logs, ingest mọi file gost_*.log; trả về số event mới"""
+        try:
+            names = [name for name in os.listdir(self.log_dir) if LOG_NAME_PATTERN.match(name)]
+        except OSError:
+            return 0
+        total = 0
+        for name in names:
+            total += len(self.ingest_file(os.path.join(self.log_dir, name)))
+        with self._lock:
+            present = {os.path.join(self.log_dir, name) for name in names}
+            for path in list(self._files):
+                if path not in present:
+                    self.forget(LOG_NAME_PATTERN.match(os.path.basename(path)).group(1))
+        self.prune()
+        return total
+
+    def forget(self, port):
+        """Bỏ offset, bộ đếm và lỗi gần đây của một port (file log đã bị xóa)"""
+        port = str(port)
+        with self._lock:
+            self._files.pop(self.path_for(port), None)
+            self._recent.pop(port, None)
+            for key in [key for key in self._counters if key[0] == port]:
+                del self._counters[key]
+
+    def prune(self, now: Optional[float] = None):
+        cutoff = (now or time.time()) - self.retention
+        with self._lock:
+            for key in list(self._counters):
+                buckets = self._counters[key]
+                while buckets and buckets[0][0] + BUCKET_SECONDS <= cutoff:
+                    buckets.popleft()
+                if not buckets:
+                    del self._counters[key]
+
+    # ----- Query -----
+
+    def counts(self, since: Optional[float] = None, kind: Optional[str] = None, port=None,
+               upstream: Optional[str] = None) -> Dict[Tuple[str, str, str], int]:
+        """{(port, upstream, kind): số dòng} kể từ `since` (độ chính xác theo bucket 1 phút)"""
+        port = str(port) if port is not None else None
+        floor = int(since // BUCKET_SECONDS) * BUCKET_SECONDS if since is not None else None
+        result = {}
+        with self._lock:
+            for key, buckets in self._counters.items():
+                if (port is not None and key[0] != port) or (upstream is not None and key[1] != upstream) \
+                        or (kind is not None and key[2] != kind):
+                    continue
+                total = sum(count for bucket, count in buckets if floor is None or bucket >= floor)
+                if total:
+                    result[key] = total
+        return result
+
+    def count(self, port=None, kind: Optional[str] = None, since: Optional[float] = None) -> int:
+        return sum(self.counts(since=since, kind=kind, port=port).values())
+
+    def recent_errors(self, port=None, kind: Optional[str] = None, since: Optional[float] = None,
+                      upstream: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        """Các dòng lỗi gần nhất (mới nhất trước), tối đa RECENT_ERRORS_PER_PORT mỗi port"""
+        with self._lock:
+            if port is not None:
+                events = list(self._recent.get(str(port), ()))
+            else:
+                events = [event for recent in self._recent.values() for event in recent]
+        events = [event for event in events
+                  if (kind is None or event.kind == kind) and (since is None or event.time >= since)
+                  and (upstream is None or event.upstream == upstream)]
+        events.sort(key=lambda event: event.time, reverse=True)
+        return [event._asdict() for event in events[:limit]]
+
+    def summary(self, since: Optional[float] = None, kind: Optional[str] = None, port=None,
+                upstream: Optional[str] = None) -> Dict:
+        """
+        Tổng hợp theo port và upstream: {'totals': {kind: n}, 'ports': [...], 'upstreams': [...]}.
+        Lọc theo kind chỉ áp dụng cho lỗi; số kết nối ok vẫn được tính để có error_rate
+        """
+        totals: Dict[str, int] = {}
+        by_port: Dict[str, Dict] = {}
+        by_upstream: Dict[str, Dict] = {}
+        for (key_port, key_upstream, key_kind), total in self.counts(since=since, port=port,
+                                                                    upstream=upstream).items():
+            if kind is not None and key_kind not in (kind, KIND_OK):
+                continue
+            for groups, name, related in ((by_port, key_port, key_upstream), (by_upstream, key_upstream, key_port)):
+                entry = groups.setdefault(name, {'ok': 0, 'errors': {}, 'error_total': 0, 'related': set()})
+                entry['related'].add(related)
+                if key_kind == KIND_OK:
+                    entry['ok'] += total
+                else:
+                    entry['errors'][key_kind] = entry['errors'].get(key_kind, 0) + total
+                    entry['error_total'] += total
+            if key_kind != KIND_OK:
+                totals[key_kind] = totals.get(key_kind, 0) + total
+
+        def rows(groups: Dict[str, Dict], key: str, related: str) -> List[Dict]:
+            result = []
+            for name, entry in groups.items():
+                if kind is not None and not entry['error_total']:
+                    continue
+                seen = entry['ok'] + entry['error_total']
+                result.append({key: name, related: sorted(entry['related']), 'ok': entry['ok'],
+                               'errors': entry['errors'], 'error_total': entry['error_total'],
+                               'error_rate': round(entry['error_total'] / seen, 4) if seen else 0.0})
+            result.sort(key=lambda row: row['error_total'], reverse=True)
+            return result
+
+        return {
+            'totals': totals,
+            'ports': rows(by_port, 'port', 'upstreams'),
+            'upstreams': rows(by_upstream, 'upstream', 'ports')
+        }
+
+    # ----- Background -----
+
+    def start(self):
+        """Thread nền: ingest theo file event (inotify / poll) + quét toàn bộ định kỳ"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='log-aggregator', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        os.makedirs(self.log_dir, exist_ok=True)
+        watcher = DirectoryWatcher([self.log_dir])
+        last_scan = 0.0
+        try:
+            while not self._stop.is_set():
+                try:
+                    if time.time() - last_scan >= FULL_SCAN_INTERVAL_SECONDS:
+                        self.poll()
+                        last_scan = time.time()
+                    for event in watcher.wait(timeout=1.0):
+                        if event.kind == 'overflow':
+                            last_scan = 0.0
+                            break
+                        match = LOG_NAME_PATTERN.match(event.name)
+                        if not match:
+                            continue
+                        if event.kind == 'deleted':
+                            self.forget(match.group(1))
+                        else:
+                            self.ingest_file(event.path)
+                except Exception as e:
+                    print(f"❌ Log aggregator error: {e}")
+                    self._stop.wait(5)
+        finally:
+            watcher.close()
+
+
+_aggregators: Dict[str, LogAggregator] = {}
+_aggregators_lock = threading.Lock()
+
+
+def get_log_aggregator(log_dir: str, resolver: Optional[Callable[[str], str]] = None) -> LogAggregator:
+    """LogAggregator dùng chung trong process cho mỗi thư mục logs"""
+    log_dir = os.path.abspath(log_dir)
+    with _aggregators_lock:
+        aggregator = _aggregators.get(log_dir)
+        if aggregator is None:
+            aggregator = LogAggregator(log_dir, resolver=resolver)
+            _aggregators[log_dir] = aggregator
+        elif resolver is not None and aggregator.resolver is None:
+            aggregator.resolver = resolver
+        return aggregator
+
+
+def main(argv: List[str]) -> int:
+    """Quét logs một lần và in tóm tắt lỗi: log_aggregator.py [log_dir] [--since SECONDS] [--kind KIND]"""
+    log_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs')
+    since_seconds, kind = None, None
+    args = list(argv)
+    while args:
+        arg = args.pop(0)
+        if arg == '--since' and args:
+            since_seconds = float(args.pop(0))
+        elif arg == '--kind' and args:
+            kind = args.pop(0)
+        else:
+            log_dir = arg
+    aggregator = LogAggregator(log_dir)
+    aggregator.poll()
+    since = time.time() - since_seconds if since_seconds else None
+    print(json.dumps(aggregator.summary(since=since, kind=kind), indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Log Rotator
+Rotate logs/gost_<port>.log theo kích thước cho mọi port trên một timer (os.stat, không cần restart port):
+- copy-truncate: gost giữ file mở với O_APPEND (>>), nên copy nội dung sang segment rồi truncate
+  về 0 là an toàn - không đổi tên file dưới chân process đang ghi
+- segment đặt tên theo thời điểm (gost_7891.log.20251117-182555) nên không phải đổi tên dây chuyền .1 -> .2
+- nén gzip trong một thread nền, giới hạn CPU theo tỉ lệ thời gian (LOG_COMPRESS_CPU_SHARE)
+- giữ tối đa LOG_ROTATE_KEEP segment mỗi port -> dung lượng tối đa ~ (keep + 1) x max_size mỗi port
+"""
+
+import os
+import re
+import sys
+import gzip
+import time
+import queue
+import threading
+from datetime import datetime
+from typing import Callable, List, Optional, Set
+
+MAX_BYTES = int(os.environ.get('LOG_ROTATE_MAX_MB', '50')) * 1024 * 1024
+KEEP_SEGMENTS = int(os.environ.get('LOG_ROTATE_KEEP', '5'))
+CHECK_INTERVAL_SECONDS = float(os.environ.get('LOG_ROTATE_INTERVAL_SECONDS', '60'))
+COMPRESS_CPU_SHARE = float(os.environ.get('LOG_COMPRESS_CPU_SHARE', '0.25'))
+COMPRESS_LEVEL = 6
+CHUNK_BYTES = 1024 * 1024
+
+LOG_NAME_PATTERN = re.compile(r'^gost_\d+\.log$')
+TMP_SUFFIX = '.tmp'
+
+
+class LogRotator:
+    def __init__(self, log_dir: str, max_bytes: int = MAX_BYTES, keep: int = KEEP_SEGMENTS,
+                 compress: bool = True, cpu_share: float = COMPRESS_CPU_SHARE,
+                 log: Optional[Callable[[str], None]] = None):
+        self.log_dir = os.path.abspath(log_dir)
+        self.max_bytes = max_bytes
+        self.keep = max(1, keep)
+        self.compress = compress
+        self.cpu_share = min(1.0, max(0.01, cpu_share))
+        self.log = log or print
+        self._queue: queue.Queue = queue.Queue()
+        self._queued: Set[str] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self.rotations = 0
+        self.compressed_bytes = 0
+
+    # ----- Rotate -----
+
+    def log_files(self) -> List[str]:
+        try:
+            with os.scandir(self.log_dir) as entries:
+                return sorted(entry.path for entry in entries if LOG_NAME_PATTERN.match(entry.name))
+        except OSError:
+            return []
+
+    def segments(self, log_file: str) -> List[str]:
+        """Các segment đã rotate của log_file (mới nhất trước), gồm cả .N cũ của manage_gost.sh"""
+        directory, name = os.path.split(log_file)
+        prefix = name + '.'
+        result = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.startswith(prefix) and not entry.name.endswith(TMP_SUFFIX):
+                        try:
+                            result.append((entry.stat().st_mtime, entry.path))
+                        except OSError:
+                            continue
+        except OSError:
+            return []
+        return [path for _, path in sorted(result, reverse=True)]
+
+    def rotate(self, log_file: str) -> Optional[str]:
+        """copy-truncate log_file sang một segment mới, trả về đường dẫn segment"""
+        segment = f"{log_file}.{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+        if os.path.exists(segment) or os.path.exists(segment + '.gz'):
+            segment = f"{segment}-{os.getpid()}-{int(time.time() * 1000) % 1000:03d}"
+
+        with self._lock:
+            try:
+                with open(log_file, 'rb') as source, open(segment, 'wb') as target:
+                    while True:
+                        chunk = source.read(CHUNK_BYTES)
+                        if not chunk:
+                            break
+                        target.write(chunk)
+                    # Lượt đọc cuối ngay trước truncate: cửa sổ mất dòng chỉ còn vài micro giây
+                    target.write(source.read())
+                    os.truncate(log_file, 0)
+                    copied = target.tell()
+            except OSError as e:
+                self.log(f"❌ Failed to rotate {log_file}: {e}")
+                try:
+                    os.unlink(segment)
+                except OSError:
+                    pass
+                return None
+
+        self.rotations += 1
+        self.log(f"🔄 Rotated {os.path.basename(log_file)} ({copied / 1024 / 1024:.1f}MB) -> "
+                 f"{os.path.basename(segment)}")
+        self.prune(log_file)
+        if self.compress:
+            self._enqueue(segment)
+        return segment
+
+    def prune(self, log_file: str):
+        for path in self.segments(log_file)[self.keep:]:
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+
+    def run_once(self, force: bool = False) -> List[str]:
+        """Một lượt: stat mọi log, rotate file >= max_bytes (force: mọi file khác rỗng)"""
+        rotated = []
+        for log_file in self.log_files():
+            try:
+                size = os.stat(log_file).st_size
+            except OSError:
+                continue
+            if size >= self.max_bytes or (force and size > 0):
+                segment = self.rotate(log_file)
+                if segment:
+                    rotated.append(segment)
+            if self.compress:
+                # Segment chưa nén còn sót (rotate từ CLI hoặc process trước bị dừng giữa chừng)
+                for path in self.segments(log_file):
+                    if not path.endswith('.gz'):
+                        self._enqueue(path)
+        return rotated
+
+    # ----- Compress -----
+
+    def _enqueue(self, path: str):
+        with self._lock:
+            if path in self._queued:
+                return
+            self._queued.add(path)
+        self._queue.put(path)
+
+    def compress_file(self, path: str) -> Optional[str]:
+        """gzip path -> path.gz, tự nghỉ để thread này dùng tối đa cpu_share của một core"""
+        target = path + '.gz'
+        tmp = target + TMP_SUFFIX
+        try:
+            stat = os.stat(path)
+            with open(path, 'rb') as source, gzip.open(tmp, 'wb', compresslevel=COMPRESS_LEVEL) as output:
+                while not self._stop.is_set():
+                    started = time.thread_time()
+                    chunk = source.read(CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    output.write(chunk)
+                    busy = time.thread_time() - started
+                    if self.cpu_share < 1.0:
+                        self._stop.wait(busy * (1.0 - self.cpu_share) / self.cpu_share)
+            if self._stop.is_set():
+                os.unlink(tmp)
+                return None
+            os.utime(tmp, (stat.st_atime, stat.st_mtime))
+            os.replace(tmp, target)
+            os.unlink(path)
+        except OSError as e:
+            self.log(f"⚠️  Failed to compress {path}: {e}")
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            return None
+        self.compressed_bytes += stat.st_size
+        return target
+
+    def _compress_loop(self):
+        while not self._stop.is_set():
+            try:
+                path = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            try:
+                if os.path.exists(path):
+                    self.compress_file(path)
+            finally:
+                with self._lock:
+                    self._queued.discard(path)
+
+    def drain(self):
+        """Nén đồng bộ mọi segment đang chờ (dùng cho CLI, không có thread nền)"""
+        while True:
+            try:
+                path = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if os.path.exists(path):
+                self.compress_file(path)
+            with self._lock:
+                self._queued.discard(path)
+
+    # ----- Background -----
+
+    def _timer_loop(self, interval: float):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                self.log(f"❌ Log rotator error: {e}")
+            self._stop.wait(interval)
+
+    def start(self, interval: float = CHECK_INTERVAL_SECONDS):
+        """Thread timer (stat + rotate) và thread nén"""
+        if self._threads:
+            return
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._timer_loop, args=(interval,), name='log-rotator', daemon=True),
+            threading.Thread(target=self._compress_loop, name='log-compressor', daemon=True)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+
+def main(argv: List[str]) -> int:
+    usage = (
+        "Usage: log_rotator.py [--dir LOG_DIR] {once|rotate FILE|run} [--force] [--no-compress]\n"
+        "Commands:\n"
+        "  once         - Rotate mọi logs/gost_<port>.log >= LOG_ROTATE_MAX_MB rồi nén\n"
+        "  rotate FILE  - Rotate một file nếu đủ lớn (không nén, daemon monitor sẽ nén sau)\n"
+        "  run          - Chạy timer ở foreground (khi không chạy gost monitor)"
+    )
+    args = list(argv)
+    log_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs')
+    if '--dir' in args:
+        index = args.index('--dir')
+        log_dir = args[index + 1]
+        del args[index:index + 2]
+    force = '--force' in args
+    compress = '--no-compress' not in args
+    args = [arg for arg in args if arg not in ('--force', '--no-compress')]
+    if not args:
+        print(usage)
+        return 1
+
+    command = args[0]
+    if command == 'once':
+        rotator = LogRotator(log_dir, compress=compress, cpu_share=1.0)
+        rotator.run_once(force=force)
+        rotator.drain()
+    elif command == 'rotate' and len(args) > 1:
+        log_file = os.path.abspath(args[1])
+        rotator = LogRotator(os.path.dirname(log_file), compress=False)
+        try:
+            size = os.stat(log_file).st_size
+        except OSError:
+            return 0
+        if size >= rotator.max_bytes or (force and size > 0):
+            rotator.rotate(log_file)
+    elif command == 'run':
+        rotator = LogRotator(log_dir, compress=compress)
+        rotator.start()
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            rotator.stop()
+    else:
+        print(usage)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Log Tail
+Đọc cuối file log mà không đọc cả file: seek lùi từ EOF theo block cho N dòng cuối,
+cursor theo byte offset để phân trang (before = trang cũ hơn, offset = phần mới ghi thêm)
+và follow() đẩy các dòng mới (inotify trên Linux, poll stat của đúng file đó trên macOS)
+"""
+
+import os
+import time
+from typing import Dict, Iterator, List, Optional
+
+from fs_watcher import DirectoryWatcher
+
+BLOCK_SIZE = 8192
+DEFAULT_LINES = 1000
+MAX_LINES = 10000
+MAX_READ_BYTES = 1024 * 1024
+# Giới hạn khi tail gặp dòng cực dài: không bao giờ đọc quá chừng này
+MAX_TAIL_BYTES = 8 * 1024 * 1024
+FOLLOW_POLL_SECONDS = 0.5
+
+
+def _decode(data: bytes) -> List[str]:
+    return data.decode('utf-8', errors='replace').split('\n')
+
+
+def tail_lines(path: str, lines: int = DEFAULT_LINES, before: Optional[int] = None,
+               block_size: int = BLOCK_SIZE) -> Dict:
+    """
+    N dòng cuối của file kết thúc tại byte `before` (mặc định EOF).
+    Trả về {'lines', 'start', 'end', 'size', 'has_more'}:
+    start = offset dòng đầu tiên (dùng làm `before` cho trang trước), end = offset để follow tiếp
+    """
+    lines = max(1, min(int(lines), MAX_LINES))
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        end = size if before is None else max(0, min(int(before), size))
+
+        # Chỉ trả về dòng hoàn chỉnh: bỏ phần dòng đang ghi dở ở cuối file
+        chunks: List[bytes] = []
+        position = end
+        newlines = 0
+        read_bytes = 0
+        while position > 0 and newlines <= lines and read_bytes < MAX_TAIL_BYTES:
+            step = min(block_size, position)
+            position -= step
+            f.seek(position)
+            chunk = f.read(step)
+            chunks.append(chunk)
+            newlines += chunk.count(b'\n')
+            read_bytes += step
+        data = b''.join(reversed(chunks))
+
+    if before is None and data and not data.endswith(b'\n'):
+        cut = data.rfind(b'\n') + 1
+        end -= len(data) - cut
+        data = data[:cut]
+
+    body = data[:-1] if data.endswith(b'\n') else data
+    parts = body.split(b'\n') if body else []
+    if position > 0 and parts:
+        # Dòng đầu tiên có thể bị cắt giữa chừng bởi block
+        parts = parts[1:]
+    parts = parts[-lines:]
+    kept = sum(len(part) + 1 for part in parts)
+    start = end - kept if parts else end
+    return {
+        'lines': [part.decode('utf-8', errors='replace') for part in parts],
+        'start': start,
+        'end': end,
+        'size': size,
+        'has_more': start > 0
+    }
+
+
+def read_from(path: str, offset: int, max_bytes: int = MAX_READ_BYTES, inode: Optional[int] = None) -> Dict:
+    """
+    Các dòng hoàn chỉnh ghi thêm sau byte `offset`.
+    Nếu file bị truncate (size < offset) hoặc rotate (inode khác `inode`) thì đọc lại từ đầu và báo reset=True
+    """
+    with open(path, 'rb') as f:
+        st = os.fstat(f.fileno())
+        size = st.st_size
+        reset = offset > size or (inode is not None and st.st_ino != inode)
+        if reset:
+            offset = 0
+        f.seek(offset)
+        data = f.read(max(0, min(size - offset, max_bytes)))
+
+    cut = data.rfind(b'\n') + 1
+    data = data[:cut]
+    return {
+        'lines': _decode(data[:-1]) if data else [],
+        'offset': offset + len(data),
+        'size': size,
+        'reset': reset,
+        'inode': st.st_ino,
+        'has_more': offset + len(data) < size and cut > 0
+    }
+
+
+def follow(path: str, offset: Optional[int] = None, heartbeat: float = 15.0,
+           force_poll: bool = False) -> Iterator[Optional[Dict]]:
+    """
+    Generator vô hạn: yield kết quả read_from() mỗi khi có dòng mới, yield None sau mỗi
+    `heartbeat` giây không có gì (để caller gửi keep-alive và phát hiện client đã ngắt)
+    """
+    try:
+        st = os.stat(path)
+        inode = st.st_ino
+        if offset is None:
+            offset = st.st_size
+    except OSError:
+        inode = None
+        offset = offset or 0
+
+    directory, name = os.path.split(os.path.abspath(path))
+    watcher = DirectoryWatcher([directory], force_poll=force_poll)
+    inotify = watcher.mode == 'inotify'
+    if not inotify:
+        # Poll thư mục logs sẽ stat mọi file; chỉ cần stat đúng file này
+        watcher.close()
+
+    def signature():
+        try:
+            st = os.stat(path)
+            return st.st_ino, st.st_size, st.st_mtime_ns
+        except OSError:
+            return None
+
+    try:
+        last = signature()
+        idle_since = time.time()
+        # Lượt đầu luôn đọc: bắt kịp phần ghi thêm giữa `offset` của client và lúc watcher bắt đầu
+        changed = True
+        while True:
+            if changed and os.path.exists(path):
+                while True:
+                    try:
+                        result = read_from(path, offset, inode=inode)
+                    except OSError:
+                        break
+                    if not result['lines'] and not result['reset']:
+                        break
+                    offset, inode = result['offset'], result['inode']
+                    idle_since = time.time()
+                    yield result
+                    if not result['has_more']:
+                        break
+
+            if time.time() - idle_since >= heartbeat:
+                idle_since = time.time()
+                yield None
+
+            if inotify:
+                events = watcher.wait(timeout=heartbeat)
+                changed = any(event.kind == 'overflow' or event.name == name for event in events)
+            else:
+                time.sleep(FOLLOW_POLL_SECONDS)
+                current = signature()
+                changed, last = current != last, current
+    finally:
+        watcher.close()
@@ -22,51 +22,20 @@ mkdir -p "$LOG_DIR"
 timestamp() { date +"%Y-%m-%d %H:%M:%S"; }
 log() { echo "[$(timestamp)] $*"; }
 
-# Rotate log file nếu quá lớn (max 50MB, giữ 5 files)
+# Đồng bộ PID vào state store (SQLite), PID file vẫn được giữ để tương thích
+STATE_STORE="$SCRIPT_DIR/state_store.py"
+record_pid() { python3 "$STATE_STORE" set-pid "$1" "$2" >/dev/null 2>&1 || true; }
+clear_pid() { python3 "$STATE_STORE" clear-pid "$1" >/dev/null 2>&1 || true; }
+
+# Rotate log file nếu quá lớn (copy-truncate qua log_rotator.py, giữ LOG_ROTATE_KEEP segment).
+# Gost monitor cũng rotate định kỳ cho mọi port nên file không vượt ngưỡng giữa các lần restart
 rotate_log_if_needed() {
     local log_file=$1
-    local max_size_mb=50
-    local max_files=5
-    
-    if [ ! -f "$log_file" ]; then
-        return 0
-    fi
-    
-    # Kiểm tra kích thước file (MB)
-    local size_mb=$(du -m "$log_file" | cut -f1)
-    
-    if [ "$size_mb" -ge "$max_size_mb" ]; then
-        log "🔄 Rotating log file $log_file (size: ${size_mb}MB)"
-        
-        # Rotate: gost_7890.log -> gost_7890.log.1, gost_7890.log.1 -> gost_7890.log.2, etc.
-        for i in $(seq $((max_files - 1)) -1 1); do
-            if [ -f "${log_file}.${i}" ]; then
-                mv "${log_file}.${i}" "${log_file}.$((i + 1))" 2>/dev/null || true
-            fi
-        done
-        
-        # Move current log to .1
-        mv "$log_file" "${log_file}.1" 2>/dev/null || true
-        
-        # Truncate log file mới
-        touch "$log_file"
-        log "✅ Log rotated: ${log_file}.1 created"
+    if [ -f "$log_file" ]; then
+        python3 "$SCRIPT_DIR/log_rotator.py" rotate "$log_file" || true
     fi
 }
 
-# Cleanup old log files (giữ tối đa max_files)
-cleanup_old_logs() {
-    local log_file=$1
-    local max_files=5
-    
-    # Xóa các log files cũ hơn max_files
-    for i in $(seq $((max_files + 1)) 20); do
-        if [ -f "${log_file}.${i}" ]; then
-            rm -f "${log_file}.${i}"
-        fi
-    done
-}
-
 # Gost ports được quản lý động dựa trên config files
 
 # Lấy thông tin proxy từ API
@@ -366,10 +335,10 @@ EOF
                     local listener_opts="socks5://:$port?ttl=30s&so_keepalive=true&so_keepalive_time=30s&so_keepalive_intvl=10s&so_keepalive_probes=3&so_rcvbuf=65536&so_sndbuf=65536"
                     # Rotate log nếu cần trước khi start (đặc biệt quan trọng cho port 7890 chạy 24/7)
                     rotate_log_if_needed "$LOG_DIR/gost_${port}.log"
-                    cleanup_old_logs "$LOG_DIR/gost_${port}.log"
                     nohup $GOST_BIN -D -L "$listener_opts" -F "$optimized_proxy_url" >> "$LOG_DIR/gost_${port}.log" 2>&1 &
                     local pid=$!
                     echo $pid > "$pid_file"
+                    record_pid "$port" "$pid"
                     log "✅ Gost on port $port started with optimized settings (PID: $pid, proxy: $optimized_proxy_url)"
                 else
                     # Khởi động gost với socks5 proxy (các port khác)
@@ -416,10 +385,10 @@ EOF
                         local forwarder_opts="${forwarder_url}?ttl=180s&so_keepalive=true&so_keepalive_time=15s&so_keepalive_intvl=5s&so_keepalive_probes=3&so_rcvbuf=131072&so_sndbuf=131072&nodelay=true&secure=false&timeout=30s"
                         # Rotate log nếu cần trước khi start
                         rotate_log_if_needed "$LOG_DIR/gost_${port}.log"
-                        cleanup_old_logs "$LOG_DIR/gost_${port}.log"
                         nohup $GOST_BIN -D -L "$listener_opts" -F "$forwarder_opts" >> "$LOG_DIR/gost_${port}.log" 2>&1 &
                         local pid=$!
                         echo $pid > "$pid_file"
+                        record_pid "$port" "$pid"
                         log "✅ Gost on port $port started with ProtonVPN optimizations (PID: $pid, proxy: $proxy_url)"
                     else
                         # Default settings cho các provider khác
@@ -430,10 +399,10 @@ EOF
                             forwarder_url="http+tls://${forwarder_url}"
                         fi
                         rotate_log_if_needed "$LOG_DIR/gost_${port}.log"
-                        cleanup_old_logs "$LOG_DIR/gost_${port}.log"
                         nohup $GOST_BIN -D -L socks5://:$port -F "$forwarder_url" >> "$LOG_DIR/gost_${port}.log" 2>&1 &
                         local pid=$!
                         echo $pid > "$pid_file"
+                        record_pid "$port" "$pid"
                         log "✅ Gost on port $port started (PID: $pid, proxy: $proxy_url)"
                     fi
                 fi
@@ -462,6 +431,7 @@ stop_gost() {
                 log "⚠️  Gost on port $port not running (stale PID)"
             fi
             rm -f "$pid_file"
+            clear_pid "$port"
         fi
     done
     
@@ -515,6 +485,7 @@ restart_gost_port() {
             log "⚠️  Gost on port $port not running (stale PID)"
         fi
         rm -f "$pid_file"
+        clear_pid "$port"
     else
         log "⚠️  Gost on port $port not running"
     fi
@@ -588,10 +559,10 @@ restart_gost_port() {
             local listener_opts="socks5://:$port?ttl=30s&so_keepalive=true&so_keepalive_time=30s&so_keepalive_intvl=10s&so_keepalive_probes=3&so_rcvbuf=65536&so_sndbuf=65536"
             # Rotate log nếu cần trước khi start (đặc biệt quan trọng cho port 7890 chạy 24/7)
             rotate_log_if_needed "$LOG_DIR/gost_${port}.log"
-            cleanup_old_logs "$LOG_DIR/gost_${port}.log"
             nohup $GOST_BIN -D -L "$listener_opts" -F "$optimized_proxy_url" >> "$LOG_DIR/gost_${port}.log" 2>&1 &
             local pid=$!
             echo $pid > "$pid_file"
+            record_pid "$port" "$pid"
             log "✅ Gost on port $port started with optimized settings (PID: $pid, proxy: $optimized_proxy_url)"
         else
             # Khởi động gost với socks5 proxy (các port khác)
@@ -636,15 +607,17 @@ restart_gost_port() {
                     forwarder_url="http+tls://${forwarder_url}"
                 fi
                 local forwarder_opts="${forwarder_url}?ttl=180s&so_keepalive=true&so_keepalive_time=15s&so_keepalive_intvl=5s&so_keepalive_probes=3&so_rcvbuf=131072&so_sndbuf=131072&nodelay=true&secure=false&timeout=30s"
-                nohup $GOST_BIN -D -L "$listener_opts" -F "$forwarder_opts" > "$LOG_DIR/gost_${port}.log" 2>&1 &
+                nohup $GOST_BIN -D -L "$listener_opts" -F "$forwarder_opts" >> "$LOG_DIR/gost_${port}.log" 2>&1 &
                 local pid=$!
                 echo $pid > "$pid_file"
+                record_pid "$port" "$pid"
                 log "✅ Gost on port $port started with ProtonVPN optimizations (PID: $pid, proxy: $proxy_url)"
             else
                 # Default settings cho các provider khác
-                nohup $GOST_BIN -D -L socks5://:$port -F "$proxy_url" > "$LOG_DIR/gost_${port}.log" 2>&1 &
+                nohup $GOST_BIN -D -L socks5://:$port -F "$proxy_url" >> "$LOG_DIR/gost_${port}.log" 2>&1 &
                 local pid=$!
                 echo $pid > "$pid_file"
+                record_pid "$port" "$pid"
                 log "✅ Gost on port $port started (PID: $pid, proxy: $proxy_url)"
             fi
         fi
@@ -665,11 +638,13 @@ status_gost() {
                 log "  ✅ Port $port: Running (PID: $pid)"
                 any_running=true
                 
-                # Test connection
-                if timeout 15 bash -c "curl -s --max-time 10 -x socks5h://127.0.0.1:$port https://ipinfo.io/ip" &>/dev/null; then
+                # Test connection (SOCKS5 probe, phân loại lỗi nếu thất bại)
+                local probe_output
+                if probe_output=$(python3 "$SCRIPT_DIR/proxy_probe.py" --timeout 10 "$port" 2>&1); then
                     log "     🌐 Connection: OK"
                 else
                     log "     ⚠️  Connection: Failed (may need more time to establish)"
+                    log "     ${probe_output#❌ }"
                 fi
             else
                 log "  ❌ Port $port: Not running"
@@ -810,19 +785,9 @@ case "${1:-}" in
         update_all_protonvpn_auth
         ;;
     rotate-logs)
-        # Rotate logs cho tất cả Gost services
+        # Rotate logs cho tất cả Gost services (>= LOG_ROTATE_MAX_MB) và nén segment cũ
         log "🔄 Rotating logs for all Gost services..."
-        for config_file in "$CONFIG_DIR"/gost_*.config; do
-            if [ -f "$config_file" ]; then
-                local port=$(basename "$config_file" | sed 's/gost_\(.*\)\.config/\1/')
-                local log_file="$LOG_DIR/gost_${port}.log"
-                if [ -f "$log_file" ]; then
-                    rotate_log_if_needed "$log_file"
-                    cleanup_old_logs "$log_file"
-                    log "✅ Checked log rotation for port $port"
-                fi
-            fi
-        done
+        python3 "$SCRIPT_DIR/log_rotator.py" --dir "$LOG_DIR" once || true
         log "✅ Log rotation complete"
         ;;
     *)
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Metrics
+Counter/Gauge/Histogram tối giản theo Prometheus text format (0.0.4), không cần prometheus_client.
+Web UI expose registry của nó qua /metrics; các daemon riêng (gost monitor, credential updater)
+ghi registry ra logs/metrics/<tên>.prom (textfile, ghi atomic) để /metrics gộp vào.
+"""
+
+import os
+import sys
+import math
+import time
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+PREFIX = 'mac_proxy_'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TEXTFILE_SUFFIX = '.prom'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def default_metrics_dir(base_dir: Optional[str] = None) -> str:
+    base_dir = base_dir or os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base_dir, 'logs', 'metrics')
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _escape_help(text) -> str:
+    return str(text).replace('\\', '\\\\').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if value == -math.inf:
+        return '-Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name if name.startswith(PREFIX) else PREFIX + name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict) -> Tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def remove(self, **labels):
+        with self._lock:
+            self._values.pop(self._key(labels), None)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {_escape_help(self.documentation)}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return '\n'.join(lines) + '\n'
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1.0, **labels):
+        if amount < 0:
+            raise ValueError('Counter chỉ tăng')
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['buckets'][i] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """with histogram.time(route='x'): ... - ghi thời gian chạy (giây), kể cả khi có exception"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, dict(state, buckets=list(state['buckets']))) for key, state in self._values.items())
+        lines = []
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state['buckets']):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', _format_value(bound)))} "
+                             f"{cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', '+Inf'))} {state['count']}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(state['sum'])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {state['count']}")
+        return lines
+
+
+class Registry:
+    """Tập metrics của một process + collectors tính giá trị lúc scrape"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[_Metric]]] = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, documentation: str, labelnames: Iterable[str], **kwargs):
+        full_name = name if name.startswith(PREFIX) else PREFIX + name
+        with self._lock:
+            metric = self._metrics.get(full_name)
+            if metric is None:
+                metric = self._metrics[full_name] = cls(full_name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {full_name} đã được khai báo với kiểu/labels khác")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def register_collector(self, collector: Callable[[], Iterable[_Metric]]):
+        """collector() trả về các metric tạo mới mỗi lần scrape (vd đọc từ state store)"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        parts = [metric.render() for metric in metrics]
+        for collector in self._collectors:
+            try:
+                parts.extend(metric.render() for metric in collector())
+            except Exception as e:
+                # Một collector lỗi không được làm hỏng cả /metrics
+                parts.append(f"# collector {getattr(collector, '__name__', collector)} failed: {_escape(e)}\n")
+        return ''.join(parts)
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+    return REGISTRY.counter(name, documentation, labelnames)
+
+
+def gauge(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+    return REGISTRY.gauge(name, documentation, labelnames)
+
+
+def histogram(name: str, documentation: str, labelnames: Iterable[str] = (),
+              buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.histogram(name, documentation, labelnames, buckets)
+
+
+# ----- Textfile (cho các daemon không có HTTP server) -----
+
+def write_textfile(path: str, registry: Registry = REGISTRY) -> bool:
+    """Ghi registry ra file .prom (atomic: mkstemp + os.replace để /metrics không đọc file dở)"""
+    try:
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.metrics_', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(registry.render())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return True
+    except OSError as e:
+        print(f"⚠️  Cannot write metrics textfile {path}: {e}")
+        return False
+
+
+def render_textfiles(directory: str) -> str:
+    """Gộp các file .prom của daemon, kèm tuổi của từng file để phát hiện daemon đã dừng"""
+    if not os.path.isdir(directory):
+        return ''
+    parts = []
+    age = Gauge('textfile_age_seconds', 'Số giây từ lần cuối daemon ghi metrics textfile', ('source',))
+    now = time.time()
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith(TEXTFILE_SUFFIX):
+            continue
+        path = os.path.join(directory, filename)
+        try:
+            with open(path, 'r') as f:
+                parts.append(f.read())
+            age.set(max(0.0, now - os.path.getmtime(path)), source=filename[:-len(TEXTFILE_SUFFIX)])
+        except OSError:
+            continue
+    parts.append(age.render())
+    return ''.join(parts)
+
+
+def main(argv: List[str]) -> int:
+    """In metrics hiện có (registry rỗng + các textfile) - tiện để kiểm tra daemon từ shell"""
+    directory = argv[1] if len(argv) > 1 else default_metrics_dir()
+    sys.stdout.write(render_textfiles(directory))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -5,13 +5,23 @@ Lấy danh sách server NordVPN và thông tin cấu hình
 """
 
 import requests
-import json
-from typing import List, Dict, Optional
+import time
+from typing import List, Dict, Optional, Sequence
 import os
 
+import metrics
+import fast_json
+from catalog_query import CatalogIndex, CatalogStore
+
 NORDVPN_API_URL = "https://api.nordvpn.com/v1"
 CACHE_FILE = "nordvpn_servers_cache.json"
 CACHE_DURATION = 3600  # 1 hour
+NORDVPN_PROXY_PORT = 89
+
+CATALOG_REFRESH_SECONDS = metrics.histogram(
+    'catalog_refresh_duration_seconds', 'Thời gian tải lại danh sách server từ API provider', ('provider',))
+CATALOG_REFRESH_TOTAL = metrics.counter(
+    'catalog_refresh_total', 'Số lần tải lại danh sách server theo kết quả', ('provider', 'outcome'))
 
 # Default private key for NordVPN
 # IMPORTANT: This private key must be generated from your NordVPN account
@@ -20,24 +30,38 @@ DEFAULT_PRIVATE_KEY = "ECDeW1Oi8TC5reUZcyp8n3KAOaDVz3ZXZB5tu1+8Ik4="
 class NordVPNAPI:
     def __init__(self, cache_file=CACHE_FILE):
         self.cache_file = cache_file
-        self.servers = []
+        # Snapshot bất biến (servers + index + version), refresh build bên ngoài rồi swap nguyên tử
+        self._store = CatalogStore('nordvpn')
     
-    def fetch_servers(self, force_refresh=False) -> List[Dict]:
-        """Lấy danh sách server từ NordVPN API hoặc cache"""
-        
+    @property
+    def servers(self) -> Sequence[Dict]:
+        """Danh sách server (read-only) của snapshot hiện tại"""
+        snapshot = self._store.snapshot
+        return snapshot.servers if snapshot is not None else ()
+
+    @property
+    def version(self):
+        """Version của snapshot hiện tại (mtime + size của file cache): đổi khi có catalog mới"""
+        snapshot = self._store.snapshot
+        return snapshot.version if snapshot is not None else None
+
+    def fetch_servers(self, force_refresh=False) -> Sequence[Dict]:
+        """Lấy danh sách server (read-only, dùng chung với mọi reader) từ NordVPN API hoặc cache"""
+        return self._store.get(lambda current: self._load(current, force_refresh), wait=force_refresh).servers
+
+    def _load(self, current: Optional[CatalogIndex], force_refresh: bool) -> CatalogIndex:
+        """Snapshot mới nhất: current nếu file cache không đổi, nếu không thì đọc cache / gọi API"""
         # Check cache first
         if not force_refresh and os.path.exists(self.cache_file):
             try:
-                import time
                 cache_age = time.time() - os.path.getmtime(self.cache_file)
                 if cache_age < CACHE_DURATION:
-                    with open(self.cache_file, 'r') as f:
-                        self.servers = json.load(f)
-                        return self.servers
+                    return self._load_cache(current)
             except Exception:
                 pass
         
         # Fetch from API
+        refresh_started = time.perf_counter()
         try:
             # Get all servers with WireGuard support
             response = requests.get(
@@ -50,10 +74,10 @@ class NordVPNAPI:
             )
             response.raise_for_status()
             
-            raw_servers = response.json()
+            raw_servers = fast_json.loads(response.content)
             
-            # Parse and format servers
-            self.servers = []
+            # Parse and format servers (list riêng, reader vẫn thấy snapshot cũ cho tới khi swap)
+            servers = []
             for server in raw_servers:
                 # Get WireGuard technology details
                 wg_tech = None
@@ -95,46 +119,66 @@ class NordVPNAPI:
                     'status': server.get('status', 'unknown')
                 }
                 
-                self.servers.append(server_info)
+                servers.append(server_info)
             
             # Sort by country and load
-            self.servers.sort(key=lambda x: (x['country']['name'], x['load']))
+            servers.sort(key=lambda x: (x['country']['name'], x['load']))
             
-            # Save to cache
+            # Save to cache: compact (chỉ máy đọc), ghi file tạm rồi rename để process khác không đọc phải file ghi dở
             try:
-                with open(self.cache_file, 'w') as f:
-                    json.dump(self.servers, f, indent=2)
+                fast_json.dump_file(servers, self.cache_file)
             except Exception:
                 pass
+            snapshot = self._store.publish(servers, self._cache_signature() or f"api-{time.time_ns():x}")
             
-            return self.servers
+            CATALOG_REFRESH_SECONDS.observe(time.perf_counter() - refresh_started, provider='nordvpn')
+            CATALOG_REFRESH_TOTAL.inc(provider='nordvpn', outcome='success')
+            return snapshot
             
         except Exception as e:
+            CATALOG_REFRESH_TOTAL.inc(provider='nordvpn', outcome='failure')
             # If API fails, try to load from cache
             if os.path.exists(self.cache_file):
                 try:
-                    with open(self.cache_file, 'r') as f:
-                        self.servers = json.load(f)
-                        return self.servers
+                    return self._load_cache(current)
                 except Exception:
                     pass
             
             raise Exception(f"Failed to fetch NordVPN servers: {str(e)}")
     
+    def _load_cache(self, current: Optional[CatalogIndex]) -> CatalogIndex:
+        signature = self._cache_signature()
+        if current is not None and signature == current.version:
+            # File cache không đổi từ lần đọc trước: không parse lại
+            return current
+        servers = fast_json.load_file(self.cache_file)
+        return self._store.publish(servers, signature)
+
+    def _cache_signature(self) -> Optional[str]:
+        try:
+            st = os.stat(self.cache_file)
+            return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+        except OSError:
+            return None
+
+    def catalog_index(self) -> CatalogIndex:
+        """Snapshot hiện tại (servers + index country/city/tier/status/features/load + version)"""
+        snapshot = self._store.snapshot
+        if snapshot is None:
+            self.fetch_servers()
+            snapshot = self._store.snapshot
+        return snapshot
+
     def get_servers_by_country(self, country_code: str) -> List[Dict]:
         """Lấy danh sách server theo quốc gia"""
-        if not self.servers:
-            self.fetch_servers()
-        
-        return [s for s in self.servers if s['country']['code'].lower() == country_code.lower()]
+        return self.catalog_index().servers_for(country=country_code)
     
     def get_countries(self) -> List[Dict]:
         """Lấy danh sách các quốc gia có server"""
-        if not self.servers:
-            self.fetch_servers()
+        servers = self.catalog_index().servers
         
         countries = {}
-        for server in self.servers:
+        for server in servers:
             code = server['country']['code']
             if code not in countries:
                 countries[code] = {
@@ -148,34 +192,25 @@ class NordVPNAPI:
     
     def get_server_by_name(self, name: str) -> Optional[Dict]:
         """Lấy thông tin server theo tên"""
-        if not self.servers:
-            self.fetch_servers()
-        
-        for server in self.servers:
-            if server['name'].lower() == name.lower() or server['hostname'].lower() == name.lower():
-                return server
-        
-        return None
+        # Index name/hostname của snapshot, không quét toàn bộ catalog
+        return self.catalog_index().find(name)
     
-    def get_best_server(self, country_code: Optional[str] = None) -> Optional[Dict]:
-        """Lấy server tốt nhất (load thấp nhất)"""
-        if not self.servers:
-            self.fetch_servers()
-        
-        servers = self.servers
-        if country_code:
-            servers = self.get_servers_by_country(country_code)
-        
-        if not servers:
-            return None
-        
-        # Filter only online servers
-        online_servers = [s for s in servers if s['status'] == 'online']
+    def rank_servers(self, servers: List[Dict], history=None) -> List[Dict]:
+        """Sắp xếp server tốt nhất trước: quality score đo được (server_history) nếu có, sau đó load"""
+        tiebreak = lambda x: (x.get('load', 100),)
+        if history is None:
+            return sorted(servers, key=tiebreak)
+        return history.rank(servers, lambda x: f"{(x.get('hostname') or '').lower()}:{NORDVPN_PROXY_PORT}", tiebreak)
+
+    def get_best_server(self, country_code: Optional[str] = None, history=None) -> Optional[Dict]:
+        """Lấy server tốt nhất (score đo được nếu có history, rồi tới load thấp nhất)"""
+        # Online + country qua index, không quét toàn bộ catalog
+        online_servers = self.catalog_index().servers_for(country=country_code or None, status='online')
         if not online_servers:
             return None
         
-        # Sort by load
-        return min(online_servers, key=lambda x: x['load'])
+        # Sort by measured quality and load
+        return self.rank_servers(online_servers, history)[0]
     
     def generate_wireguard_config(self, server: Dict, private_key: str = None, 
                                   address: str = "10.5.0.2/16", 
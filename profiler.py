@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Profiler
+Profiling theo yêu cầu cho process đang chạy (không cần restart dưới profiler):
+- Sampling CPU: chụp stack mọi thread (sys._current_frames) mỗi vài ms, xuất collapsed stack
+  (flamegraph.pl / speedscope đều đọc được) hoặc file speedscope JSON
+- Memory: tracemalloc top allocators + diff với snapshot trước, kích thước sâu của object cụ thể
+- Signal: SIGUSR1 = sampling profile, SIGUSR2 = memory snapshot, ghi ra logs/profiles/ (cho daemon)
+"""
+
+import os
+import sys
+import gc
+import time
+import json
+import signal
+import threading
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+
+DEFAULT_INTERVAL_SECONDS = 0.005
+MAX_PROFILE_SECONDS = 60
+TRACEMALLOC_FRAMES = 10
+SIGNAL_PROFILE_SECONDS = int(os.environ.get('PROFILE_SIGNAL_SECONDS', '10'))
+
+# Chỉ một sampling profile tại một thời điểm (mỗi profile thêm overhead cho cả process)
+_profile_lock = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def sample_stacks(seconds: float, interval: float = DEFAULT_INTERVAL_SECONDS) -> Dict:
+    """
+    Chụp stack của tất cả thread (trừ thread đang sample) trong `seconds` giây.
+    Trả về {'samples': Counter(collapsed_stack -> số lần), 'interval', 'duration', 'count'}
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy('Another profile is running')
+    try:
+        seconds = max(0.1, min(float(seconds), MAX_PROFILE_SECONDS))
+        me = threading.get_ident()
+        samples: Counter = Counter()
+        count = 0
+        started = time.perf_counter()
+        deadline = started + seconds
+        while time.perf_counter() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f'thread-{ident}'))
+                samples[';'.join(reversed(stack))] += 1
+            count += 1
+            time.sleep(interval)
+        return {'samples': samples, 'interval': interval, 'duration': time.perf_counter() - started, 'count': count}
+    finally:
+        _profile_lock.release()
+
+
+def to_collapsed(profile: Dict) -> str:
+    """Định dạng collapsed stack: 'thread;outer;inner N' mỗi dòng"""
+    return ''.join(f"{stack} {count}\n" for stack, count in profile['samples'].most_common())
+
+
+def to_speedscope(profile: Dict, name: str = 'mac_proxy') -> Dict:
+    """File speedscope (https://www.speedscope.app) dạng sampled, mỗi thread một profile"""
+    frames: List[Dict] = []
+    frame_index: Dict[str, int] = {}
+    by_thread: Dict[str, Dict[str, list]] = {}
+    for stack, count in profile['samples'].items():
+        thread, *calls = stack.split(';')
+        indexes = []
+        for call in calls:
+            if call not in frame_index:
+                frame_index[call] = len(frames)
+                func, _, location = call.partition(' (')
+                file, _, line = location.rstrip(')').rpartition(':')
+                frames.append({'name': func, 'file': file, 'line': int(line) if line.isdigit() else None})
+            indexes.append(frame_index[call])
+        entry = by_thread.setdefault(thread, {'samples': [], 'weights': []})
+        entry['samples'].append(indexes)
+        entry['weights'].append(count * profile['interval'])
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': name,
+        'exporter': 'mac_proxy profiler',
+        'shared': {'frames': frames},
+        'profiles': [
+            {'type': 'sampled', 'name': thread, 'unit': 'seconds', 'startValue': 0,
+             'endValue': sum(entry['weights']), 'samples': entry['samples'], 'weights': entry['weights']}
+            for thread, entry in sorted(by_thread.items())
+        ]
+    }
+
+
+# ----- Memory -----
+
+def current_rss_bytes() -> Optional[int]:
+    """RSS hiện tại (Linux: /proc; macOS: chỉ có peak qua getrusage)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except (ImportError, OSError):
+        return None
+
+
+def deep_sizeof(obj) -> int:
+    """Kích thước sâu (bytes) của object: dict/list/tuple/set và các phần tử (mỗi object đếm một lần)"""
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        elif hasattr(item, '__dict__'):
+            stack.append(item.__dict__)
+    return total
+
+
+class MemoryProfiler:
+    """tracemalloc theo yêu cầu: start, snapshot top allocators, diff với snapshot trước"""
+
+    def __init__(self, frames: int = TRACEMALLOC_FRAMES):
+        self.frames = frames
+        self._previous: Optional[tracemalloc.Snapshot] = None
+        self._lock = threading.Lock()
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+
+    def stop(self):
+        with self._lock:
+            self._previous = None
+        tracemalloc.stop()
+
+    @staticmethod
+    def _stat_to_dict(stat) -> Dict:
+        frame = stat.traceback[0]
+        return {'location': f"{frame.filename}:{frame.lineno}", 'size_kb': round(stat.size / 1024, 1),
+                'count': stat.count}
+
+    @staticmethod
+    def _diff_to_dict(stat) -> Dict:
+        frame = stat.traceback[0]
+        return {'location': f"{frame.filename}:{frame.lineno}", 'size_kb': round(stat.size / 1024, 1),
+                'size_diff_kb': round(stat.size_diff / 1024, 1), 'count_diff': stat.count_diff}
+
+    def snapshot(self, limit: int = 20, key_type: str = 'lineno', diff: bool = True) -> Dict:
+        """Top allocators hiện tại; diff=True so với snapshot lần trước (nếu có)"""
+        result = {'rss_bytes': current_rss_bytes(), 'gc_objects': len(gc.get_objects()), 'tracing': self.tracing}
+        if not self.tracing:
+            return result
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        current, peak = tracemalloc.get_traced_memory()
+        result.update(traced_current_bytes=current, traced_peak_bytes=peak,
+                      top=[self._stat_to_dict(stat) for stat in snapshot.statistics(key_type)[:limit]])
+        with self._lock:
+            previous, self._previous = self._previous, snapshot
+        if diff and previous is not None:
+            result['diff'] = [self._diff_to_dict(stat) for stat in snapshot.compare_to(previous, key_type)[:limit]]
+        return result
+
+
+MEMORY = MemoryProfiler()
+
+
+# ----- Signal dump (cho daemon không có HTTP) -----
+
+def _dump_path(dump_dir: str, name: str, kind: str, extension: str) -> str:
+    os.makedirs(dump_dir, exist_ok=True)
+    return os.path.join(dump_dir, f"{name}_{kind}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}")
+
+
+def dump_profile(dump_dir: str, name: str, seconds: Optional[float] = None) -> Optional[str]:
+    try:
+        profile = sample_stacks(seconds or SIGNAL_PROFILE_SECONDS)
+    except ProfilerBusy:
+        print("⚠️  Profile already running, ignoring signal")
+        return None
+    path = _dump_path(dump_dir, name, 'cpu', 'collapsed')
+    with open(path, 'w') as f:
+        f.write(to_collapsed(profile))
+    print(f"📊 CPU profile ({profile['count']} samples, {profile['duration']:.1f}s) written to {path}")
+    return path
+
+
+def dump_memory(dump_dir: str, name: str, limit: int = 30) -> str:
+    """Lần đầu: bật tracemalloc + snapshot nền; các lần sau có diff so với lần trước"""
+    MEMORY.start()
+    result = MEMORY.snapshot(limit=limit)
+    path = _dump_path(dump_dir, name, 'mem', 'json')
+    with open(path, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"📊 Memory snapshot written to {path}")
+    return path
+
+
+def install_signal_handlers(dump_dir: str, name: str):
+    """SIGUSR1 -> CPU profile SIGNAL_PROFILE_SECONDS giây, SIGUSR2 -> memory snapshot (chạy trong thread riêng)"""
+    def spawn(target, *args):
+        def handler(signum, frame):
+            threading.Thread(target=target, args=args, name=f'profiler-{signum}', daemon=True).start()
+        return handler
+
+    signal.signal(signal.SIGUSR1, spawn(dump_profile, dump_dir, name))
+    signal.signal(signal.SIGUSR2, spawn(dump_memory, dump_dir, name))
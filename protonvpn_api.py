@@ -5,10 +5,14 @@ Lấy danh sách server ProtonVPN và thông tin cấu hình
 """
 
 import requests
-import json
-from typing import List, Dict, Optional
+import time
+from typing import List, Dict, Optional, Sequence
 import os
 
+import metrics
+import fast_json
+from catalog_query import CatalogIndex, CatalogStore
+
 # Import protonvpn_service để lấy credentials từ config_token.txt
 try:
     from protonvpn_service import Instance as ProtonVpnServiceInstance
@@ -19,6 +23,11 @@ PROTONVPN_API_URL = "https://account.proton.me/api/vpn/v1/logicals"
 CACHE_FILE = "protonvpn_servers_cache.json"
 CACHE_DURATION = 3600  # 1 hour
 
+CATALOG_REFRESH_SECONDS = metrics.histogram(
+    'catalog_refresh_duration_seconds', 'Thời gian tải lại danh sách server từ API provider', ('provider',))
+CATALOG_REFRESH_TOTAL = metrics.counter(
+    'catalog_refresh_total', 'Số lần tải lại danh sách server theo kết quả', ('provider', 'outcome'))
+
 # ProtonVPN API credentials (example - user should provide their own)
 # Get these from ProtonVPN account
 PROTONVPN_AUTH = {
@@ -32,7 +41,8 @@ DEFAULT_PRIVATE_KEY = "mHp/fZJpapyDKr4QT1SVZGg5xgNkpJUKNCXVk7P7yk4="
 class ProtonVPNAPI:
     def __init__(self, cache_file=CACHE_FILE, bearer_token='', uid=''):
         self.cache_file = cache_file
-        self.servers = []
+        # Snapshot bất biến (servers + index + version), refresh build bên ngoài rồi swap nguyên tử
+        self._store = CatalogStore('protonvpn')
         self.bearer_token = bearer_token or PROTONVPN_AUTH.get('bearer_token', '')
         self.uid = uid or PROTONVPN_AUTH.get('uid', '')
     
@@ -76,18 +86,30 @@ class ProtonVPNAPI:
             print(f"Failed to refresh credentials from config_token.txt: {e}")
         return False
     
-    def fetch_servers(self, force_refresh=False) -> List[Dict]:
-        """Lấy danh sách server từ ProtonVPN API hoặc cache"""
-        
+    @property
+    def servers(self) -> Sequence[Dict]:
+        """Danh sách server (read-only) của snapshot hiện tại"""
+        snapshot = self._store.snapshot
+        return snapshot.servers if snapshot is not None else ()
+
+    @property
+    def version(self):
+        """Version của snapshot hiện tại (mtime + size của file cache): đổi khi có catalog mới"""
+        snapshot = self._store.snapshot
+        return snapshot.version if snapshot is not None else None
+
+    def fetch_servers(self, force_refresh=False) -> Sequence[Dict]:
+        """Lấy danh sách server (read-only, dùng chung với mọi reader) từ ProtonVPN API hoặc cache"""
+        return self._store.get(lambda current: self._load(current, force_refresh), wait=force_refresh).servers
+
+    def _load(self, current: Optional[CatalogIndex], force_refresh: bool) -> CatalogIndex:
+        """Snapshot mới nhất: current nếu file cache không đổi, nếu không thì đọc cache / gọi API"""
         # Check cache first
         if not force_refresh and os.path.exists(self.cache_file):
             try:
-                import time
                 cache_age = time.time() - os.path.getmtime(self.cache_file)
                 if cache_age < CACHE_DURATION:
-                    with open(self.cache_file, 'r') as f:
-                        self.servers = json.load(f)
-                        return self.servers
+                    return self._load_cache(current)
             except Exception:
                 pass
         
@@ -97,6 +119,7 @@ class ProtonVPNAPI:
                 raise Exception("ProtonVPN credentials not provided and failed to refresh from API.")
         
         # Fetch from API
+        refresh_started = time.perf_counter()
         try:
             headers = {
                 'x-pm-single-group': 'vpn-paid',
@@ -128,11 +151,11 @@ class ProtonVPNAPI:
             
             response.raise_for_status()
             
-            raw_data = response.json()
+            raw_data = fast_json.loads(response.content)
             logical_servers = raw_data.get('LogicalServers', [])
             
-            # Parse and format servers
-            self.servers = []
+            # Parse and format servers (list riêng, reader vẫn thấy snapshot cũ cho tới khi swap)
+            servers = []
             for server in logical_servers:
                 # Get physical servers for WireGuard endpoints
                 physical_servers = server.get('Servers', [])
@@ -200,27 +223,28 @@ class ProtonVPNAPI:
                     ]
                 }
                 
-                self.servers.append(server_info)
+                servers.append(server_info)
             
             # Sort by country, tier, and load
-            self.servers.sort(key=lambda x: (x['country']['name'], x['tier'], x['load']))
+            servers.sort(key=lambda x: (x['country']['name'], x['tier'], x['load']))
             
-            # Save to cache
+            # Save to cache: compact (chỉ máy đọc), ghi file tạm rồi rename để process khác không đọc phải file ghi dở
             try:
-                with open(self.cache_file, 'w') as f:
-                    json.dump(self.servers, f, indent=2)
+                fast_json.dump_file(servers, self.cache_file)
             except Exception:
                 pass
+            snapshot = self._store.publish(servers, self._cache_signature() or f"api-{time.time_ns():x}")
             
-            return self.servers
+            CATALOG_REFRESH_SECONDS.observe(time.perf_counter() - refresh_started, provider='protonvpn')
+            CATALOG_REFRESH_TOTAL.inc(provider='protonvpn', outcome='success')
+            return snapshot
             
         except Exception as e:
+            CATALOG_REFRESH_TOTAL.inc(provider='protonvpn', outcome='failure')
             # If API fails, try to load from cache
             if os.path.exists(self.cache_file):
                 try:
-                    with open(self.cache_file, 'r') as f:
-                        self.servers = json.load(f)
-                        return self.servers
+                    return self._load_cache(current)
                 except Exception:
                     pass
             
@@ -249,27 +273,43 @@ class ProtonVPNAPI:
         }
         return countries.get(code, code)
     
+    def _load_cache(self, current: Optional[CatalogIndex]) -> CatalogIndex:
+        signature = self._cache_signature()
+        if current is not None and signature == current.version:
+            # File cache không đổi từ lần đọc trước: không parse lại
+            return current
+        servers = fast_json.load_file(self.cache_file)
+        return self._store.publish(servers, signature)
+
+    def _cache_signature(self) -> Optional[str]:
+        try:
+            st = os.stat(self.cache_file)
+            return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+        except OSError:
+            return None
+
+    def catalog_index(self) -> CatalogIndex:
+        """Snapshot hiện tại (servers + index country/city/tier/status/features/load + version)"""
+        snapshot = self._store.snapshot
+        if snapshot is None:
+            self.fetch_servers()
+            snapshot = self._store.snapshot
+        return snapshot
+
     def get_servers_by_country(self, country_code: str) -> List[Dict]:
         """Lấy danh sách server theo quốc gia"""
-        if not self.servers:
-            self.fetch_servers()
-        
-        return [s for s in self.servers if s['country']['code'].lower() == country_code.lower()]
+        return self.catalog_index().servers_for(country=country_code)
     
     def get_servers_by_tier(self, tier: int) -> List[Dict]:
         """Lấy danh sách server theo tier (0=Free, 1=Basic, 2=Plus)"""
-        if not self.servers:
-            self.fetch_servers()
-        
-        return [s for s in self.servers if s['tier'] >= tier]
+        return self.catalog_index().servers_for(tier=tier)
     
     def get_countries(self) -> List[Dict]:
         """Lấy danh sách các quốc gia có server"""
-        if not self.servers:
-            self.fetch_servers()
+        servers = self.catalog_index().servers
         
         countries = {}
-        for server in self.servers:
+        for server in servers:
             code = server['country']['code']
             if code not in countries:
                 countries[code] = {
@@ -289,40 +329,39 @@ class ProtonVPNAPI:
     
     def get_server_by_name(self, name: str) -> Optional[Dict]:
         """Lấy thông tin server theo tên"""
-        if not self.servers:
-            self.fetch_servers()
-        
-        for server in self.servers:
-            if server['name'].lower() == name.lower() or server['domain'].lower() == name.lower():
-                return server
-        
-        return None
+        # Index name/domain của snapshot, không quét toàn bộ catalog
+        return self.catalog_index().find(name)
     
-    def get_best_server(self, country_code: Optional[str] = None, tier: Optional[int] = None) -> Optional[Dict]:
-        """Lấy server tốt nhất (load thấp nhất)"""
-        if not self.servers:
-            self.fetch_servers()
-        
-        servers = self.servers
-        
-        # Filter by country
-        if country_code:
-            servers = [s for s in servers if s['country']['code'].lower() == country_code.lower()]
-        
-        # Filter by tier
-        if tier is not None:
-            servers = [s for s in servers if s['tier'] >= tier]
-        
-        if not servers:
-            return None
-        
-        # Filter only online servers
-        online_servers = [s for s in servers if s['status'] == 'online']
+    @staticmethod
+    def get_proxy_port(server: Dict) -> int:
+        """Port HTTPS proxy của server (label + 4443)"""
+        if server.get('servers'):
+            try:
+                return 4443 + int(server['servers'][0].get('label', '0') or 0)
+            except (ValueError, TypeError):
+                pass
+        return 4443
+
+    def rank_servers(self, servers: List[Dict], history=None) -> List[Dict]:
+        """
+        Sắp xếp server tốt nhất trước: theo quality score đo được (server_history) nếu có,
+        sau đó theo load và score của ProtonVPN
+        """
+        tiebreak = lambda x: (x.get('load', 100), -x.get('score', 0))
+        if history is None:
+            return sorted(servers, key=tiebreak)
+        return history.rank(servers, lambda x: f"{x.get('domain', '').lower()}:{self.get_proxy_port(x)}", tiebreak)
+
+    def get_best_server(self, country_code: Optional[str] = None, tier: Optional[int] = None,
+                        history=None) -> Optional[Dict]:
+        """Lấy server tốt nhất (score đo được nếu có history, rồi tới load thấp nhất)"""
+        # Online + country + tier qua index, không quét toàn bộ catalog
+        online_servers = self.catalog_index().servers_for(country=country_code or None, tier=tier, status='online')
         if not online_servers:
             return None
         
-        # Sort by load and score
-        return min(online_servers, key=lambda x: (x['load'], -x['score']))
+        # Sort by measured quality, load and score
+        return self.rank_servers(online_servers, history)[0]
     
     def generate_wireguard_config(self, server: Dict, private_key: str = None, 
                                   address: str = "10.2.0.2/32", 
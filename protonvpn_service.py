@@ -12,6 +12,14 @@ from datetime import datetime, timedelta
 import threading
 import time
 
+import metrics
+
+CREDENTIAL_FETCH_TOTAL = metrics.counter(
+    'credential_fetch_total', 'Lấy VPN credentials (load) và refresh access token theo kết quả', ('step', 'outcome'))
+ACCESS_TOKEN_EXPIRY = metrics.gauge(
+    'credential_access_token_expiry_timestamp_seconds',
+    'Thời điểm (epoch) access token ProtonVPN hết hạn; time-to-expiry = giá trị - time()')
+
 class ProtonVpnService:
     """Singleton service để quản lý ProtonVPN authentication và credentials"""
     
@@ -148,8 +156,10 @@ class ProtonVpnService:
                             retry_count += 1
                             continue
                         else:
+                            CREDENTIAL_FETCH_TOTAL.inc(step='load', outcome='failure')
                             return
                     else:
+                        CREDENTIAL_FETCH_TOTAL.inc(step='load', outcome='failure')
                         return
                 
                 # Parse JSON response
@@ -157,15 +167,17 @@ class ProtonVpnService:
                     data = json.loads(json_data)
                     self.user_name = data.get("Username")
                     self.password = data.get("Password")
-                
-                    
+                    CREDENTIAL_FETCH_TOTAL.inc(step='load',
+                                               outcome='success' if self.user_name and self.password else 'failure')
                     return
                 except json.JSONDecodeError:
                     print(f"Error parsing JSON response: {json_data}")
+                    CREDENTIAL_FETCH_TOTAL.inc(step='load', outcome='failure')
                     return
                     
             except Exception as e:
                 print(f"Error in load: {e}")
+                CREDENTIAL_FETCH_TOTAL.inc(step='load', outcome='failure')
                 return
     
     
@@ -248,6 +260,7 @@ class ProtonVpnService:
                             try:
                                 expires_seconds = int(expires_in)
                                 self.model['expired_time'] = (datetime.now() + timedelta(seconds=expires_seconds)).isoformat()
+                                ACCESS_TOKEN_EXPIRY.set(time.time() + expires_seconds)
                             except (ValueError, TypeError):
                                 pass
                         
@@ -260,15 +273,17 @@ class ProtonVpnService:
                         # Save to file
                         self._save_model()
                         
+                        CREDENTIAL_FETCH_TOTAL.inc(step='refresh', outcome='success')
                         return True
                 except json.JSONDecodeError:
                     print(f"Error parsing refresh response: {json_data}")
-                    return False
             
+            CREDENTIAL_FETCH_TOTAL.inc(step='refresh', outcome='failure')
             return False
             
         except Exception as e:
             print(f"Error in refresh: {e}")
+            CREDENTIAL_FETCH_TOTAL.inc(step='refresh', outcome='failure')
             return False
     
     @classmethod
@@ -152,18 +152,14 @@ class ProxyAPI:
     
     def test_proxy_connection(self, proxy_url: str, timeout: int = 10) -> bool:
         """
-        Test kết nối proxy
+        Test kết nối proxy: socks5:// qua SOCKS5 probe, http(s):// bằng CONNECT trực tiếp tới upstream
         """
         try:
-            # Test với curl qua proxy
-            import subprocess
-            result = subprocess.run([
-                'curl', '-s', '--max-time', str(timeout),
-                '--proxy', proxy_url,
-                'https://ipinfo.io/ip'
-            ], capture_output=True, text=True, timeout=timeout)
-            
-            return result.returncode == 0 and result.stdout.strip()
+            from proxy_probe import probe_proxy_url
+            result = probe_proxy_url(proxy_url, timeout=timeout)
+            if not result['ok']:
+                print(f"Proxy test failed ({result['status']}): {result['error']}")
+            return result['ok']
         except Exception as e:
             print(f"Error testing proxy: {e}")
             return False
@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+"""
+Proxy Probe
+Health check nhẹ cho gost ở mức SOCKS5: greeting + CONNECT tới một target cấu hình được,
+đo riêng thời gian handshake và CONNECT, phân loại lỗi (listener down, upstream 407/timeout/DNS...).
+Chỉ lấy egress IP khi được yêu cầu, nên chạy được vài giây một lần trên 100+ port
+mà không fork curl hay gọi ipinfo.io.
+"""
+
+import os
+import sys
+import ssl
+import json
+import time
+import base64
+import socket
+import struct
+import asyncio
+import argparse
+import queue
+import threading
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+DEFAULT_TIMEOUT_SECONDS = 5.0
+# Target của CONNECT: chỉ cần upstream mở được TCP, không gửi request nào
+DEFAULT_TARGET = os.environ.get('PROXY_PROBE_TARGET', 'www.cloudflare.com:443')
+IP_TARGET = ('ipinfo.io', 443)
+IP_RESPONSE_MAX_BYTES = 65536
+
+# Các lớp lỗi
+STATUS_OK = 'ok'
+LISTENER_DOWN = 'listener_down'          # Không có gì listen trên port local
+LISTENER_TIMEOUT = 'listener_timeout'    # Port local không trả lời greeting
+SOCKS_ERROR = 'socks_error'              # Listener không nói SOCKS5 / yêu cầu auth
+UPSTREAM_TIMEOUT = 'upstream_timeout'    # CONNECT không có reply trong timeout
+UPSTREAM_AUTH = 'upstream_auth'          # Upstream trả 407 (credentials hết hạn)
+UPSTREAM_DNS = 'upstream_dns'            # Không resolve được upstream hoặc target
+UPSTREAM_DOWN = 'upstream_down'          # Không kết nối được tới upstream
+UPSTREAM_ERROR = 'upstream_error'        # Upstream/gost trả lỗi khác
+TARGET_UNREACHABLE = 'target_unreachable'
+IP_FETCH_FAILED = 'ip_fetch_failed'
+
+FAILURE_CLASSES = (LISTENER_DOWN, LISTENER_TIMEOUT, SOCKS_ERROR, UPSTREAM_TIMEOUT, UPSTREAM_AUTH,
+                   UPSTREAM_DNS, UPSTREAM_DOWN, UPSTREAM_ERROR, TARGET_UNREACHABLE, IP_FETCH_FAILED)
+
+SOCKS5_REPLIES = {
+    0x01: (UPSTREAM_ERROR, 'general SOCKS server failure'),
+    0x02: (UPSTREAM_ERROR, 'connection not allowed by ruleset'),
+    0x03: (TARGET_UNREACHABLE, 'network unreachable'),
+    0x04: (TARGET_UNREACHABLE, 'host unreachable'),
+    0x05: (TARGET_UNREACHABLE, 'connection refused'),
+    0x06: (UPSTREAM_TIMEOUT, 'TTL expired'),
+    0x07: (SOCKS_ERROR, 'command not supported'),
+    0x08: (SOCKS_ERROR, 'address type not supported'),
+}
+
+
+class ProbeError(Exception):
+    def __init__(self, status: str, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_target(target: str) -> Tuple[str, int]:
+    host, _, port = target.rpartition(':')
+    return host.strip('[]'), int(port)
+
+
+def _ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 3)
+
+
+async def _read_exact(reader: asyncio.StreamReader, size: int, status: str, timeout: float) -> bytes:
+    try:
+        return await asyncio.wait_for(reader.readexactly(size), timeout)
+    except asyncio.TimeoutError:
+        raise ProbeError(status, 'timeout')
+    except asyncio.IncompleteReadError:
+        raise ProbeError(UPSTREAM_ERROR if status == UPSTREAM_TIMEOUT else SOCKS_ERROR, 'connection closed')
+
+
+async def _fetch_ip(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, host: str,
+                    timeout: float) -> str:
+    """TLS qua tunnel đã CONNECT rồi GET /ip (reader vẫn nhận dữ liệu đã giải mã qua protocol cũ)"""
+    loop = asyncio.get_running_loop()
+    transport = writer.transport
+    tls_transport = await asyncio.wait_for(
+        loop.start_tls(transport, transport.get_protocol(), ssl.create_default_context(), server_hostname=host),
+        timeout)
+    try:
+        tls_transport.write(f"GET /ip HTTP/1.1\r\nHost: {host}\r\nUser-Agent: mac-proxy-probe/1\r\n"
+                            f"Connection: close\r\n\r\n".encode())
+        response = await _read_response(reader, loop.time() + timeout)
+    finally:
+        tls_transport.abort()
+    head, _, body = response.partition(b'\r\n\r\n')
+    if not head.startswith((b'HTTP/1.1 200', b'HTTP/1.0 200')):
+        raise ProbeError(IP_FETCH_FAILED, head.split(b'\r\n', 1)[0].decode('latin-1') or 'empty response')
+    if b'transfer-encoding: chunked' in head.lower():
+        body = _dechunk(body)
+    ip = body.decode(errors='replace').strip()
+    if not ip:
+        raise ProbeError(IP_FETCH_FAILED, 'empty response body')
+    return ip
+
+
+def _content_length(head: bytes) -> Optional[int]:
+    for line in head.split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        if name.strip().lower() == b'content-length':
+            try:
+                return int(value.strip())
+            except ValueError:
+                return None
+    return None
+
+
+def _dechunk(body: bytes) -> bytes:
+    result = b''
+    while body:
+        size_line, _, rest = body.partition(b'\r\n')
+        try:
+            size = int(size_line.split(b';', 1)[0], 16)
+        except ValueError:
+            break
+        if size == 0:
+            break
+        result += rest[:size]
+        body = rest[size + 2:]
+    return result
+
+
+async def _read_response(reader: asyncio.StreamReader, deadline: float) -> bytes:
+    """
+    Đọc response tới EOF (request gửi Connection: close) hoặc đủ Content-Length, trong thời gian còn lại:
+    header và body có thể nằm ở các TLS record khác nhau
+    """
+    loop = asyncio.get_running_loop()
+    response = b''
+    while len(response) < IP_RESPONSE_MAX_BYTES:
+        head, separator, body = response.partition(b'\r\n\r\n')
+        if separator:
+            length = _content_length(head)
+            if length is not None and len(body) >= length:
+                break
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            raise asyncio.TimeoutError()
+        try:
+            chunk = await asyncio.wait_for(reader.read(IP_RESPONSE_MAX_BYTES), remaining)
+        except (ConnectionError, ssl.SSLError):
+            # Server đóng TLS không có close_notify: coi như EOF nếu đã có dữ liệu
+            if not response:
+                raise
+            break
+        if not chunk:
+            break
+        response += chunk
+    return response
+
+
+async def probe_socks5(port, host: str = '127.0.0.1', target: str = DEFAULT_TARGET,
+                       timeout: float = DEFAULT_TIMEOUT_SECONDS, fetch_ip: bool = False,
+                       username: Optional[str] = None, password: Optional[str] = None) -> Dict:
+    """
+    Probe một SOCKS5 listener. Kết quả:
+    {port, ok, status, error, handshake_ms (TCP + greeting), connect_ms (CONNECT reply), total_ms, ip}
+    """
+    result = {'port': str(port), 'ok': False, 'status': None, 'error': None,
+              'handshake_ms': None, 'connect_ms': None, 'total_ms': None, 'ip': None}
+    target_host, target_port = IP_TARGET if fetch_ip else parse_target(target)
+    start = time.perf_counter()
+    writer = None
+    try:
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(host, int(port)), timeout)
+        except asyncio.TimeoutError:
+            raise ProbeError(LISTENER_TIMEOUT, 'timeout connecting to listener')
+        except ConnectionRefusedError:
+            raise ProbeError(LISTENER_DOWN, f'port {port} is not listening')
+        except OSError as e:
+            raise ProbeError(LISTENER_DOWN, e.strerror or str(e))
+
+        # Greeting
+        writer.write(b'\x05\x02\x00\x02' if username else b'\x05\x01\x00')
+        version, method = await _read_exact(reader, 2, LISTENER_TIMEOUT, timeout)
+        if version != 5:
+            raise ProbeError(SOCKS_ERROR, f'not a SOCKS5 listener (version {version})')
+        if method == 0x02 and username:
+            user, pwd = username.encode(), (password or '').encode()
+            writer.write(b'\x01' + bytes([len(user)]) + user + bytes([len(pwd)]) + pwd)
+            if (await _read_exact(reader, 2, LISTENER_TIMEOUT, timeout))[1] != 0:
+                raise ProbeError(SOCKS_ERROR, 'SOCKS5 authentication failed')
+        elif method != 0x00:
+            raise ProbeError(SOCKS_ERROR, 'listener requires SOCKS5 authentication')
+        result['handshake_ms'] = _ms(start)
+
+        # CONNECT (target dạng domain để upstream tự resolve)
+        connect_start = time.perf_counter()
+        host_bytes = target_host.encode('idna')
+        writer.write(b'\x05\x01\x00\x03' + bytes([len(host_bytes)]) + host_bytes + struct.pack('!H', target_port))
+        remaining = max(0.1, timeout - (connect_start - start))
+        _, reply, _, atyp = await _read_exact(reader, 4, UPSTREAM_TIMEOUT, remaining)
+        if reply != 0:
+            status, message = SOCKS5_REPLIES.get(reply, (UPSTREAM_ERROR, f'SOCKS5 reply {reply}'))
+            raise ProbeError(status, message)
+        if atyp == 0x01:
+            await _read_exact(reader, 6, UPSTREAM_TIMEOUT, remaining)
+        elif atyp == 0x04:
+            await _read_exact(reader, 18, UPSTREAM_TIMEOUT, remaining)
+        else:
+            length = (await _read_exact(reader, 1, UPSTREAM_TIMEOUT, remaining))[0]
+            await _read_exact(reader, length + 2, UPSTREAM_TIMEOUT, remaining)
+        result['connect_ms'] = _ms(connect_start)
+
+        if fetch_ip:
+            try:
+                result['ip'] = await _fetch_ip(reader, writer, target_host,
+                                               max(0.5, timeout - (time.perf_counter() - start)))
+            except (asyncio.TimeoutError, OSError, ssl.SSLError) as e:
+                raise ProbeError(IP_FETCH_FAILED, str(e) or 'timeout')
+
+        result['ok'] = True
+        result['status'] = STATUS_OK
+    except ProbeError as e:
+        result['status'] = e.status
+        result['error'] = str(e)
+    finally:
+        result['total_ms'] = _ms(start)
+        if writer is not None:
+            writer.transport.abort()
+    return result
+
+
+async def diagnose_upstream(proxy_url: str, target: str = DEFAULT_TARGET,
+                            timeout: float = DEFAULT_TIMEOUT_SECONDS) -> Dict:
+    """
+    Kiểm tra trực tiếp upstream HTTP(S) proxy (bỏ qua gost): DNS, TCP, TLS, CONNECT + Basic auth.
+    Phân biệt 407 (credentials) với DNS/timeout mà SOCKS reply của gost không cho biết
+    """
+    parsed = urlparse(proxy_url)
+    result = {'ok': False, 'status': None, 'error': None, 'connect_ms': None, 'total_ms': None,
+              'upstream': f"{parsed.hostname}:{parsed.port}"}
+    start = time.perf_counter()
+    writer = None
+    try:
+        loop = asyncio.get_running_loop()
+        try:
+            await asyncio.wait_for(loop.getaddrinfo(parsed.hostname, parsed.port, type=socket.SOCK_STREAM), timeout)
+        except socket.gaierror as e:
+            raise ProbeError(UPSTREAM_DNS, f'cannot resolve {parsed.hostname}: {e}')
+        except asyncio.TimeoutError:
+            raise ProbeError(UPSTREAM_DNS, f'DNS timeout for {parsed.hostname}')
+
+        context = None
+        if parsed.scheme == 'https':
+            context = ssl.create_default_context()
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(parsed.hostname, parsed.port, ssl=context,
+                                        server_hostname=parsed.hostname if context else None), timeout)
+        except asyncio.TimeoutError:
+            raise ProbeError(UPSTREAM_TIMEOUT, 'timeout connecting to upstream')
+        except (OSError, ssl.SSLError) as e:
+            raise ProbeError(UPSTREAM_DOWN, str(e))
+        result['connect_ms'] = _ms(start)
+
+        target_host, target_port = parse_target(target)
+        request = f"CONNECT {target_host}:{target_port} HTTP/1.1\r\nHost: {target_host}:{target_port}\r\n"
+        if parsed.username:
+            token = base64.b64encode(f"{unquote(parsed.username)}:{unquote(parsed.password or '')}".encode()).decode()
+            request += f"Proxy-Authorization: Basic {token}\r\n"
+        writer.write((request + "\r\n").encode())
+        try:
+            status_line = await asyncio.wait_for(reader.readline(), max(0.1, timeout - (time.perf_counter() - start)))
+        except asyncio.TimeoutError:
+            raise ProbeError(UPSTREAM_TIMEOUT, 'timeout waiting for CONNECT reply')
+        parts = status_line.decode('latin-1').split(' ', 2)
+        if len(parts) < 2:
+            raise ProbeError(UPSTREAM_ERROR, 'invalid CONNECT response')
+        if parts[1] == '407':
+            raise ProbeError(UPSTREAM_AUTH, status_line.decode('latin-1').strip())
+        if parts[1] != '200':
+            raise ProbeError(UPSTREAM_ERROR, status_line.decode('latin-1').strip())
+        result['ok'] = True
+        result['status'] = STATUS_OK
+    except ProbeError as e:
+        result['status'] = e.status
+        result['error'] = str(e)
+    finally:
+        result['total_ms'] = _ms(start)
+        if writer is not None:
+            writer.transport.abort()
+    return result
+
+
+async def probe_port(port, config: Optional[Dict] = None, target: str = DEFAULT_TARGET,
+                     timeout: float = DEFAULT_TIMEOUT_SECONDS, fetch_ip: bool = False) -> Dict:
+    """
+    Probe gost port; nếu lỗi nằm sau listener và có config (proxy_url) thì kiểm tra thẳng upstream
+    để phân loại chính xác (407, DNS, timeout)
+    """
+    result = await probe_socks5(port, target=target, timeout=timeout, fetch_ip=fetch_ip)
+    proxy_url = (config or {}).get('proxy_url')
+    if not result['ok'] and result['status'] not in (LISTENER_DOWN, LISTENER_TIMEOUT, SOCKS_ERROR) \
+            and proxy_url and proxy_url.startswith(('http://', 'https://')):
+        upstream = await diagnose_upstream(proxy_url, target=target, timeout=timeout)
+        result['upstream'] = upstream
+        if not upstream['ok']:
+            result['status'] = upstream['status']
+            result['error'] = f"{result['error']} (upstream: {upstream['error']})"
+    return result
+
+
+async def probe_ports(ports: List, configs: Optional[Dict[str, Dict]] = None, concurrency: int = 128,
+                      on_result=None, **kwargs) -> List[Dict]:
+    """Probe nhiều port đồng thời (tối đa concurrency); on_result được gọi ngay khi từng port xong"""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    configs = configs or {}
+
+    async def run(port):
+        async with semaphore:
+            result = await probe_port(port, configs.get(str(port)), **kwargs)
+        if on_result is not None:
+            on_result(result)
+        return result
+
+    return await asyncio.gather(*[run(port) for port in ports])
+
+
+def iter_probe_results(ports: List, configs: Optional[Dict[str, Dict]] = None, **kwargs):
+    """
+    Generator đồng bộ: chạy probe_ports trong thread riêng (event loop riêng) và yield
+    từng kết quả theo thứ tự hoàn thành - dùng để stream từ Flask
+    """
+    results: queue.Queue = queue.Queue()
+    done = object()
+
+    def worker():
+        try:
+            asyncio.run(probe_ports(ports, configs, on_result=results.put, **kwargs))
+        finally:
+            results.put(done)
+
+    threading.Thread(target=worker, name='proxy-probe', daemon=True).start()
+    while True:
+        result = results.get()
+        if result is done:
+            return
+        yield result
+
+
+def summarize_results(results: List[Dict]) -> Dict:
+    ok = [r for r in results if r['ok']]
+    connect = sorted(r['connect_ms'] for r in ok)
+    failures: Dict[str, int] = {}
+    for r in results:
+        if not r['ok']:
+            failures[r['status']] = failures.get(r['status'], 0) + 1
+    return {
+        'total': len(results),
+        'ok': len(ok),
+        'failures_by_status': failures,
+        'connect_ms_p50': connect[len(connect) // 2] if connect else None,
+        'connect_ms_max': connect[-1] if connect else None,
+    }
+
+
+def probe(port, **kwargs) -> Dict:
+    """Bản đồng bộ của probe_port (dùng trong Flask handler / script)"""
+    return asyncio.run(probe_port(port, **kwargs))
+
+
+def probe_proxy_url(proxy_url: str, **kwargs) -> Dict:
+    """Probe theo URL: socks5://host:port -> SOCKS5 probe; http(s)://... -> kiểm tra upstream trực tiếp"""
+    parsed = urlparse(proxy_url)
+    if parsed.scheme.startswith('socks5'):
+        return asyncio.run(probe_socks5(parsed.port, host=parsed.hostname or '127.0.0.1',
+                                        username=unquote(parsed.username) if parsed.username else None,
+                                        password=unquote(parsed.password) if parsed.password else None,
+                                        **kwargs))
+    kwargs.pop('fetch_ip', None)
+    return asyncio.run(diagnose_upstream(proxy_url, **kwargs))
+
+
+def _load_configs(ports: List[str]) -> Dict[str, Dict]:
+    try:
+        from config_repository import get_config_repository
+        repo = get_config_repository(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config'))
+        return {port: config for port, config in repo.load_all().items() if port in ports}
+    except Exception:
+        return {}
+
+
+def format_result(result: Dict) -> str:
+    if result['ok']:
+        line = f"✅ {result['port']}: ok (handshake {result['handshake_ms']:.1f}ms, connect {result['connect_ms']:.1f}ms)"
+        if result.get('ip'):
+            line += f" ip {result['ip']}"
+        return line
+    return f"❌ {result['port']}: {result['status']} - {result['error']}"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """CLI cho shell scripts: exit 0 nếu mọi port ok"""
+    parser = argparse.ArgumentParser(description='SOCKS5 health probe cho gost ports')
+    parser.add_argument('ports', nargs='+', help='Các port gost (vd 7890 7891)')
+    parser.add_argument('--target', default=DEFAULT_TARGET, help=f'host:port cho CONNECT (mặc định {DEFAULT_TARGET})')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT_SECONDS)
+    parser.add_argument('--ip', action='store_true', help='Lấy egress IP (TLS tới ipinfo.io)')
+    parser.add_argument('--no-diagnose', action='store_true', help='Không kiểm tra upstream khi lỗi')
+    parser.add_argument('--json', action='store_true', help='In kết quả JSON (mỗi port một dòng)')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Không in gì, chỉ exit code')
+    args = parser.parse_args(argv)
+
+    configs = {} if args.no_diagnose else _load_configs(args.ports)
+    results = asyncio.run(probe_ports(args.ports, configs, target=args.target, timeout=args.timeout,
+                                      fetch_ip=args.ip))
+    if not args.quiet:
+        for result in results:
+            print(json.dumps(result) if args.json else format_result(result))
+    return 0 if all(r['ok'] for r in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
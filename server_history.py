@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+"""
+Server History
+Lịch sử chất lượng đo được (latency, throughput, lỗi) của từng upstream `domain:proxy_port`
+từ benchmark và health probe, lưu trong SQLite (WAL). Tính quality score có decay theo thời gian
+để xếp hạng server khi apply, thay vì chỉ dựa vào load do provider báo.
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional
+
+DEFAULT_DB_NAME = 'server_history.db'
+BUSY_TIMEOUT_SECONDS = 5.0
+
+# Sample cũ hơn HALF_LIFE mất một nửa trọng số
+SCORE_HALF_LIFE_SECONDS = 6 * 3600
+SCORE_WINDOW_SECONDS = 7 * 24 * 3600
+RETENTION_SECONDS = 30 * 24 * 3600
+# Latency/throughput tham chiếu: tại giá trị này thành phần tương ứng = 0.5
+LATENCY_REF_MS = 500.0
+THROUGHPUT_REF_MBPS = 20.0
+# Kết quả entry probe (entry_probe.py) còn hiệu lực trong khoảng này khi lọc server chết
+ENTRY_PROBE_MAX_AGE_SECONDS = 3600
+# Server chưa đo có điểm PRIOR_SCORE; PRIOR_WEIGHT là số sample "ảo" kéo điểm về prior
+PRIOR_SCORE = 0.5
+PRIOR_WEIGHT = 2.0
+# Sample của các source tần suất cao (health probe ~10s/port) được gộp thành một dòng
+# cho mỗi upstream mỗi khoảng này thay vì một dòng mỗi lần probe
+DOWNSAMPLE_SECONDS = {'probe': 60}
+# get_stats gộp sample trong SQL theo khoảng tuổi này; decay áp dụng theo tuổi trung bình của mỗi khoảng
+STATS_BUCKET_SECONDS = 900
+
+MIGRATIONS = [
+    """
+    CREATE TABLE IF NOT EXISTS samples (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        upstream TEXT NOT NULL,
+        ts REAL NOT NULL,
+        source TEXT NOT NULL,
+        ok INTEGER NOT NULL,
+        latency_ms REAL,
+        throughput_mbps REAL,
+        error TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_samples_upstream_ts ON samples(upstream, ts);
+    CREATE INDEX IF NOT EXISTS idx_samples_ts ON samples(ts);
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS entry_probes (
+        upstream TEXT PRIMARY KEY,
+        host TEXT NOT NULL,
+        port INTEGER NOT NULL,
+        ok INTEGER NOT NULL,
+        connect_ms REAL,
+        tls_ms REAL,
+        stage TEXT,
+        error TEXT,
+        probed_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_entry_probes_probed_at ON entry_probes(probed_at);
+    """,
+    # Dòng gộp: count sample, ok = số sample thành công, latency/throughput = trung bình của sample thành công.
+    # Dòng cũ (count = 1, ok 0/1) vẫn đúng nghĩa. bucket chỉ đặt cho source được downsample
+    """
+    ALTER TABLE samples ADD COLUMN count INTEGER NOT NULL DEFAULT 1;
+    ALTER TABLE samples ADD COLUMN bucket INTEGER;
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_samples_bucket ON samples(upstream, source, bucket);
+    """,
+]
+
+
+def default_db_path(base_dir: Optional[str] = None) -> str:
+    base_dir = base_dir or os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base_dir, 'logs', DEFAULT_DB_NAME)
+
+
+def upstream_key(host: str, proxy_port) -> str:
+    """Khóa upstream dạng domain:proxy_port (giống list-proxy API)"""
+    return f"{(host or '').lower()}:{proxy_port}"
+
+
+def config_upstream_key(config: Optional[Dict]) -> Optional[str]:
+    """Khóa upstream từ gost config (proxy_host/proxy_port)"""
+    if not config or not config.get('proxy_host') or not config.get('proxy_port'):
+        return None
+    return upstream_key(config['proxy_host'], config['proxy_port'])
+
+
+def quality(success_rate: float, latency_ms: Optional[float], throughput_mbps: Optional[float]) -> float:
+    """Điểm 0..1 từ tỉ lệ thành công, latency và throughput (thành phần nào thiếu thì bỏ qua)"""
+    components = []
+    if latency_ms is not None:
+        components.append(LATENCY_REF_MS / (LATENCY_REF_MS + max(latency_ms, 0.0)))
+    if throughput_mbps is not None:
+        components.append(throughput_mbps / (throughput_mbps + THROUGHPUT_REF_MBPS))
+    performance = sum(components) / len(components) if components else 1.0
+    return success_rate * performance
+
+
+class ServerHistory:
+    """
+    Time-series chất lượng theo upstream. Mỗi thread có connection riêng.
+    source: 'benchmark' | 'probe'
+    """
+
+    def __init__(self, db_path: Optional[str] = None, half_life: float = SCORE_HALF_LIFE_SECONDS):
+        self.db_path = os.path.abspath(db_path or default_db_path())
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self.half_life = half_life
+        self._local = threading.local()
+        self._migrate()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.depth = 0
+        return conn
+
+    def _migrate(self):
+        conn = self._connect()
+        if conn.execute('PRAGMA user_version').fetchone()[0] >= len(MIGRATIONS):
+            return
+        with self.batch():
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            for index in range(version, len(MIGRATIONS)):
+                for statement in MIGRATIONS[index].split(';'):
+                    if statement.strip():
+                        conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {len(MIGRATIONS)}')
+
+    @contextmanager
+    def batch(self):
+        """Transaction (BEGIN IMMEDIATE). Có thể lồng nhau, chỉ commit ở mức ngoài cùng"""
+        conn = self._connect()
+        if self._local.depth == 0:
+            conn.execute('BEGIN IMMEDIATE')
+        self._local.depth += 1
+        try:
+            yield conn
+        except BaseException:
+            self._local.depth -= 1
+            if self._local.depth == 0:
+                conn.execute('ROLLBACK')
+            raise
+        self._local.depth -= 1
+        if self._local.depth == 0:
+            conn.execute('COMMIT')
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # ----- Ghi -----
+
+    def record(self, upstream: str, ok: bool, latency_ms: Optional[float] = None,
+               throughput_mbps: Optional[float] = None, source: str = 'probe',
+               error: Optional[str] = None, ts: Optional[float] = None):
+        self.record_many([{'upstream': upstream, 'ok': ok, 'latency_ms': latency_ms,
+                           'throughput_mbps': throughput_mbps, 'source': source, 'error': error, 'ts': ts}])
+
+    def record_many(self, samples: Iterable[Dict]):
+        """
+        Ghi nhiều sample trong một transaction. Source trong DOWNSAMPLE_SECONDS được cộng dồn vào dòng
+        của bucket hiện tại (upsert), nên số dòng không tăng theo tần suất probe
+        """
+        now = time.time()
+        rows = []
+        for s in samples:
+            if not s.get('upstream'):
+                continue
+            ts = s.get('ts') or now
+            source = s.get('source') or 'probe'
+            interval = DOWNSAMPLE_SECONDS.get(source)
+            rows.append((s['upstream'], ts, source, 1 if s.get('ok') else 0, s.get('latency_ms'),
+                         s.get('throughput_mbps'), s.get('error'), int(ts // interval) if interval else None))
+        if not rows:
+            return
+        # Trong SET, cột không prefix là giá trị cũ của dòng: trung bình có trọng số theo số sample thành công
+        with self.batch() as conn:
+            conn.executemany(
+                'INSERT INTO samples (upstream, ts, source, ok, latency_ms, throughput_mbps, error, bucket) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT(upstream, source, bucket) DO UPDATE SET '
+                'ts = MAX(ts, excluded.ts), count = count + 1, ok = ok + excluded.ok, '
+                'latency_ms = CASE WHEN excluded.ok = 0 OR excluded.latency_ms IS NULL THEN latency_ms '
+                'WHEN ok = 0 OR latency_ms IS NULL THEN excluded.latency_ms '
+                'ELSE (latency_ms * ok + excluded.latency_ms) / (ok + 1) END, '
+                'throughput_mbps = CASE WHEN excluded.ok = 0 OR excluded.throughput_mbps IS NULL THEN throughput_mbps '
+                'WHEN ok = 0 OR throughput_mbps IS NULL THEN excluded.throughput_mbps '
+                'ELSE (throughput_mbps * ok + excluded.throughput_mbps) / (ok + 1) END, '
+                'error = COALESCE(excluded.error, error)', rows
+            )
+
+    def record_benchmark(self, upstream: str, suite: Dict, ts: Optional[float] = None):
+        """Ghi kết quả run_suite (benchmark package) của một upstream"""
+        self.record_many(benchmark_samples(upstream, suite, ts))
+
+    def record_fleet_record(self, record: Dict):
+        """Callback cho benchmark.run_fleet(on_result=...)"""
+        upstream = upstream_key(record.get('host'), record.get('proxy_port'))
+        samples = []
+        for suite in (record.get('results') or {}).values():
+            samples.extend(benchmark_samples(upstream, suite))
+        if not samples and record.get('error'):
+            samples.append({'upstream': upstream, 'ok': False, 'source': 'benchmark', 'error': record['error']})
+        self.record_many(samples)
+
+    def record_entry_probes(self, results: Iterable[Dict]):
+        """Lưu kết quả entry probe (mỗi upstream giữ kết quả mới nhất)"""
+        now = time.time()
+        rows = [
+            (r['upstream'], r['host'], int(r['port']), 1 if r.get('ok') else 0, r.get('connect_ms'),
+             r.get('tls_ms'), r.get('stage'), r.get('error'), r.get('probed_at') or now)
+            for r in results if r.get('upstream')
+        ]
+        if not rows:
+            return
+        with self.batch() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO entry_probes (upstream, host, port, ok, connect_ms, tls_ms, stage, error, '
+                'probed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows
+            )
+
+    def get_entry_probes(self, upstreams: Optional[Iterable[str]] = None,
+                         max_age: Optional[float] = ENTRY_PROBE_MAX_AGE_SECONDS) -> Dict[str, Dict]:
+        """Kết quả entry probe còn hiệu lực: {upstream: {ok, connect_ms, tls_ms, ...}}"""
+        conn = self._connect()
+        query = 'SELECT * FROM entry_probes WHERE probed_at >= ?'
+        params: List = [time.time() - max_age if max_age else 0]
+        if upstreams is not None:
+            keys = list(dict.fromkeys(upstreams))
+            if not keys:
+                return {}
+            query += f" AND upstream IN ({', '.join('?' * len(keys))})"
+            params.extend(keys)
+        return {row['upstream']: dict(row) for row in conn.execute(query, params).fetchall()}
+
+    def prune(self, max_age: float = RETENTION_SECONDS) -> int:
+        with self.batch() as conn:
+            return conn.execute('DELETE FROM samples WHERE ts < ?', (time.time() - max_age,)).rowcount
+
+    # ----- Đọc -----
+
+    def get_stats(self, upstreams: Optional[Iterable[str]] = None, now: Optional[float] = None) -> Dict[str, Dict]:
+        """
+        Thống kê có decay theo upstream: {upstream: {samples, weight, success_rate, latency_ms,
+        throughput_mbps, last_seen, last_error, score}}. Một SELECT cho tất cả upstream
+        """
+        now = now or time.time()
+        conn = self._connect()
+        where = 'ts >= ?'
+        params: List = [now - SCORE_WINDOW_SECONDS]
+        if upstreams is not None:
+            keys = list(dict.fromkeys(upstreams))
+            if not keys:
+                return {}
+            where += f" AND upstream IN ({', '.join('?' * len(keys))})"
+            params.extend(keys)
+        # Gộp trong SQL theo (upstream, khoảng tuổi): Python chỉ xử lý tối đa
+        # SCORE_WINDOW / STATS_BUCKET dòng mỗi upstream thay vì từng sample
+        rows = conn.execute(
+            'SELECT upstream, SUM(count) AS n, SUM(ok) AS ok_n, SUM(count * ts) / SUM(count) AS mean_ts, '
+            'MAX(ts) AS last_seen, '
+            'SUM(CASE WHEN latency_ms IS NOT NULL THEN ok * latency_ms END) AS latency_sum, '
+            'SUM(CASE WHEN latency_ms IS NOT NULL THEN ok END) AS latency_n, '
+            'SUM(CASE WHEN throughput_mbps IS NOT NULL THEN ok * throughput_mbps END) AS throughput_sum, '
+            'SUM(CASE WHEN throughput_mbps IS NOT NULL THEN ok END) AS throughput_n '
+            f'FROM samples WHERE {where} GROUP BY upstream, CAST((? - ts) / ? AS INTEGER)',
+            params + [now, STATS_BUCKET_SECONDS]
+        ).fetchall()
+        # SQLite: cột trần đi cùng MAX() lấy từ đúng dòng có ts lớn nhất -> lỗi gần nhất
+        errors = {row['upstream']: row['error'] for row in conn.execute(
+            f'SELECT upstream, error, MAX(ts) FROM samples WHERE {where} AND ok < count GROUP BY upstream', params
+        ).fetchall()}
+
+        decay = math.log(2) / self.half_life
+        acc: Dict[str, Dict] = {}
+        for row in rows:
+            weight = math.exp(-decay * max(0.0, now - row['mean_ts']))
+            a = acc.setdefault(row['upstream'], {
+                'samples': 0, 'weight': 0.0, 'ok_weight': 0.0,
+                'latency_sum': 0.0, 'latency_weight': 0.0,
+                'throughput_sum': 0.0, 'throughput_weight': 0.0,
+                'last_seen': 0.0, 'last_error': errors.get(row['upstream'])
+            })
+            a['samples'] += row['n']
+            a['weight'] += weight * row['n']
+            a['ok_weight'] += weight * row['ok_n']
+            a['last_seen'] = max(a['last_seen'], row['last_seen'])
+            if row['latency_n']:
+                a['latency_sum'] += weight * row['latency_sum']
+                a['latency_weight'] += weight * row['latency_n']
+            if row['throughput_n']:
+                a['throughput_sum'] += weight * row['throughput_sum']
+                a['throughput_weight'] += weight * row['throughput_n']
+
+        stats = {}
+        for upstream, a in acc.items():
+            success_rate = a['ok_weight'] / a['weight'] if a['weight'] else 0.0
+            latency = a['latency_sum'] / a['latency_weight'] if a['latency_weight'] else None
+            throughput = a['throughput_sum'] / a['throughput_weight'] if a['throughput_weight'] else None
+            measured = quality(success_rate, latency, throughput)
+            stats[upstream] = {
+                'samples': a['samples'],
+                'weight': a['weight'],
+                'success_rate': success_rate,
+                'latency_ms': latency,
+                'throughput_mbps': throughput,
+                'last_seen': a['last_seen'],
+                'last_error': a['last_error'],
+                # Ít sample (hoặc sample cũ) -> điểm gần PRIOR_SCORE
+                'score': (a['weight'] * measured + PRIOR_WEIGHT * PRIOR_SCORE) / (a['weight'] + PRIOR_WEIGHT)
+            }
+        return stats
+
+    def scores(self, upstreams: Iterable[str]) -> Dict[str, float]:
+        """Score của từng upstream (PRIOR_SCORE nếu chưa có dữ liệu)"""
+        keys = list(upstreams)
+        stats = self.get_stats(keys)
+        return {key: stats[key]['score'] if key in stats else PRIOR_SCORE for key in keys}
+
+    def rank(self, servers: List[Dict], key_fn: Callable[[Dict], str],
+             tiebreak: Optional[Callable[[Dict], tuple]] = None,
+             max_entry_rtt_ms: Optional[float] = None) -> List[Dict]:
+        """
+        Sắp xếp server theo score giảm dần; cùng score thì theo tiebreak (vd load của provider).
+        Server chưa đo đứng giữa server tốt và server đã đo thấy kém.
+        Server có entry probe gần đây thất bại (hoặc RTT > max_entry_rtt_ms) bị bỏ,
+        trừ khi như vậy sẽ không còn server nào
+        """
+        if not servers:
+            return []
+        entries = self.get_entry_probes(key_fn(s) for s in servers)
+        if entries:
+            def reachable(server):
+                entry = entries.get(key_fn(server))
+                if entry is None:
+                    return True
+                if not entry['ok']:
+                    return False
+                return max_entry_rtt_ms is None or (entry['connect_ms'] or 0) <= max_entry_rtt_ms
+            servers = [s for s in servers if reachable(s)] or servers
+        scores = self.scores(key_fn(s) for s in servers)
+        tiebreak = tiebreak or (lambda s: (s.get('load', 100),))
+        return sorted(servers, key=lambda s: (-round(scores[key_fn(s)], 3),) + tuple(tiebreak(s)))
+
+
+def benchmark_samples(upstream: str, suite: Dict, ts: Optional[float] = None) -> List[Dict]:
+    """Chuyển kết quả run_suite thành các sample (latency từ ping, throughput từ download)"""
+    if not suite or not upstream:
+        return []
+    connection = suite.get('connection')
+    if not connection:
+        error = suite.get('error')
+        return [{'upstream': upstream, 'ok': False, 'source': 'benchmark', 'error': error, 'ts': ts}] if error else []
+    if not connection.get('ok'):
+        return [{'upstream': upstream, 'ok': False, 'source': 'benchmark', 'error': connection.get('error'), 'ts': ts}]
+
+    samples = []
+    for sample in ((suite.get('ping') or {}).get('samples')) or []:
+        samples.append({'upstream': upstream, 'ok': sample.get('ok'), 'latency_ms': sample.get('total_ms'),
+                        'source': 'benchmark', 'error': sample.get('error'), 'ts': ts})
+    for download in (suite.get('downloads') or {}).values():
+        samples.append({'upstream': upstream, 'ok': download.get('success'),
+                        'throughput_mbps': download.get('speed_mbps'),
+                        'source': 'benchmark', 'error': download.get('error'), 'ts': ts})
+    return samples
+
+
+_histories: Dict[str, ServerHistory] = {}
+_histories_lock = threading.Lock()
+
+
+def get_server_history(db_path: Optional[str] = None) -> ServerHistory:
+    """ServerHistory dùng chung trong process cho mỗi file db"""
+    db_path = os.path.abspath(db_path or default_db_path())
+    with _histories_lock:
+        history = _histories.get(db_path)
+        if history is None:
+            history = ServerHistory(db_path)
+            _histories[db_path] = history
+        return history
+
+
+def main(argv: List[str]) -> int:
+    usage = (
+        "Usage: server_history.py [--db PATH] <command> [args]\n"
+        "Commands:\n"
+        "  stats [upstream...]          - In thống kê + score (JSON)\n"
+        "  top [n]                      - In n upstream có score cao nhất\n"
+        "  import-fleet <file.jsonl>    - Import kết quả 'python3 -m benchmark fleet'\n"
+        "  prune [days]                 - Xóa sample cũ hơn days ngày (mặc định 30)"
+    )
+    db_path = None
+    if len(argv) >= 2 and argv[0] == '--db':
+        db_path, argv = argv[1], argv[2:]
+    if not argv:
+        print(usage)
+        return 1
+
+    history = ServerHistory(db_path)
+    command, args = argv[0], argv[1:]
+    if command == 'stats':
+        print(json.dumps(history.get_stats(args or None), indent=2))
+    elif command == 'top':
+        limit = int(args[0]) if args else 20
+        stats = sorted(history.get_stats().items(), key=lambda item: -item[1]['score'])[:limit]
+        for upstream, s in stats:
+            latency = f"{s['latency_ms']:.0f}ms" if s['latency_ms'] is not None else '-'
+            throughput = f"{s['throughput_mbps']:.1f}Mbps" if s['throughput_mbps'] is not None else '-'
+            print(f"{s['score']:.3f}  {upstream:<40} ok {s['success_rate'] * 100:5.1f}%  {latency:>7}  "
+                  f"{throughput:>10}  ({s['samples']} samples)")
+    elif command == 'import-fleet' and len(args) == 1:
+        count = 0
+        with open(args[0], 'r') as f:
+            for line in f:
+                if line.strip():
+                    history.record_fleet_record(json.loads(line))
+                    count += 1
+        print(f"✅ Imported {count} fleet records")
+    elif command == 'prune':
+        days = float(args[0]) if args else RETENTION_SECONDS / 86400
+        print(f"🧹 Removed {history.prune(days * 86400)} samples")
+    else:
+        print(usage)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -127,7 +127,7 @@ echo "   • URL: http://127.0.0.1:5000"
 echo "   • Quản lý toàn bộ hệ thống qua giao diện web"
 echo ""
 echo "🔄 Auto Credential Updater:"
-echo "   • Tự động cập nhật credentials mỗi 30 giây"
+echo "   • Tự động cập nhật credentials ngay khi config/log thay đổi (inotify, fallback polling)"
 echo "   • Tự động dọn dẹp services không sử dụng mỗi 5 phút"
 echo "   • Log: logs/auto_updater.log"
 echo ""
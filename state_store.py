@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+State Store
+Lưu runtime state của gost (config, PID, failure counter, restart time) trong một file SQLite (WAL)
+thay cho hàng trăm file nhỏ logs/gost_<port>.pid, _failures.txt, _restart_time.txt
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+
+import fast_json
+
+DEFAULT_DB_NAME = 'gost_state.db'
+BUSY_TIMEOUT_SECONDS = 5.0
+
+# Mỗi phần tử là một bước migration, user_version = số bước đã chạy
+MIGRATIONS = [
+    """
+    CREATE TABLE IF NOT EXISTS port_state (
+        port INTEGER PRIMARY KEY,
+        pid INTEGER,
+        failures INTEGER NOT NULL DEFAULT 0,
+        last_restart REAL NOT NULL DEFAULT 0,
+        restart_count INTEGER NOT NULL DEFAULT 0,
+        config TEXT,
+        updated_at REAL NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_port_state_updated_at ON port_state(updated_at);
+    """,
+]
+
+STATE_COLUMNS = ('port', 'pid', 'failures', 'last_restart', 'restart_count', 'config', 'updated_at')
+
+
+def default_db_path(base_dir: Optional[str] = None) -> str:
+    base_dir = base_dir or os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base_dir, 'logs', DEFAULT_DB_NAME)
+
+
+class StateStore:
+    """
+    API truy cập state theo port. Mỗi thread có connection riêng.
+    Dùng `with store.batch():` để gộp nhiều thay đổi vào một transaction.
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = os.path.abspath(db_path or default_db_path())
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._local = threading.local()
+        self._migrate()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.depth = 0
+        return conn
+
+    def _migrate(self):
+        conn = self._connect()
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version >= len(MIGRATIONS):
+            return
+        with self.batch():
+            # Đọc lại trong transaction để tránh hai process cùng migrate
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            for index in range(version, len(MIGRATIONS)):
+                for statement in MIGRATIONS[index].split(';'):
+                    if statement.strip():
+                        conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {len(MIGRATIONS)}')
+
+    @contextmanager
+    def batch(self):
+        """Transaction (BEGIN IMMEDIATE). Có thể lồng nhau, chỉ commit ở mức ngoài cùng"""
+        conn = self._connect()
+        if self._local.depth == 0:
+            conn.execute('BEGIN IMMEDIATE')
+        self._local.depth += 1
+        try:
+            yield conn
+        except BaseException:
+            self._local.depth -= 1
+            if self._local.depth == 0:
+                conn.execute('ROLLBACK')
+            raise
+        self._local.depth -= 1
+        if self._local.depth == 0:
+            conn.execute('COMMIT')
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _ensure_port(self, conn: sqlite3.Connection, port):
+        conn.execute('INSERT OR IGNORE INTO port_state (port, updated_at) VALUES (?, ?)', (int(port), time.time()))
+
+    def _update(self, port, assignments: str, params: tuple):
+        with self.batch() as conn:
+            self._ensure_port(conn, port)
+            conn.execute(f'UPDATE port_state SET {assignments}, updated_at = ? WHERE port = ?',
+                         params + (time.time(), int(port)))
+
+    # ----- Đọc -----
+
+    @staticmethod
+    def _row_to_dict(row: sqlite3.Row) -> Dict:
+        state = dict(row)
+        state['port'] = str(state['port'])
+        config = state.pop('config')
+        state['config'] = fast_json.loads(config) if config else None
+        return state
+
+    def get_port_states(self, ports: Optional[Iterable] = None) -> Dict[str, Dict]:
+        """State của các port (hoặc tất cả) bằng một SELECT: {port: state}"""
+        conn = self._connect()
+        columns = ', '.join(STATE_COLUMNS)
+        if ports is None:
+            rows = conn.execute(f'SELECT {columns} FROM port_state ORDER BY port').fetchall()
+        else:
+            port_list = [int(p) for p in ports]
+            if not port_list:
+                return {}
+            placeholders = ', '.join('?' * len(port_list))
+            rows = conn.execute(
+                f'SELECT {columns} FROM port_state WHERE port IN ({placeholders}) ORDER BY port',
+                port_list
+            ).fetchall()
+        return {str(row['port']): self._row_to_dict(row) for row in rows}
+
+    def get_port_state(self, port) -> Optional[Dict]:
+        return self.get_port_states([port]).get(str(port))
+
+    def get_pid(self, port) -> Optional[int]:
+        state = self.get_port_state(port)
+        return state['pid'] if state else None
+
+    # ----- Ghi -----
+
+    def set_pid(self, port, pid: Optional[int]):
+        self._update(port, 'pid = ?', (int(pid) if pid else None,))
+
+    def clear_pid(self, port):
+        self.set_pid(port, None)
+
+    def set_failures(self, port, failures: int):
+        self._update(port, 'failures = ?', (int(failures),))
+
+    def record_failure(self, port) -> int:
+        """Tăng failure counter, trả về giá trị mới"""
+        with self.batch() as conn:
+            self._update(port, 'failures = failures + 1', ())
+            return conn.execute('SELECT failures FROM port_state WHERE port = ?', (int(port),)).fetchone()[0]
+
+    def record_restart(self, port, timestamp: Optional[float] = None):
+        """Ghi nhận restart: lưu thời điểm, tăng restart_count, reset failures"""
+        self._update(port, 'last_restart = ?, restart_count = restart_count + 1, failures = 0',
+                     (timestamp or time.time(),))
+
+    def set_config(self, port, config: Optional[dict]):
+        self._update(port, 'config = ?', (fast_json.dumps_str(config) if config is not None else None,))
+
+    def update_monitor_states(self, states: Iterable[Dict]):
+        """Cập nhật failures/last_restart của nhiều port trong một transaction"""
+        with self.batch():
+            for state in states:
+                port = state['port']
+                if 'failures' in state:
+                    self.set_failures(port, state['failures'])
+                if state.get('restarted'):
+                    self.record_restart(port, state.get('last_restart'))
+
+    def delete_port(self, port):
+        with self.batch() as conn:
+            conn.execute('DELETE FROM port_state WHERE port = ?', (int(port),))
+
+    def import_legacy_files(self, log_dir: str, config_dir: Optional[str] = None) -> int:
+        """Import state từ các file cũ (.pid, _failures.txt, _restart_time.txt, .config) nếu có"""
+        def read_number(path, cast):
+            try:
+                with open(path, 'r') as f:
+                    return cast(f.read().strip() or 0)
+            except (OSError, ValueError):
+                return None
+
+        imported = 0
+        ports = set()
+        for directory in filter(None, [log_dir, config_dir]):
+            try:
+                names = os.listdir(directory)
+            except OSError:
+                continue
+            for name in names:
+                if name.startswith('gost_') and (name.endswith('.pid') or name.endswith('.config')):
+                    port = name[5:].rsplit('.', 1)[0]
+                    if port.isdigit():
+                        ports.add(port)
+
+        with self.batch():
+            for port in sorted(ports):
+                pid = read_number(os.path.join(log_dir, f'gost_{port}.pid'), int)
+                failures = read_number(os.path.join(log_dir, f'gost_{port}_failures.txt'), int)
+                last_restart = read_number(os.path.join(log_dir, f'gost_{port}_restart_time.txt'), float)
+                if pid:
+                    self.set_pid(port, pid)
+                if failures is not None:
+                    self.set_failures(port, failures)
+                if last_restart:
+                    self._update(port, 'last_restart = ?', (last_restart,))
+                if config_dir:
+                    try:
+                        self.set_config(port, fast_json.load_file(os.path.join(config_dir, f'gost_{port}.config')))
+                    except (OSError, ValueError):
+                        pass
+                imported += 1
+        return imported
+
+
+_stores: Dict[str, StateStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_state_store(db_path: Optional[str] = None) -> StateStore:
+    """StateStore dùng chung trong process cho mỗi file db"""
+    db_path = os.path.abspath(db_path or default_db_path())
+    with _stores_lock:
+        store = _stores.get(db_path)
+        if store is None:
+            store = StateStore(db_path)
+            _stores[db_path] = store
+        return store
+
+
+def main(argv: List[str]) -> int:
+    """CLI cho các script shell (manage_gost.sh, gost_monitor.sh)"""
+    usage = (
+        "Usage: state_store.py [--db PATH] <command> [args]\n"
+        "Commands:\n"
+        "  set-pid <port> <pid>         - Lưu PID của gost\n"
+        "  clear-pid <port>             - Xóa PID\n"
+        "  get-pid <port>               - In PID (rỗng nếu không có)\n"
+        "  delete <port>                - Xóa state của port\n"
+        "  monitor-state <ports...>     - In 'port failures last_restart' cho các port\n"
+        "  monitor-apply                - Đọc 'port failures [restart_ts]' từ stdin, ghi trong một transaction\n"
+        "  import-legacy <log_dir> [config_dir] - Import từ các file cũ\n"
+        "  dump                         - In toàn bộ state (JSON)"
+    )
+    db_path = None
+    if len(argv) >= 2 and argv[0] == '--db':
+        db_path, argv = argv[1], argv[2:]
+    if not argv:
+        print(usage)
+        return 1
+
+    store = StateStore(db_path)
+    command, args = argv[0], argv[1:]
+    if command == 'set-pid' and len(args) == 2:
+        store.set_pid(args[0], int(args[1]))
+    elif command == 'clear-pid' and len(args) == 1:
+        store.clear_pid(args[0])
+    elif command == 'get-pid' and len(args) == 1:
+        pid = store.get_pid(args[0])
+        print(pid if pid else '')
+    elif command == 'delete' and len(args) == 1:
+        store.delete_port(args[0])
+    elif command == 'monitor-state':
+        states = store.get_port_states(args)
+        for port in args:
+            state = states.get(str(int(port)))
+            if state:
+                print(f"{port} {state['failures']} {int(state['last_restart'])}")
+            else:
+                print(f"{port} 0 0")
+    elif command == 'monitor-apply':
+        updates = []
+        for line in sys.stdin:
+            parts = line.split()
+            if len(parts) < 2:
+                continue
+            update = {'port': parts[0], 'failures': int(parts[1])}
+            if len(parts) >= 3:
+                update.update(restarted=True, last_restart=float(parts[2]))
+            updates.append(update)
+        store.update_monitor_states(updates)
+    elif command == 'import-legacy' and args:
+        count = store.import_legacy_files(args[0], args[1] if len(args) > 1 else None)
+        print(f"✅ Imported state for {count} ports")
+    elif command == 'dump':
+        print(json.dumps(store.get_port_states(), indent=2))
+    else:
+        print(usage)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
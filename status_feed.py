@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Status Feed
+Một collector dùng chung cho mọi viewer của dashboard: thread nền gọi collector mỗi `interval` giây
+(chỉ khi có ít nhất một subscriber), so sánh với snapshot trước và chỉ đẩy phần thay đổi
+(diff theo port) tới các subscriber. Chi phí không tăng theo số tab đang mở và gần như bằng 0
+khi không có gì thay đổi (không có event nào được gửi, chỉ heartbeat).
+"""
+
+import os
+import queue
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import fast_json
+
+STATUS_INTERVAL_SECONDS = float(os.environ.get('STATUS_FEED_INTERVAL_SECONDS', '5'))
+HEARTBEAT_SECONDS = 15.0
+SUBSCRIBER_QUEUE_SIZE = 50
+
+
+def diff_status(old: Optional[Dict], new: Dict, list_field: str = 'gost', key: str = 'port') -> Dict:
+    """
+    Diff giữa hai status: {'changed': [row mới/đổi], 'removed': [key], 'order': [key] nếu thứ tự đổi,
+    và các field top-level khác (vd 'monitor') nếu đổi}. Rỗng nếu không có gì thay đổi
+    """
+    old = old or {}
+    old_rows = {row[key]: row for row in old.get(list_field, [])}
+    new_rows = {row[key]: row for row in new.get(list_field, [])}
+    diff: Dict = {}
+
+    changed = [row for row_key, row in new_rows.items() if old_rows.get(row_key) != row]
+    removed = [row_key for row_key in old_rows if row_key not in new_rows]
+    if changed:
+        diff['changed'] = changed
+    if removed:
+        diff['removed'] = removed
+    new_order = [row[key] for row in new.get(list_field, [])]
+    if new_order != [row[key] for row in old.get(list_field, [])]:
+        diff['order'] = new_order
+
+    for field, value in new.items():
+        if field != list_field and old.get(field) != value:
+            diff[field] = value
+    return diff
+
+
+class Subscription:
+    def __init__(self):
+        self.queue: queue.Queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        # Client quá chậm (queue đầy): bỏ diff, gửi lại snapshot đầy đủ
+        self.resync = False
+
+    def offer(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.resync = True
+
+
+class StatusFeed:
+    def __init__(self, collector: Callable[[], Dict], interval: float = STATUS_INTERVAL_SECONDS):
+        self.collector = collector
+        self.interval = interval
+        self._current: Optional[Dict] = None
+        self._version = 0
+        self._subscribers: List[Subscription] = []
+        self._lock = threading.Lock()
+        self._collect_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.collections = 0
+
+    @property
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    # ----- Publish -----
+
+    def refresh(self) -> Dict:
+        """Chạy collector một lần (không chạy song song) và publish kết quả"""
+        with self._collect_lock:
+            status = self.collector()
+            self.collections += 1
+        self.publish(status)
+        return status
+
+    def publish(self, status: Dict) -> int:
+        """Cập nhật snapshot; gửi diff cho subscriber nếu có thay đổi. Trả về version hiện tại"""
+        with self._lock:
+            diff = diff_status(self._current, status)
+            if not diff and self._current is not None:
+                return self._version
+            self._current = status
+            self._version += 1
+            for subscription in self._subscribers:
+                subscription.offer((self._version, diff))
+            return self._version
+
+    def poke(self):
+        """Thu thập lại ngay (vd sau khi start/stop một port)"""
+        self._wake.set()
+
+    # ----- Subscribe -----
+
+    def subscribe(self) -> Tuple[Subscription, Optional[Dict], int]:
+        """Đăng ký subscriber, trả về (subscription, snapshot hiện tại, version) một cách nguyên tử"""
+        subscription = Subscription()
+        with self._lock:
+            self._subscribers.append(subscription)
+            snapshot, version = self._current, self._version
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='status-feed', daemon=True)
+                self._thread.start()
+        return subscription, snapshot, version
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None
+                    return
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"⚠️  Status feed collector error: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def _resync(self, subscription: Subscription) -> Tuple[Optional[Dict], int]:
+        """Snapshot hiện tại + bỏ các diff cũ hơn nó trong queue (nguyên tử với publish)"""
+        with self._lock:
+            subscription.resync = False
+            while not subscription.queue.empty():
+                subscription.queue.get_nowait()
+            return self._current, self._version
+
+    def stream(self, heartbeat: float = HEARTBEAT_SECONDS):
+        """
+        Generator SSE cho một client: event 'snapshot' (toàn bộ) khi bắt đầu/resync,
+        sau đó event 'diff' khi có thay đổi, comment keep-alive mỗi `heartbeat` giây
+        """
+        subscription, snapshot, version = self.subscribe()
+        try:
+            if snapshot is None:
+                self.refresh()
+                snapshot, version = self._resync(subscription)
+            yield 'retry: 3000\n\n'
+            yield _sse('snapshot', version, snapshot)
+
+            while True:
+                if subscription.resync:
+                    snapshot, version = self._resync(subscription)
+                    yield _sse('snapshot', version, snapshot)
+                    continue
+                try:
+                    item_version, diff = subscription.queue.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                if item_version > version:
+                    version = item_version
+                    yield _sse('diff', item_version, diff)
+        finally:
+            self.unsubscribe(subscription)
+
+
+def _sse(event: str, version: int, data) -> str:
+    return f"id: {version}\nevent: {event}\ndata: {fast_json.dumps_str(data)}\n\n"
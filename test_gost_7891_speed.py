@@ -3,149 +3,15 @@
 Script test tốc độ của gost port 7891 và phân tích nguyên nhân chậm
 """
 
+import os
 import time
-import requests
-import socket
-import statistics
 import sys
+import socket
 import subprocess
-from urllib.parse import urlparse
-from concurrent.futures import ThreadPoolExecutor, as_completed
-
-# Test URLs
-TEST_URLS = {
-    'small': 'https://ipinfo.io/ip',  # ~20 bytes
-    'medium': 'https://speed.cloudflare.com/__down?bytes=1048576',  # 1MB
-    'large': 'https://speed.cloudflare.com/__down?bytes=10485760',  # 10MB
-}
-
-def test_connection(proxy_host, proxy_port):
-    """Test kết nối cơ bản"""
-    proxies = {
-        'http': f'socks5h://{proxy_host}:{proxy_port}',
-        'https': f'socks5h://{proxy_host}:{proxy_port}'
-    }
-    
-    try:
-        start_time = time.time()
-        response = requests.get('https://ipinfo.io/ip', proxies=proxies, timeout=15)
-        end_time = time.time()
-        
-        if response.status_code == 200:
-            latency = (end_time - start_time) * 1000
-            return {
-                'success': True,
-                'ip': response.text.strip(),
-                'latency': latency
-            }
-        else:
-            return {'success': False, 'error': f'HTTP {response.status_code}'}
-    except Exception as e:
-        return {'success': False, 'error': str(e)}
 
-def test_ping(proxy_host, proxy_port, test_url, num_tests=10):
-    """Test ping/latency qua proxy"""
-    proxies = {
-        'http': f'socks5h://{proxy_host}:{proxy_port}',
-        'https': f'socks5h://{proxy_host}:{proxy_port}'
-    }
-    
-    latencies = []
-    success_count = 0
-    errors = []
-    
-    print(f"  📍 Testing ping ({num_tests} requests)...")
-    
-    for i in range(num_tests):
-        try:
-            start_time = time.time()
-            response = requests.get(test_url, proxies=proxies, timeout=15)
-            end_time = time.time()
-            
-            if response.status_code == 200:
-                latency = (end_time - start_time) * 1000
-                latencies.append(latency)
-                success_count += 1
-            else:
-                errors.append(f"HTTP {response.status_code}")
-        except requests.exceptions.Timeout:
-            errors.append("Timeout")
-        except Exception as e:
-            errors.append(str(e))
-    
-    if latencies:
-        avg_latency = statistics.mean(latencies)
-        min_latency = min(latencies)
-        max_latency = max(latencies)
-        median_latency = statistics.median(latencies)
-        
-        return {
-            'success': True,
-            'avg': avg_latency,
-            'min': min_latency,
-            'max': max_latency,
-            'median': median_latency,
-            'success_rate': success_count / num_tests * 100,
-            'total_tests': num_tests,
-            'success_tests': success_count,
-            'errors': errors
-        }
-    else:
-        return {
-            'success': False,
-            'success_rate': 0,
-            'total_tests': num_tests,
-            'success_tests': 0,
-            'errors': errors
-        }
-
-def test_download_speed(proxy_host, proxy_port, test_url, duration=10):
-    """Test download speed qua proxy"""
-    proxies = {
-        'http': f'socks5h://{proxy_host}:{proxy_port}',
-        'https': f'socks5h://{proxy_host}:{proxy_port}'
-    }
-    
-    print(f"  ⬇️  Testing download speed ({duration}s)...")
-    
-    try:
-        start_time = time.time()
-        end_time = start_time + duration
-        
-        total_bytes = 0
-        chunk_size = 8192
-        
-        response = requests.get(test_url, proxies=proxies, stream=True, timeout=30)
-        
-        if response.status_code != 200:
-            return {'success': False, 'error': f'HTTP {response.status_code}'}
-        
-        for chunk in response.iter_content(chunk_size=chunk_size):
-            if time.time() >= end_time:
-                break
-            if chunk:
-                total_bytes += len(chunk)
-        
-        elapsed_time = time.time() - start_time
-        
-        if elapsed_time > 0:
-            speed_mbps = (total_bytes * 8) / (elapsed_time * 1024 * 1024)
-            speed_mb_s = total_bytes / (elapsed_time * 1024 * 1024)
-            
-            return {
-                'success': True,
-                'bytes': total_bytes,
-                'time': elapsed_time,
-                'speed_mbps': speed_mbps,
-                'speed_mb_s': speed_mb_s
-            }
-        else:
-            return {'success': False, 'error': 'No data received'}
-            
-    except requests.exceptions.Timeout:
-        return {'success': False, 'error': 'Timeout'}
-    except Exception as e:
-        return {'success': False, 'error': str(e)}
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from benchmark import Target
+from benchmark.runner import INTERNET_URLS, new_results, run_suite, write_results
 
 def check_gost_process():
     """Kiểm tra process gost"""
@@ -299,63 +165,27 @@ def main():
     else:
         print(f"   ⚠️  {log_analysis['error']}")
     
-    # 4. Test kết nối qua proxy
-    print("\n🔌 Proxy Connection Test:")
+    # 4-6. Connection, ping và download qua benchmark package
+    print("\n🔌 Proxy Benchmark:")
     print("-" * 70)
     
-    connection_test = test_connection(proxy_host, proxy_port)
-    if connection_test.get('success'):
-        print(f"✅ Connected! IP: {connection_test['ip']}, Latency: {connection_test['latency']:.2f}ms")
-    else:
-        print(f"❌ Connection failed: {connection_test.get('error', 'Unknown')}")
+    target = Target(f'Gost {proxy_port}', 'socks5', proxy_host, proxy_port)
+    suite = run_suite(target, INTERNET_URLS, pings=10, duration=10)
+    results = new_results('test_gost_7891_speed', {'urls': INTERNET_URLS})
+    results['results'].append(suite)
+    print(f"\n💾 Results saved to: {write_results(results)}")
+    
+    if not suite['connection']['ok']:
         print("\n❌ Cannot continue speed test - connection failed")
         return
     
-    # 5. Test ping
-    print("\n⏱️  Ping Test:")
-    print("-" * 70)
-    
-    ping_result = test_ping(proxy_host, proxy_port, TEST_URLS['small'], num_tests=10)
-    if ping_result.get('success'):
-        print(f"✅ Ping Results:")
-        print(f"   Average: {ping_result['avg']:.2f}ms")
-        print(f"   Min: {ping_result['min']:.2f}ms")
-        print(f"   Max: {ping_result['max']:.2f}ms")
-        print(f"   Median: {ping_result['median']:.2f}ms")
-        print(f"   Success Rate: {ping_result['success_rate']:.1f}%")
-        
-        if ping_result['errors']:
-            print(f"   Errors: {', '.join(set(ping_result['errors'][:5]))}")
-        
-        # Phân tích
-        if ping_result['avg'] > 5000:
-            print(f"   ⚠️  WARNING: Very high latency (>5s)")
-        elif ping_result['avg'] > 2000:
-            print(f"   ⚠️  WARNING: High latency (>2s)")
-    else:
-        print(f"❌ Ping test failed")
-        if ping_result.get('errors'):
-            print(f"   Errors: {', '.join(set(ping_result['errors'][:5]))}")
-    
-    # 6. Test download speed
-    print("\n📦 Download Speed Test:")
-    print("-" * 70)
-    
-    print("   Small file (1MB)...")
-    speed_small = test_download_speed(proxy_host, proxy_port, TEST_URLS['medium'], duration=10)
-    if speed_small.get('success'):
-        print(f"   ✅ Speed: {speed_small['speed_mbps']:.2f} Mbps ({speed_small['speed_mb_s']:.2f} MB/s)")
-        print(f"   Data: {speed_small['bytes'] / 1024 / 1024:.2f} MB in {speed_small['time']:.2f}s")
-    else:
-        print(f"   ❌ Failed: {speed_small.get('error', 'Unknown')}")
-    
-    print("\n   Large file (10MB)...")
-    speed_large = test_download_speed(proxy_host, proxy_port, TEST_URLS['large'], duration=30)
-    if speed_large.get('success'):
-        print(f"   ✅ Speed: {speed_large['speed_mbps']:.2f} Mbps ({speed_large['speed_mb_s']:.2f} MB/s)")
-        print(f"   Data: {speed_large['bytes'] / 1024 / 1024:.2f} MB in {speed_large['time']:.2f}s")
-    else:
-        print(f"   ❌ Failed: {speed_large.get('error', 'Unknown')}")
+    ping_result = suite['ping'] or {}
+    ping_avg = (ping_result.get('total_ms') or {}).get('avg', 0)
+    if ping_avg > 5000:
+        print(f"   ⚠️  WARNING: Very high latency (>5s)")
+    elif ping_avg > 2000:
+        print(f"   ⚠️  WARNING: High latency (>2s)")
+    speed_small = suite['downloads'].get('1MB', {})
     
     # 7. Tổng kết và đề xuất
     print("\n💡 Analysis & Recommendations:")
@@ -366,8 +196,8 @@ def main():
     if log_analysis.get('timeout_count', 0) > 5:
         issues.append("High timeout count in logs - upstream server may be slow or unreachable")
     
-    if ping_result.get('success') and ping_result.get('avg', 0) > 2000:
-        issues.append(f"High latency ({ping_result['avg']:.0f}ms) - network or server issue")
+    if ping_result.get('success') and ping_avg > 2000:
+        issues.append(f"High latency ({ping_avg:.0f}ms) - network or server issue")
     
     if ping_result.get('success_rate', 100) < 80:
         issues.append(f"Low success rate ({ping_result['success_rate']:.1f}%) - connection instability")
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Tracing
+Tracing in-process nhẹ: một trace cho mỗi request, span quanh từng stage (contextvars nên an toàn
+với Flask threaded). Ngoài trace đang chạy, span() gần như không tốn gì nên có thể bật thường trực.
+Chỉ giữ lại N trace chậm gần nhất (ring buffer) để xem qua /api/debug/traces.
+"""
+
+import os
+import time
+import uuid
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from typing import Dict, List, Optional
+
+TRACE_HEADER = 'X-Trace-Id'
+SLOW_TRACE_MS = float(os.environ.get('TRACE_SLOW_MS', '1000'))
+TRACE_BUFFER_SIZE = int(os.environ.get('TRACE_BUFFER_SIZE', '100'))
+MAX_SPANS_PER_TRACE = 500
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar('current_trace', default=None)
+_current_depth: contextvars.ContextVar = contextvars.ContextVar('current_span_depth', default=0)
+
+
+class Trace:
+    __slots__ = ('trace_id', 'name', 'started_at', 'start', 'duration_ms', 'status', 'spans', 'dropped_spans')
+
+    def __init__(self, name: str, trace_id: Optional[str] = None):
+        self.trace_id = trace_id or uuid.uuid4().hex[:16]
+        self.name = name
+        self.started_at = datetime.now().isoformat()
+        self.start = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.status = None
+        self.spans: List[Dict] = []
+        self.dropped_spans = 0
+
+    def to_dict(self) -> Dict:
+        return {
+            'trace_id': self.trace_id,
+            'name': self.name,
+            'started_at': self.started_at,
+            'duration_ms': self.duration_ms,
+            'status': self.status,
+            'spans': sorted(self.spans, key=lambda span: span['start_ms']),
+            'dropped_spans': self.dropped_spans
+        }
+
+
+class TraceBuffer:
+    """Giữ `capacity` trace chậm nhất gần đây (duration >= slow_ms)"""
+
+    def __init__(self, capacity: int = TRACE_BUFFER_SIZE, slow_ms: float = SLOW_TRACE_MS):
+        self.slow_ms = slow_ms
+        self._traces: deque = deque(maxlen=max(1, capacity))
+        self._lock = threading.Lock()
+
+    @property
+    def capacity(self) -> int:
+        return self._traces.maxlen
+
+    def offer(self, trace: Trace) -> bool:
+        if trace.duration_ms is None or trace.duration_ms < self.slow_ms:
+            return False
+        with self._lock:
+            self._traces.append(trace)
+        return True
+
+    def list(self, limit: Optional[int] = None, trace_id: Optional[str] = None,
+             min_ms: Optional[float] = None) -> List[Dict]:
+        with self._lock:
+            traces = list(self._traces)
+        traces.reverse()  # mới nhất trước
+        if trace_id:
+            traces = [t for t in traces if t.trace_id == trace_id]
+        if min_ms is not None:
+            traces = [t for t in traces if t.duration_ms >= min_ms]
+        return [t.to_dict() for t in traces[:limit]]
+
+    def clear(self):
+        with self._lock:
+            self._traces.clear()
+
+
+BUFFER = TraceBuffer()
+
+
+def start_trace(name: str, trace_id: Optional[str] = None) -> Trace:
+    trace = Trace(name, trace_id)
+    _current_trace.set(trace)
+    _current_depth.set(0)
+    return trace
+
+
+def finish_trace(status=None, buffer: TraceBuffer = BUFFER) -> Optional[Trace]:
+    """Kết thúc trace hiện tại và đưa vào buffer nếu chậm"""
+    trace = _current_trace.get()
+    if trace is None:
+        return None
+    _current_trace.set(None)
+    trace.duration_ms = round((time.perf_counter() - trace.start) * 1000, 3)
+    trace.status = status
+    buffer.offer(trace)
+    return trace
+
+
+def current_trace_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.trace_id if trace else None
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """with span('find_available_gost', port=7891): ... - no-op nếu không có trace"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    depth = _current_depth.get()
+    token = _current_depth.set(depth + 1)
+    started = time.perf_counter()
+    record = {'name': name, 'depth': depth, 'start_ms': round((started - trace.start) * 1000, 3),
+              'duration_ms': None, 'attrs': attrs, 'error': None}
+    try:
+        yield record
+    except BaseException as e:
+        record['error'] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_depth.reset(token)
+        record['duration_ms'] = round((time.perf_counter() - started) * 1000, 3)
+        if len(trace.spans) < MAX_SPANS_PER_TRACE:
+            trace.spans.append(record)
+        else:
+            trace.dropped_spans += 1
+
+
+def traced(name: Optional[str] = None):
+    """Decorator: bọc cả hàm trong một span (tên mặc định = tên hàm)"""
+    def decorator(func):
+        span_name = name or func.__name__.lstrip('_')
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_trace.get() is None:
+                return func(*args, **kwargs)
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
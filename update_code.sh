@@ -36,6 +36,7 @@ else
     pkill -f "auto_credential_updater" 2>/dev/null || true
     pkill -f "warp_monitor" 2>/dev/null || true
     pkill -f "gost_monitor" 2>/dev/null || true
+    pkill -f "gost_health_monitor.py" 2>/dev/null || true
     sleep 2
 fi
 
@@ -4,13 +4,13 @@ Gost Web UI
 Quản lý Gost proxy services qua giao diện web
 """
 
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import Flask, render_template, request, jsonify, send_from_directory, Response
+from flask.json.provider import DefaultJSONProvider
 import subprocess
 import os
 import re
 import json
 import sys
-import requests
 import socket
 from datetime import datetime
 
@@ -19,6 +19,12 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from nordvpn_api import NordVPNAPI
 from protonvpn_api import ProtonVPNAPI
 from proxy_api import proxy_api
+import proxy_probe
+import log_tail
+from status_feed import StatusFeed
+from config_repository import get_config_repository
+from state_store import get_state_store
+from server_history import get_server_history
 
 # Import protonvpn_service để lấy credentials
 try:
@@ -31,12 +37,54 @@ from nordvpn_handler import register_nordvpn_routes
 from protonvpn_handler import register_protonvpn_routes
 from gost_handler import register_gost_routes
 from chrome_handler import register_chrome_routes
+from metrics_handler import register_metrics_routes
+from tracing_handler import register_tracing_routes
+from debug_handler import register_debug_routes
+from logs_handler import register_logs_routes
+from catalog_handler import register_catalog_routes
+import fast_json
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """jsonify / request.get_json qua fast_json (orjson nếu có), giữ sort_keys/compact như provider mặc định"""
+
+    def dumps(self, obj, **kwargs):
+        return fast_json.dumps_str(obj, indent=kwargs.get('indent'), sort_keys=kwargs.get('sort_keys', self.sort_keys),
+                                   default=kwargs.get('default', self.default))
+
+    def loads(self, s, **kwargs):
+        return fast_json.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = 2 if (self.compact is None and self._app.debug) or self.compact is False else None
+        body = fast_json.dumps(obj, indent=indent, sort_keys=self.sort_keys, default=self.default)
+        return self._app.response_class(body + b"\n", mimetype=self.mimetype)
+
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 app.config['SECRET_KEY'] = 'gost-webui-secret-key-2025'
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 LOG_DIR = os.path.join(BASE_DIR, 'logs')
+state_store = get_state_store(os.path.join(LOG_DIR, 'gost_state.db'))
+config_repo = get_config_repository(os.path.join(BASE_DIR, 'config'), state_store=state_store)
+# Chất lượng đo được của từng upstream (benchmark + health probe), dùng để xếp hạng server khi apply
+server_history = get_server_history(os.path.join(LOG_DIR, 'server_history.db'))
+PROXY_TEST_TIMEOUT_SECONDS = 10
+# Số port test đồng thời tối đa của /api/test/proxies
+PROXY_TEST_CONCURRENCY = int(os.environ.get('PROXY_TEST_CONCURRENCY', '128'))
+PROXY_TEST_MAX_TIMEOUT_SECONDS = 2 * PROXY_TEST_TIMEOUT_SECONDS
+
+
+def parse_probe_timeout(value):
+    """?timeout= của test proxy: None nếu không hợp lệ (NaN, <= 0 hoặc > PROXY_TEST_MAX_TIMEOUT_SECONDS)"""
+    try:
+        timeout = float(PROXY_TEST_TIMEOUT_SECONDS if value is None else value)
+    except (TypeError, ValueError):
+        return None
+    return timeout if 0 < timeout <= PROXY_TEST_MAX_TIMEOUT_SECONDS else None
 
 # Initialize NordVPN API
 nordvpn_api = NordVPNAPI(os.path.join(BASE_DIR, 'nordvpn_servers_cache.json'))
@@ -95,20 +143,8 @@ def run_command(cmd, cwd=BASE_DIR, timeout=60):
 
 def get_available_gost_ports():
     """Dynamically scan for available gost ports from config files"""
-    gost_ports = set()
-    
     # Scan config files in config/ directory
-    config_dir = os.path.join(BASE_DIR, 'config')
-    if os.path.exists(config_dir):
-        for filename in os.listdir(config_dir):
-            if filename.startswith('gost_') and filename.endswith('.config'):
-                try:
-                    port = filename.replace('gost_', '').replace('.config', '')
-                    gost_ports.add(port)
-                except (ValueError, IndexError):
-                    pass
-    
-    return sorted(list(gost_ports))
+    return config_repo.ports()
 
 def is_valid_gost_port(port):
     """Check if port is a valid gost port using dynamic discovery"""
@@ -124,9 +160,6 @@ def parse_gost_config(port):
     if not is_valid_gost_port(port):
         return None
     
-    # Use port-based file naming in config/ directory
-    config_file = os.path.join(BASE_DIR, 'config', f'gost_{port}.config')
-    
     # Default config
     config = {
         'port': port,
@@ -135,24 +168,19 @@ def parse_gost_config(port):
         'country': ''
     }
     
-    # Try to load from config file
-    if os.path.exists(config_file):
-        try:
-            with open(config_file, 'r') as f:
-                saved_config = json.load(f)
-                config.update(saved_config)
-                # Port trả về là port của proxy server (từ proxy_url hoặc port field)
-                if 'port' in saved_config and saved_config['port']:
-                    config['port'] = saved_config['port']
-                elif 'proxy_url' in saved_config and saved_config['proxy_url']:
-                    # Trích xuất port từ proxy_url
-                    import re
-                    proxy_url = saved_config['proxy_url']
-                    port_match = re.search(r':(\d+)$', proxy_url)
-                    if port_match:
-                        config['port'] = port_match.group(1)
-        except Exception:
-            pass
+    # Try to load from config file (qua cache, chỉ parse lại khi file thay đổi)
+    saved_config = config_repo.load(port)
+    if saved_config:
+        config.update(saved_config)
+        # Port trả về là port của proxy server (từ proxy_url hoặc port field)
+        if 'port' in saved_config and saved_config['port']:
+            config['port'] = saved_config['port']
+        elif 'proxy_url' in saved_config and saved_config['proxy_url']:
+            # Trích xuất port từ proxy_url
+            proxy_url = saved_config['proxy_url']
+            port_match = re.search(r':(\d+)$', proxy_url)
+            if port_match:
+                config['port'] = port_match.group(1)
     
     return config
 
@@ -168,50 +196,15 @@ def save_gost_config(port, config):
         if not provider or not country:
             return False
         
-        # Use port-based file naming in config/ directory
-        config_file = os.path.join(BASE_DIR, 'config', f'gost_{port}.config')
-        
         # Thêm thông tin cần thiết vào config
         config['port'] = port
         config['created_at'] = datetime.now().isoformat() + 'Z'
         
-        try:
-            with open(config_file, 'w') as f:
-                json.dump(config, f, indent=4)
-            return True
-        except Exception as e:
-            print(f"⚠️  Error saving config: {e}")
-            return False
+        # Ghi atomic (temp file + os.replace) và cập nhật cache
+        return config_repo.save(port, config, indent=4)
     except Exception as e:
         return False
 
-def get_random_server_for_port(port, provider='protonvpn'):
-    """Get a random server for specific port to ensure different servers"""
-    try:
-        import random
-        import time
-        
-        # Add port-specific seed to ensure different servers
-        random.seed(int(time.time() * 1000) + int(port))
-        
-        if provider == 'protonvpn':
-            servers = protonvpn_api.fetch_servers() if protonvpn_api else []
-            if servers:
-                random.shuffle(servers)
-                selected_server = servers[int(port) % len(servers)]
-                return selected_server.get('domain', selected_server.get('name', ''))
-        elif provider == 'nordvpn':
-            servers = nordvpn_api.fetch_servers() if nordvpn_api else []
-            if servers:
-                random.shuffle(servers)
-                selected_server = servers[int(port) % len(servers)]
-                return selected_server.get('hostname', selected_server.get('name', ''))
-        
-        return None
-    except Exception as e:
-        print(f"⚠️  Error getting random server for port {port}: {e}")
-        return None
-
 def get_protonvpn_proxy_with_server(server):
     """Get ProtonVPN proxy URL with correct port based on server label"""
     try:
@@ -244,128 +237,156 @@ def index():
     """Trang chủ"""
     return render_template('index.html')
 
-@app.route('/api/status')
-def api_status():
-    """API endpoint để lấy trạng thái tất cả services"""
+def collect_status():
+    """Trạng thái tất cả services (dùng chung cho /api/status và status feed SSE)"""
+    # Lấy danh sách Gost ports và config (một lần stat mỗi file, chỉ parse khi thay đổi)
+    configs = config_repo.load_all()
+    gost_ports = sorted(configs)
+    # PID của tất cả ports bằng một SELECT
     try:
-        # Lấy danh sách Gost ports
-        gost_ports = get_available_gost_ports()
-        gost_services = []
-        
-        for port in gost_ports:
-            try:
-                # Kiểm tra PID file
-                pid_file = os.path.join(LOG_DIR, f'gost_{port}.pid')
-                running = False
-                pid = None
-                
-                if os.path.exists(pid_file):
-                    try:
-                        with open(pid_file, 'r') as f:
-                            pid = f.read().strip()
-                        if pid:
-                            # Kiểm tra process có đang chạy không
-                            result = subprocess.run(['ps', '-p', pid], capture_output=True, text=True)
-                            running = result.returncode == 0
-                    except:
-                        pass
-                
-                # Fallback: kiểm tra port có đang listen không (cho tất cả các port)
-                # Nếu PID file không hợp lệ hoặc process không chạy, kiểm tra port
-                if not running:
-                    try:
-                        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                        sock.settimeout(1)
-                        result = sock.connect_ex(('127.0.0.1', int(port)))
-                        sock.close()
-                        if result == 0:
-                            # Port đang listen, tìm PID của process đang sử dụng port
-                            try:
-                                lsof_result = subprocess.run(['lsof', '-ti', f':{port}'], capture_output=True, text=True)
-                                if lsof_result.returncode == 0 and lsof_result.stdout.strip():
-                                    port_pid = lsof_result.stdout.strip().split('\n')[0]
-                                    # Kiểm tra process có đang chạy không (chỉ chấp nhận gost)
-                                    ps_result = subprocess.run(['ps', '-p', port_pid, '-o', 'comm='], capture_output=True, text=True)
-                                    if ps_result.returncode == 0 and ps_result.stdout.strip():
-                                        proc_name = ps_result.stdout.strip().lower()
-                                        # Chỉ chấp nhận gost (HAProxy đã được loại bỏ)
-                                        if 'gost' in proc_name:
-                                            running = True
-                                            pid = port_pid
-                                            # Cập nhật PID file với PID thực tế
-                                            try:
-                                                with open(pid_file, 'w') as f:
-                                                    f.write(pid)
-                                            except:
-                                                pass
-                            except:
-                                pass
-                    except:
-                        pass
-                
-                # Lấy thông tin server từ config
-                server_info = None
+        port_states = state_store.get_port_states(gost_ports)
+    except Exception as e:
+        print(f"⚠️  Error reading state store: {e}")
+        port_states = {}
+    gost_services = []
+    
+    for port in gost_ports:
+        try:
+            pid_file = os.path.join(LOG_DIR, f'gost_{port}.pid')
+            running = False
+            pid = None
+            
+            # Ưu tiên PID trong state store, kiểm tra process bằng signal 0 (không fork ps)
+            stored_pid = (port_states.get(port) or {}).get('pid')
+            if stored_pid:
                 try:
-                    # Lấy từ Gost config
-                    config_path = os.path.join(BASE_DIR, 'config', f'gost_{port}.config')
-                    if os.path.exists(config_path):
-                        import json
-                        import re
-                        with open(config_path, 'r') as f:
-                            config = json.load(f)
-                            server_name = config.get('country', '')
-                            proxy_url = config.get('proxy_url', '')
-                            # Tìm port cuối cùng trong proxy_url
-                            port_match = re.search(r':(\d+)$', proxy_url)
-                            if server_name and port_match:
-                                server_port = port_match.group(1)
-                                server_info = f"{server_name}:{server_port}"
-                            elif port == '7890' and not server_info:
-                                # Fallback cho port 7890: Gost forward đến WARP trên 8111
-                                server_info = "cloudflare:8111"
+                    os.kill(int(stored_pid), 0)
+                    running = True
+                    pid = str(stored_pid)
+                except (OSError, ValueError):
+                    pass
+            
+            # Fallback: PID file (state cũ chưa có trong state store)
+            if not running and os.path.exists(pid_file):
+                try:
+                    with open(pid_file, 'r') as f:
+                        pid = f.read().strip()
+                    if pid:
+                        # Kiểm tra process có đang chạy không
+                        result = subprocess.run(['ps', '-p', pid], capture_output=True, text=True)
+                        running = result.returncode == 0
                 except:
                     pass
-                
-                gost_services.append({
-                    'port': port,
-                    'name': f'Gost {port}',
-                    'running': running,
-                    'pid': pid if running else None,
-                    'server_info': server_info,
-                    'connection': running  # Simplified
-                })
-            except Exception as e:
-                print(f"Error processing gost port {port}: {e}")
-        
-        # Kiểm tra Gost Monitor status
-        monitor_running = False
-        monitor_pid = None
-        try:
-            monitor_pid_file = os.path.join(LOG_DIR, 'gost_monitor.pid')
-            if os.path.exists(monitor_pid_file):
-                with open(monitor_pid_file, 'r') as f:
-                    monitor_pid = f.read().strip()
-                if monitor_pid:
-                    result = subprocess.run(['ps', '-p', monitor_pid], capture_output=True, text=True)
-                    monitor_running = result.returncode == 0
-                    # Tự động xóa PID file nếu process không chạy nữa
-                    if not monitor_running:
+            
+            # Fallback: kiểm tra port có đang listen không (cho tất cả các port)
+            # Nếu PID file không hợp lệ hoặc process không chạy, kiểm tra port
+            if not running:
+                try:
+                    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                    sock.settimeout(1)
+                    result = sock.connect_ex(('127.0.0.1', int(port)))
+                    sock.close()
+                    if result == 0:
+                        # Port đang listen, tìm PID của process đang sử dụng port
                         try:
-                            os.remove(monitor_pid_file)
-                            monitor_pid = None
+                            lsof_result = subprocess.run(['lsof', '-ti', f':{port}'], capture_output=True, text=True)
+                            if lsof_result.returncode == 0 and lsof_result.stdout.strip():
+                                port_pid = lsof_result.stdout.strip().split('\n')[0]
+                                # Kiểm tra process có đang chạy không (chỉ chấp nhận gost)
+                                ps_result = subprocess.run(['ps', '-p', port_pid, '-o', 'comm='], capture_output=True, text=True)
+                                if ps_result.returncode == 0 and ps_result.stdout.strip():
+                                    proc_name = ps_result.stdout.strip().lower()
+                                    # Chỉ chấp nhận gost (HAProxy đã được loại bỏ)
+                                    if 'gost' in proc_name:
+                                        running = True
+                                        pid = port_pid
+                                        # Cập nhật PID file và state store với PID thực tế
+                                        try:
+                                            with open(pid_file, 'w') as f:
+                                                f.write(pid)
+                                            state_store.set_pid(port, int(pid))
+                                        except:
+                                            pass
                         except:
                             pass
-        except:
-            pass
-        
-        return jsonify({
-            'gost': gost_services,
-            'monitor': {
-                'running': monitor_running,
-                'pid': monitor_pid if monitor_running else None
-            }
-        })
-        
+                except:
+                    pass
+            
+            # Lấy thông tin server từ config
+            server_info = None
+            try:
+                # Lấy từ Gost config
+                config = configs.get(port)
+                if config is not None:
+                    server_name = config.get('country', '')
+                    proxy_url = config.get('proxy_url', '')
+                    # Tìm port cuối cùng trong proxy_url
+                    port_match = re.search(r':(\d+)$', proxy_url)
+                    if server_name and port_match:
+                        server_port = port_match.group(1)
+                        server_info = f"{server_name}:{server_port}"
+                    elif port == '7890' and not server_info:
+                        # Fallback cho port 7890: Gost forward đến WARP trên 8111
+                        server_info = "cloudflare:8111"
+            except:
+                pass
+            
+            port_state = port_states.get(port) or {}
+            gost_services.append({
+                'port': port,
+                'name': f'Gost {port}',
+                'running': running,
+                'pid': pid if running else None,
+                'server_info': server_info,
+                'connection': running,  # Simplified
+                'failures': port_state.get('failures', 0),
+                'restart_count': port_state.get('restart_count', 0),
+                'last_restart': port_state.get('last_restart', 0)
+            })
+        except Exception as e:
+            print(f"Error processing gost port {port}: {e}")
+    
+    # Kiểm tra Gost Monitor status
+    monitor_running = False
+    monitor_pid = None
+    try:
+        monitor_pid_file = os.path.join(LOG_DIR, 'gost_monitor.pid')
+        if os.path.exists(monitor_pid_file):
+            with open(monitor_pid_file, 'r') as f:
+                monitor_pid = f.read().strip()
+            if monitor_pid:
+                result = subprocess.run(['ps', '-p', monitor_pid], capture_output=True, text=True)
+                monitor_running = result.returncode == 0
+                # Tự động xóa PID file nếu process không chạy nữa
+                if not monitor_running:
+                    try:
+                        os.remove(monitor_pid_file)
+                        monitor_pid = None
+                    except:
+                        pass
+    except:
+        pass
+    
+    return {
+        'gost': gost_services,
+        'monitor': {
+            'running': monitor_running,
+            'pid': monitor_pid if monitor_running else None
+        }
+    }
+
+
+status_feed = StatusFeed(collect_status)
+
+
+@app.route('/api/status')
+def api_status():
+    """API endpoint để lấy trạng thái tất cả services"""
+    try:
+        status = collect_status()
+        # Viewer đang nghe /api/status/stream nhận luôn thay đổi (vd ngay sau start/stop) mà không phải đợi vòng sau
+        status_feed.publish(status)
+        return jsonify(status)
     except Exception as e:
         return jsonify({
             'error': str(e),
@@ -376,6 +397,16 @@ def api_status():
             }
         }), 500
 
+@app.route('/api/status/stream')
+def api_status_stream():
+    """
+    SSE: event 'snapshot' (như /api/status) khi kết nối, sau đó event 'diff' chỉ khi có thay đổi
+    ({changed: [rows], removed: [ports], order: [ports], monitor: {...}}).
+    Mọi viewer dùng chung một collector nên chi phí không tăng theo số tab
+    """
+    return Response(status_feed.stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/protonvpn/credentials')
 def api_protonvpn_credentials():
     """API endpoint để lấy ProtonVPN credentials từ protonvpn_service"""
@@ -411,117 +442,144 @@ def api_protonvpn_credentials():
 
 @app.route('/api/test/proxy/<port>')
 def api_test_proxy(port):
-    """Test proxy connection"""
+    """
+    Test proxy bằng SOCKS5 probe (greeting + CONNECT), trả về lớp lỗi và latency từng bước.
+    ?ip=0 để bỏ bước lấy egress IP (mặc định lấy để hiển thị trên UI)
+    """
     try:
-        import requests
-        import socket
-        
-        # Import PySocks để hỗ trợ SOCKS proxy
-        try:
-            import socks
-            import requests.packages.urllib3.util.connection as urllib3_connection
-        except ImportError:
-            return jsonify({
-                'success': False,
-                'error': 'Missing dependencies for SOCKS support. Please install: python3-socks'
-            })
-        
-        # Test if port is listening
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(3)
-        result = sock.connect_ex(('127.0.0.1', int(port)))
-        sock.close()
-        
-        if result != 0:
-            return jsonify({
-                'success': False,
-                'error': f'Port {port} is not listening'
-            })
-        
-        # Test proxy with requests
-        try:
-            proxies = {
-                'http': f'socks5://127.0.0.1:{port}',
-                'https': f'socks5://127.0.0.1:{port}'
-            }
-            
-            response = requests.get('https://ipinfo.io/ip', 
-                                  proxies=proxies, 
-                                  timeout=10)
-            
-            if response.status_code == 200:
-                return jsonify({
-                    'success': True,
-                    'ip': response.text.strip()
-                })
-            else:
-                return jsonify({
-                    'success': False,
-                    'error': f'HTTP {response.status_code}'
-                })
-        except requests.exceptions.RequestException as e:
-            return jsonify({
-                'success': False,
-                'error': f'Proxy test failed: {str(e)}'
-            })
-            
+        fetch_ip = request.args.get('ip', '1') not in ('0', 'false', 'no')
+        timeout = parse_probe_timeout(request.args.get('timeout'))
+        if timeout is None:
+            return jsonify({'success': False,
+                            'error': f'Invalid timeout (0 < timeout <= {PROXY_TEST_MAX_TIMEOUT_SECONDS})'}), 400
+        result = proxy_probe.probe(port, config=config_repo.load(port), timeout=timeout, fetch_ip=fetch_ip)
+        response = {
+            'success': result['ok'],
+            'status': result['status'],
+            'handshake_ms': result['handshake_ms'],
+            'connect_ms': result['connect_ms'],
+            'total_ms': result['total_ms']
+        }
+        if result['ok']:
+            response['ip'] = result['ip']
+        else:
+            response['error'] = result['error']
+        return jsonify(response)
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
         })
 
+@app.route('/api/test/proxies')
+def api_test_proxies():
+    """
+    Test tất cả gost ports (hoặc ?ports=7891,7892) đồng thời, stream kết quả theo thứ tự hoàn thành.
+    ?format=sse cho EventSource, mặc định NDJSON (mỗi port một dòng, dòng cuối là summary).
+    ?ip=1 để lấy egress IP, ?timeout=, ?concurrency=
+    """
+    requested = [p.strip() for p in request.args.get('ports', '').split(',') if p.strip()]
+    available = get_available_gost_ports()
+    ports = [port for port in requested if port in available] if requested else available
+    fetch_ip = request.args.get('ip', '0') in ('1', 'true', 'yes')
+    sse = request.args.get('format') == 'sse'
+    timeout = parse_probe_timeout(request.args.get('timeout'))
+    if timeout is None:
+        return jsonify({'success': False,
+                        'error': f'Invalid timeout (0 < timeout <= {PROXY_TEST_MAX_TIMEOUT_SECONDS})'}), 400
+    try:
+        concurrency = int(request.args.get('concurrency', PROXY_TEST_CONCURRENCY))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid concurrency'}), 400
+    concurrency = max(1, min(concurrency, PROXY_TEST_CONCURRENCY))
+    configs = {port: config for port, config in config_repo.load_all().items() if port in ports}
+
+    def encode(event, payload):
+        data = fast_json.dumps_str(payload)
+        return f"event: {event}\ndata: {data}\n\n" if sse else data + "\n"
+
+    def generate():
+        started = datetime.now()
+        results = []
+        for result in proxy_probe.iter_probe_results(ports, configs, concurrency=concurrency,
+                                                     timeout=timeout, fetch_ip=fetch_ip):
+            results.append(result)
+            yield encode('result', result)
+        summary = proxy_probe.summarize_results(results)
+        summary['elapsed_ms'] = round((datetime.now() - started).total_seconds() * 1000, 1)
+        yield encode('summary', dict(summary, done=True))
+
+    return Response(generate(), mimetype='text/event-stream' if sse else 'application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/logs/<service>')
 def api_logs(service):
-    """Get service logs"""
+    """
+    Get service logs - chỉ đọc phần cuối file (seek lùi từ EOF), không đọc cả file 50MB.
+    ?lines=N (mặc định 1000), ?before=<start của trang trước> để xem trang cũ hơn,
+    ?offset=<end> để lấy phần ghi thêm, ?follow=true để stream dòng mới qua SSE
+    """
     try:
-        log_files = []
-        
-        # Determine log file paths based on service name
-        if service.startswith('gost') or service.startswith('wireproxy'):
-            port = service.replace('gost', '').replace('wireproxy', '')
-            log_files = [
-                os.path.join(LOG_DIR, f'gost_{port}.log')
-            ]
-        
-        # Read and combine logs
-        all_logs = []
-        for log_file in log_files:
-            if os.path.exists(log_file):
-                try:
-                    with open(log_file, 'r', encoding='utf-8', errors='ignore') as f:
-                        content = f.read()
-                        if content.strip():
-                            all_logs.append(f"=== {os.path.basename(log_file)} ===\n{content}")
-                except Exception as e:
-                    all_logs.append(f"=== {os.path.basename(log_file)} ===\nError reading file: {e}")
-        
-        if not all_logs:
-            return jsonify({
-                'success': True,
-                'logs': f'No log files found for {service}'
-            })
-        
-        # Combine all logs
-        combined_logs = '\n\n'.join(all_logs)
-        
-        # Get last 1000 lines if too long
-        lines = combined_logs.split('\n')
-        if len(lines) > 1000:
-            combined_logs = '\n'.join(lines[-1000:])
-            combined_logs = f"[Showing last 1000 lines]\n\n{combined_logs}"
-        
+        port = service.replace('gost', '').replace('wireproxy', '')
+        if not (service.startswith('gost') or service.startswith('wireproxy')) or not port.isdigit():
+            return jsonify({'success': True, 'logs': f'No log files found for {service}'})
+        log_file = os.path.join(LOG_DIR, f'gost_{port}.log')
+
+        try:
+            lines = int(request.args.get('lines', log_tail.DEFAULT_LINES))
+            before = int(request.args['before']) if 'before' in request.args else None
+            offset = request.args.get('offset', request.headers.get('Last-Event-ID'))
+            offset = int(offset) if offset not in (None, '') else None
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Invalid lines/before/offset'}), 400
+
+        if request.args.get('follow') == 'true':
+            return _follow_log(log_file, offset)
+
+        if not os.path.exists(log_file):
+            return jsonify({'success': True, 'logs': f'No log files found for {service}'})
+
+        if offset is not None:
+            result = log_tail.read_from(log_file, offset)
+            return jsonify({'success': True, 'logs': '\n'.join(result['lines']), 'lines': result['lines'],
+                            'start': 0 if result['reset'] else offset, 'end': result['offset'],
+                            'size': result['size'], 'reset': result['reset'], 'has_more': result['has_more']})
+
+        result = log_tail.tail_lines(log_file, lines=lines, before=before)
+        text = '\n'.join(result['lines'])
+        if result['has_more']:
+            text = f"[Showing last {len(result['lines'])} lines]\n\n{text}"
         return jsonify({
             'success': True,
-            'logs': combined_logs
+            'logs': f"=== {os.path.basename(log_file)} ===\n{text}",
+            'lines': result['lines'],
+            'start': result['start'],
+            'end': result['end'],
+            'size': result['size'],
+            'has_more': result['has_more']
         })
-        
+
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
         })
 
+
+def _follow_log(log_file, offset):
+    """SSE: event 'lines' cho mỗi lô dòng mới (id = offset để EventSource reconnect tiếp đúng chỗ)"""
+    def generate():
+        yield 'retry: 3000\n\n'
+        for result in log_tail.follow(log_file, offset=offset):
+            if result is None:
+                yield ': keep-alive\n\n'
+                continue
+            payload = fast_json.dumps_str({'lines': result['lines'], 'offset': result['offset'], 'reset': result['reset']})
+            yield f"id: {result['offset']}\nevent: lines\ndata: {payload}\n\n"
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/clear-all', methods=['POST'])
 def api_clear_all():
     """Clear all Gost services (except port 7890)"""
@@ -572,8 +630,9 @@ def api_clear_all():
                     finally:
                         try:
                             os.remove(pid_file)
-                        except:
+                        except OSError:
                             pass
+                state_store.clear_pid(port)
             except Exception as e:
                 print(f"⚠️  Error stopping Gost {port}: {e}")
         
@@ -625,8 +684,13 @@ def api_clear_all():
             except (ValueError, TypeError):
                 pass
             
+            # Config xóa qua repository: dòng port_state (config, pid, failures, restart_count) bị xóa theo,
+            # /metrics không còn export port này và port tạo lại sau không kế thừa state cũ
+            if config_repo.delete(port):
+                deleted_files.append(f'Gost config {port}')
+                print(f"✓ Deleted Gost config {port}")
+
             files_to_remove = [
-                (os.path.join(BASE_DIR, 'config', f'gost_{port}.config'), f'Gost config {port}'),
                 (os.path.join(LOG_DIR, f'gost_{port}.log'), f'Gost log {port}'),
                 (os.path.join(LOG_DIR, f'gost_{port}.pid'), f'Gost PID {port}')
             ]
@@ -750,10 +814,21 @@ def api_monitor_action(action):
         }), 500
 
 # Register all routes
-register_nordvpn_routes(app, save_gost_config, run_command, trigger_health_check, nordvpn_api, proxy_api)
-register_protonvpn_routes(app, save_gost_config, run_command, trigger_health_check, protonvpn_api, proxy_api)
+register_nordvpn_routes(app, save_gost_config, run_command, trigger_health_check, nordvpn_api, proxy_api, server_history)
+register_protonvpn_routes(app, save_gost_config, run_command, trigger_health_check, protonvpn_api, proxy_api, server_history)
+register_catalog_routes(app, nordvpn_api, protonvpn_api)
 register_gost_routes(app, BASE_DIR, LOG_DIR, run_command, save_gost_config, parse_gost_config, is_valid_gost_port, get_available_gost_ports)
 register_chrome_routes(app, BASE_DIR, get_available_gost_ports, _get_proxy_port)
+register_logs_routes(app, LOG_DIR, config_repo)
+register_tracing_routes(app)
+register_debug_routes(app, {
+    'nordvpn_servers': lambda: nordvpn_api.servers,
+    'protonvpn_servers': lambda: protonvpn_api.servers if protonvpn_api else []
+})
+register_metrics_routes(app, BASE_DIR, LOG_DIR, state_store, {
+    'nordvpn': nordvpn_api.cache_file,
+    'protonvpn': os.path.join(BASE_DIR, 'protonvpn_servers_cache.json')
+})
 
 if __name__ == '__main__':
     # Tạo thư mục logs nếu chưa có
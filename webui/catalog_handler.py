@@ -0,0 +1,33 @@
+"""
+Catalog Handler
+/api/catalog/servers: query trên catalog NordVPN + ProtonVPN (filter, sort, limit/cursor, projection)
+để client chỉ lấy đúng số dòng và field cần thay vì cả danh sách country
+"""
+
+from flask import request, jsonify
+import os
+import sys
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from catalog_query import CatalogQuery, parse_query
+
+
+def register_catalog_routes(app, nordvpn_api, protonvpn_api):
+    """Đăng ký /api/catalog/servers (ProtonVPN bị bỏ qua nếu chưa cấu hình)"""
+    catalog = CatalogQuery({'nordvpn': nordvpn_api, 'protonvpn': protonvpn_api})
+
+    @app.route('/api/catalog/servers')
+    def api_catalog_servers():
+        """
+        ?provider=nordvpn,protonvpn ?country=JP,US ?city= ?tier= (tối thiểu) ?max_load= ?status=online
+        ?features= (bitmask, vd 0x4) ?sort=load,-score ?limit= (mặc định 50) ?cursor= ?fields=name,domain,country.code
+        """
+        try:
+            params = parse_query(request.args)
+            result = catalog.query(**params)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        except Exception as e:
+            return jsonify({'success': False, 'error': str(e)}), 500
+        return jsonify(dict(result, success=True))
@@ -3,7 +3,7 @@ Chrome Handler
 Xử lý các API endpoints liên quan đến Chrome proxy
 """
 
-from flask import request, jsonify
+from flask import request, jsonify, g
 import os
 import sys
 import glob
@@ -11,10 +11,21 @@ import random
 import requests
 import logging
 import time
-from functools import lru_cache
+from functools import lru_cache, wraps
 
 # Add parent directory to path to import modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import metrics
+import tracing
+import log_tail
+
+PROXY_CHECK_TOTAL = metrics.counter(
+    'chrome_proxy_check_total', 'Kết quả /api/chrome/proxy-check theo trường hợp (1-4)', ('case', 'outcome'))
+PROXY_CHECK_SECONDS = metrics.histogram(
+    'chrome_proxy_check_duration_seconds', 'Thời gian xử lý /api/chrome/proxy-check theo trường hợp', ('case',))
+APPLY_ATTEMPTS_TOTAL = metrics.counter(
+    'chrome_apply_attempts_total', 'Các lần thử apply server trong fallback chain',
+    ('provider', 'mode', 'outcome'))
 
 # Cache cho API status calls (5 giây TTL)
 _status_cache = {}
@@ -30,7 +41,13 @@ def _try_apply_request(provider, port_num, apply_data, is_random=False):
     
     try:
         logging.info(f"[APPLY_FALLBACK] Trying {provider} with {data_label}: {apply_data if not is_random else '{}'}")
-        response = requests.post(apply_url, json=apply_data, timeout=60)
+        # Gửi kèm trace id để request apply nội bộ nằm chung trace trong /api/debug/traces
+        trace_id = tracing.current_trace_id()
+        with tracing.span('try_apply_request', provider=provider, random=is_random):
+            response = requests.post(apply_url, json=apply_data, timeout=60,
+                                     headers={tracing.TRACE_HEADER: trace_id} if trace_id else None)
+        APPLY_ATTEMPTS_TOTAL.inc(provider=provider, mode='random' if is_random else 'specific',
+                                 outcome='success' if response.status_code == 200 else 'failure')
         if response.status_code == 200:
             logging.info(f"[APPLY_FALLBACK] ✅ {provider} succeeded with {data_label}")
             return response, None
@@ -44,10 +61,12 @@ def _try_apply_request(provider, port_num, apply_data, is_random=False):
             logging.warning(f"[APPLY_FALLBACK] {error_msg}")
             return None, error_msg
     except requests.exceptions.RequestException as e:
+        APPLY_ATTEMPTS_TOTAL.inc(provider=provider, mode='random' if is_random else 'specific', outcome='error')
         error_msg = f"{provider} {data_label} request failed: {str(e)}"
         logging.error(f"[APPLY_FALLBACK] {error_msg}")
         return None, error_msg
 
+@tracing.traced()
 def _apply_server_with_fallback(gost_port, apply_data, vpn_provider):
     """
     Apply server với fallback logic:
@@ -106,6 +125,7 @@ def _apply_server_with_fallback(gost_port, apply_data, vpn_provider):
     logging.error(f"[APPLY_FALLBACK] All attempts failed. Errors: {error_summary}")
     return None, error_summary
 
+@tracing.traced()
 def _determine_smart_vpn_provider(check_server, profiles):
     """
     Xác định VPN provider thông minh dựa trên:
@@ -198,6 +218,7 @@ def _is_port_available(port, used_ports, BASE_DIR):
     
     return True
 
+@tracing.traced()
 def _find_available_port(start_port, used_ports, BASE_DIR, max_port=7999):
     """Tìm port available đầu tiên từ start_port, kiểm tra cả config file và used_ports"""
     for port in range(start_port, max_port + 1):
@@ -205,6 +226,7 @@ def _find_available_port(start_port, used_ports, BASE_DIR, max_port=7999):
             return port
     return None
 
+@tracing.traced()
 def _check_gost_running(port, BASE_DIR, max_wait=5):
     """
     Kiểm tra xem Gost có thực sự đang chạy không sau khi restart
@@ -271,6 +293,7 @@ def _check_gost_running(port, BASE_DIR, max_wait=5):
     except Exception as e:
         return False, f"Error checking Gost status: {str(e)}"
 
+@tracing.traced()
 def _wait_for_gost_ready(port, BASE_DIR, max_wait=30, check_interval=0.5):
     """
     Đợi gost hoạt động sẵn sàng trước khi return
@@ -402,6 +425,7 @@ def _wait_for_gost_ready(port, BASE_DIR, max_wait=30, check_interval=0.5):
     except Exception as e:
         return False, f"Error waiting for gost: {str(e)}"
 
+@tracing.traced()
 def _get_cached_status():
     """Lấy status với caching để giảm API calls"""
     global _status_cache
@@ -490,6 +514,7 @@ def _parse_apply_result(apply_result, check_server):
         actual_proxy_port = '89'
     return actual_proxy_host, actual_proxy_port
 
+@tracing.traced()
 def _wait_and_log_gost_ready(port, BASE_DIR, case_num, max_wait=30):
     """
     Đợi gost hoạt động và log kết quả
@@ -503,6 +528,7 @@ def _wait_and_log_gost_ready(port, BASE_DIR, case_num, max_wait=30):
         logging.info(f"[CHROME_PROXY_CHECK] Case {case_num}: Gost on port {port} is ready")
     return is_ready
 
+@tracing.traced()
 def _apply_server_and_parse(port, apply_data, vpn_provider, check_server):
     """
     Apply server và parse response
@@ -518,6 +544,7 @@ def _apply_server_and_parse(port, apply_data, vpn_provider, check_server):
     actual_proxy_host, actual_proxy_port = _parse_apply_result(apply_result, check_server)
     return True, actual_proxy_host, actual_proxy_port, vpn_provider, None
 
+@tracing.traced()
 def _create_gost_with_retry(gost_port, apply_data, vpn_provider, check_server, used_ports, BASE_DIR, case_num, max_retries=10):
     """
     Tạo gost mới với retry logic
@@ -563,11 +590,10 @@ def _create_gost_with_retry(gost_port, apply_data, vpn_provider, check_server, u
                     log_file = os.path.join(BASE_DIR, 'logs', f'gost_{gost_port}.log')
                     if os.path.exists(log_file):
                         try:
-                            with open(log_file, 'r') as f:
-                                log_lines = f.readlines()
-                                if log_lines:
-                                    last_lines = ''.join(log_lines[-10:])
-                                    logging.error(f"[CHROME_PROXY_CHECK] Last 10 log lines: {last_lines}")
+                            log_lines = log_tail.tail_lines(log_file, lines=10)['lines']
+                            if log_lines:
+                                last_lines = '\n'.join(log_lines)
+                                logging.error(f"[CHROME_PROXY_CHECK] Last 10 log lines: {last_lines}")
                         except:
                             pass
             else:
@@ -601,6 +627,7 @@ def _create_gost_with_retry(gost_port, apply_data, vpn_provider, check_server, u
     
     return True, gost_port, actual_proxy_host, actual_proxy_port, vpn_provider, None
 
+@tracing.traced()
 def _find_orphaned_gost_for_port(requested_port):
     """Tìm Gost đang chạy với port yêu cầu"""
     try:
@@ -629,6 +656,7 @@ def _find_orphaned_gost_for_port(requested_port):
         print(f"Error finding Gost: {e}")
         return None
 
+@tracing.traced()
 def _find_available_gost(profiles, check_server, vpn_provider, check_proxy_port):
     """Tìm Gost đang rảnh (không được sử dụng bởi profiles) hoặc có cùng server và port"""
     try:
@@ -698,10 +726,28 @@ def _find_available_gost(profiles, check_server, vpn_provider, check_proxy_port)
         print(f"Error finding available Gost: {e}")
         return None
 
+def _observe_proxy_check(view):
+    """Đếm kết quả proxy-check theo case (handler gán g.proxy_check_case) và đo thời gian"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        g.proxy_check_case = 'invalid'
+        status = 500
+        try:
+            result = view(*args, **kwargs)
+            status = result[1] if isinstance(result, tuple) else getattr(result, 'status_code', 200)
+            return result
+        finally:
+            case = str(g.proxy_check_case)
+            PROXY_CHECK_TOTAL.inc(case=case, outcome='success' if status < 400 else 'error')
+            PROXY_CHECK_SECONDS.observe(time.perf_counter() - started, case=case)
+    return wrapper
+
 def register_chrome_routes(app, BASE_DIR, get_available_gost_ports, _get_proxy_port):
     """Đăng ký các routes Chrome với Flask app"""
     
     @app.route('/api/chrome/proxy-check', methods=['POST'])
+    @_observe_proxy_check
     def api_chrome_proxy_check():
         """
         API kiểm tra và tạo proxy cho Chrome profiles
@@ -719,7 +765,8 @@ def register_chrome_routes(app, BASE_DIR, get_available_gost_ports, _get_proxy_p
         """
         try:
             logging.info(f"[CHROME_PROXY_CHECK] Starting request...")
-            data = request.json
+            with tracing.span('parse_request'):
+                data = request.json
             proxy_check = data.get('proxy_check', '')
             profiles_data = data.get('data', {})
             profiles = profiles_data.get('profiles', [])
@@ -825,6 +872,7 @@ def register_chrome_routes(app, BASE_DIR, get_available_gost_ports, _get_proxy_p
             if exact_match:
                 # 1. Nếu proxy_check = proxy thì return lại proxy - đợi gost hoạt động
                 logging.info(f"[CHROME_PROXY_CHECK] Case 1: Exact match found")
+                g.proxy_check_case = 1
                 try:
                     exact_port = int(exact_match["port"])
                     _wait_and_log_gost_ready(exact_port, BASE_DIR, 1, max_wait=3)
@@ -835,6 +883,7 @@ def register_chrome_routes(app, BASE_DIR, get_available_gost_ports, _get_proxy_p
             elif different_gost_port_same_server:
                 # 2. Khác port gost, proxy_host và proxy_port giống nhau thì return lại proxy - đợi gost hoạt động
                 logging.info(f"[CHROME_PROXY_CHECK] Case 2: Different port, same server")
+                g.proxy_check_case = 2
                 try:
                     diff_port = int(different_gost_port_same_server["port"])
                     _wait_and_log_gost_ready(diff_port, BASE_DIR, 2, max_wait=3)
@@ -845,6 +894,7 @@ def register_chrome_routes(app, BASE_DIR, get_available_gost_ports, _get_proxy_p
             elif same_gost_port_different_server:
                 # 3. Trùng port gost, proxy_host và proxy_port khác nhau thì tạo mới Gost
                 logging.info(f"[CHROME_PROXY_CHECK] Case 3: Same port, different server")
+                g.proxy_check_case = 3
                 # Trước tiên kiểm tra Gost đang rảnh
                 available_gost = _find_available_gost(profiles, check_server, vpn_provider, check_proxy_port)
                 if available_gost:
@@ -913,6 +963,7 @@ def register_chrome_routes(app, BASE_DIR, get_available_gost_ports, _get_proxy_p
             else:
                 # 4. Port gost, proxy_host và proxy_port khác nhau, tạo mới Gost
                 logging.info(f"[CHROME_PROXY_CHECK] Case 4: Different port and server")
+                g.proxy_check_case = 4
                 # Trước tiên kiểm tra Gost đang rảnh
                 available_gost = _find_available_gost(profiles, check_server, vpn_provider, check_proxy_port)
                 if available_gost:
@@ -0,0 +1,99 @@
+"""
+Debug Handler
+Profiling theo yêu cầu cho web UI đang chạy: /api/debug/profile (sampling mọi thread)
+và /api/debug/memory (tracemalloc top allocators, diff, kích thước catalog).
+Chỉ cho phép từ localhost hoặc khi gửi đúng X-Debug-Token (env DEBUG_TOKEN)
+"""
+
+from flask import request, jsonify, Response
+import os
+import sys
+import json
+import hmac
+from functools import wraps
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import profiler
+
+LOCAL_ADDRESSES = ('127.0.0.1', '::1')
+
+
+def _debug_allowed() -> bool:
+    token = os.environ.get('DEBUG_TOKEN', '')
+    if token:
+        return hmac.compare_digest(request.headers.get('X-Debug-Token', ''), token)
+    return request.remote_addr in LOCAL_ADDRESSES
+
+
+def debug_guarded(view):
+    """Chỉ cho localhost hoặc request có X-Debug-Token đúng (dùng chung cho mọi route /api/debug/)"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not _debug_allowed():
+            return jsonify({'success': False, 'error': 'Debug endpoints are restricted'}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def register_debug_routes(app, tracked_objects=None):
+    """
+    tracked_objects: {tên: callable trả về object} - kích thước sâu được báo trong /api/debug/memory?objects=1
+    (vd danh sách server của catalog)
+    """
+    tracked_objects = tracked_objects or {}
+
+    @app.route('/api/debug/profile')
+    @debug_guarded
+    def api_debug_profile():
+        """
+        Sampling profile ?seconds=N (tối đa 60) trên mọi thread.
+        ?format=collapsed (mặc định, cho flamegraph.pl/speedscope) hoặc speedscope (JSON)
+        """
+        try:
+            seconds = float(request.args.get('seconds', 5))
+            interval = float(request.args.get('interval_ms', profiler.DEFAULT_INTERVAL_SECONDS * 1000)) / 1000
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Invalid seconds/interval_ms'}), 400
+        try:
+            profile = profiler.sample_stacks(seconds, interval=max(0.001, interval))
+        except profiler.ProfilerBusy as e:
+            return jsonify({'success': False, 'error': str(e)}), 409
+
+        if request.args.get('format') == 'speedscope':
+            body = json.dumps(profiler.to_speedscope(profile, name='webui'))
+            return Response(body, mimetype='application/json',
+                            headers={'Content-Disposition': 'attachment; filename=webui.speedscope.json'})
+        return Response(profiler.to_collapsed(profile), mimetype='text/plain',
+                        headers={'X-Profile-Samples': str(profile['count'])})
+
+    @app.route('/api/debug/memory')
+    @debug_guarded
+    def api_debug_memory():
+        """
+        ?start=1 bật tracemalloc (có overhead, tắt mặc định), ?stop=1 tắt.
+        Mỗi lần gọi trả về top allocators và diff với lần gọi trước; ?objects=1 thêm kích thước catalog
+        """
+        if request.args.get('stop') == '1':
+            profiler.MEMORY.stop()
+            return jsonify({'success': True, 'tracing': False})
+        if request.args.get('start') == '1':
+            profiler.MEMORY.start()
+        try:
+            limit = int(request.args.get('limit', 20))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Invalid limit'}), 400
+        key_type = request.args.get('group_by', 'lineno')
+        if key_type not in ('lineno', 'filename', 'traceback'):
+            return jsonify({'success': False, 'error': 'group_by must be lineno, filename or traceback'}), 400
+
+        result = profiler.MEMORY.snapshot(limit=max(1, limit), key_type=key_type)
+        if request.args.get('objects') == '1':
+            sizes = {}
+            for name, getter in tracked_objects.items():
+                try:
+                    sizes[name] = profiler.deep_sizeof(getter())
+                except Exception as e:
+                    sizes[name] = f'error: {e}'
+            result['objects_bytes'] = sizes
+        return jsonify(dict(result, success=True))
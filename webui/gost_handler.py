@@ -11,10 +11,21 @@ from datetime import datetime
 
 # Add parent directory to path to import modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config_repository import get_config_repository
+from state_store import get_state_store
 
 def register_gost_routes(app, BASE_DIR, LOG_DIR, run_command, save_gost_config, parse_gost_config, is_valid_gost_port, get_available_gost_ports):
     """Đăng ký các routes Gost với Flask app"""
+    state_store = get_state_store(os.path.join(LOG_DIR, 'gost_state.db'))
+    # Xóa config qua repository: dòng port_state (config, failures, restart_count) bị xóa theo
+    config_repo = get_config_repository(os.path.join(BASE_DIR, 'config'), state_store=state_store)
     
+    def clear_pid(port):
+        """Xóa PID trong state store sau khi dừng gost"""
+        try:
+            state_store.clear_pid(port)
+        except Exception as e:
+            print(f"⚠️  Error clearing PID for port {port}: {e}")
 
     @app.route('/api/gost/config/<port>')
     def api_get_gost_config(port):
@@ -96,6 +107,7 @@ def register_gost_routes(app, BASE_DIR, LOG_DIR, run_command, save_gost_config,
                         os.remove(pid_file)
                     except Exception:
                         pass
+                    clear_pid(port)
                     return jsonify({
                         'success': True,
                         'message': f'Gost on port {port} stopped successfully'
@@ -191,6 +203,7 @@ def register_gost_routes(app, BASE_DIR, LOG_DIR, run_command, save_gost_config,
                         os.remove(pid_file)
                     except Exception:
                         pass
+                    clear_pid(port)
                 except (OSError, ValueError):
                     pass
             
@@ -213,11 +226,7 @@ def register_gost_routes(app, BASE_DIR, LOG_DIR, run_command, save_gost_config,
                     'error': f'Port 7890 config file is protected and cannot be deleted'
                 }), 403
                 
-            if os.path.exists(config_file):
-                try:
-                    os.remove(config_file)
-                except Exception:
-                    pass
+            config_repo.delete(port)
             
             # Remove log file
             log_file = os.path.join(LOG_DIR, f'gost_{port}.log')
@@ -242,7 +251,7 @@ def register_gost_routes(app, BASE_DIR, LOG_DIR, run_command, save_gost_config,
     def api_reset_gost_configs():
         """Reset tất cả gost configs về mặc định (except port 7890)"""
         try:
-            protected_port = 7890  # Port 7890 được bảo vệ
+            protected_port = '7890'  # Port 7890 được bảo vệ (ports từ config repository là chuỗi)
             
             # Get all available gost ports
             available_ports = get_available_gost_ports()
@@ -262,16 +271,12 @@ def register_gost_routes(app, BASE_DIR, LOG_DIR, run_command, save_gost_config,
                             os.remove(pid_file)
                         except Exception:
                             pass
+                        clear_pid(port)
                     except (OSError, ValueError):
                         pass
                 
-                # Remove config file
-                config_file = os.path.join(BASE_DIR, 'config', f'gost_{port}.config')
-                if os.path.exists(config_file):
-                    try:
-                        os.remove(config_file)
-                    except Exception:
-                        pass
+                # Remove config file (+ state của port)
+                config_repo.delete(port)
             
             message = 'All gost configs reset successfully'
             if protected_port in available_ports:
@@ -0,0 +1,58 @@
+"""
+Logs Handler
+/api/logs/errors: bộ đếm lỗi/thành công của toàn bộ fleet gost theo port và upstream,
+lấy từ LogAggregator chạy nền (tail tăng dần mọi logs/gost_<port>.log) - không quét file khi query
+"""
+
+from flask import request, jsonify
+import os
+import re
+import sys
+import time
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import log_aggregator
+
+_DURATION_PATTERN = re.compile(r'^(\d+(?:\.\d+)?)([smhd]?)$')
+_DURATION_UNITS = {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}
+DEFAULT_SINCE_SECONDS = 3600
+
+
+def parse_since(value, now=None):
+    """'15m' / '2h' / '300' (tương đối) hoặc epoch tuyệt đối (> 1e9) -> epoch"""
+    now = now or time.time()
+    match = _DURATION_PATTERN.match(str(value).strip().lower())
+    if not match:
+        raise ValueError(f'Invalid since: {value}')
+    amount = float(match.group(1))
+    if not match.group(2) and amount > 1e9:
+        return amount
+    return now - amount * _DURATION_UNITS[match.group(2)]
+
+
+def register_logs_routes(app, LOG_DIR, config_repo):
+    """Khởi động LogAggregator nền và đăng ký /api/logs/errors"""
+    aggregator = log_aggregator.get_log_aggregator(
+        LOG_DIR, resolver=lambda port: log_aggregator.upstream_from_config(config_repo.load(port)))
+    aggregator.start()
+
+    @app.route('/api/logs/errors')
+    def api_logs_errors():
+        """
+        ?since=15m|2h|<epoch> (mặc định 1h), ?kind=407|timeout|refused|reset|dns|tls|eof|error,
+        ?port=, ?upstream=, ?recent=N (số dòng lỗi gần nhất kèm theo, mặc định 20)
+        """
+        try:
+            since = parse_since(request.args.get('since', DEFAULT_SINCE_SECONDS))
+            recent = int(request.args.get('recent', 20))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        kind = request.args.get('kind') or None
+        port = request.args.get('port') or None
+        upstream = request.args.get('upstream') or None
+
+        summary = aggregator.summary(since=since, kind=kind, port=port, upstream=upstream)
+        errors = aggregator.recent_errors(port=port, kind=kind, since=since, upstream=upstream,
+                                          limit=max(0, recent))
+        return jsonify(dict(summary, success=True, since=since, kind=kind, recent_errors=errors))
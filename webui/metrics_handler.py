@@ -0,0 +1,66 @@
+"""
+Metrics Handler
+Endpoint /metrics (Prometheus text format): latency từng route của web UI, metrics của process này
+(chrome proxy-check, catalog refresh, credentials) và textfile của gost monitor / credential updater
+"""
+
+from flask import Response, g, request
+import os
+import sys
+import time
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import metrics
+
+HTTP_REQUEST_SECONDS = metrics.histogram(
+    'http_request_duration_seconds', 'Latency request của web UI theo route', ('method', 'route', 'status'))
+
+
+def register_metrics_routes(app, BASE_DIR, LOG_DIR, state_store, catalog_files):
+    """
+    Đăng ký /metrics và hook đo latency.
+    catalog_files: {provider: đường dẫn cache} - tuổi catalog lấy theo mtime của file cache
+    """
+    metrics_dir = os.path.join(LOG_DIR, 'metrics')
+
+    @app.before_request
+    def _metrics_start_timer():
+        g._metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _metrics_observe_request(response):
+        started = g.pop('_metrics_started', None)
+        if started is not None:
+            # Dùng rule (vd /api/gost/config/<port>) thay vì path để không nổ cardinality
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method=request.method,
+                                         route=route, status=response.status_code)
+        return response
+
+    def collect_gost_state():
+        restarts = metrics.Counter('gost_restarts_total', 'Số lần monitor restart gost theo port', ('port',))
+        failures = metrics.Gauge('gost_port_failures', 'Số lần probe lỗi liên tiếp hiện tại theo port', ('port',))
+        for port, state in state_store.get_port_states().items():
+            restarts.inc(state.get('restart_count') or 0, port=port)
+            failures.set(state.get('failures') or 0, port=port)
+        return [restarts, failures]
+
+    def collect_catalog_age():
+        age = metrics.Gauge('catalog_age_seconds', 'Tuổi của cache danh sách server theo provider', ('provider',))
+        now = time.time()
+        for provider, path in catalog_files.items():
+            try:
+                age.set(max(0.0, now - os.path.getmtime(path)), provider=provider)
+            except OSError:
+                continue
+        return [age]
+
+    metrics.REGISTRY.register_collector(collect_gost_state)
+    metrics.REGISTRY.register_collector(collect_catalog_age)
+
+    @app.route('/metrics')
+    def api_metrics():
+        """Prometheus scrape endpoint"""
+        body = metrics.REGISTRY.render() + metrics.render_textfiles(metrics_dir)
+        return Response(body, content_type=metrics.CONTENT_TYPE)
@@ -3,25 +3,56 @@ NordVPN API Handler
 Xử lý các API endpoints liên quan đến NordVPN
 """
 
-from flask import request, jsonify
+from flask import request, jsonify, Response
 import sys
 import os
 
 # Add parent directory to path to import modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from nordvpn_api import NordVPNAPI
+from nordvpn_api import NordVPNAPI, NORDVPN_PROXY_PORT
 from proxy_api import ProxyAPI
+from catalog_payloads import CatalogPayloads, negotiate
 
 # Initialize APIs
 nordvpn_api = None
 proxy_api = None
+server_history = None
 
-def register_nordvpn_routes(app, save_gost_config, run_command, trigger_health_check, nordvpn_api_instance, proxy_api_instance):
+# Chọn ngẫu nhiên trong N server xếp hạng cao nhất để các port không dồn vào một server
+RANKED_POOL_SIZE = 5
+
+
+def _format_server(server):
+    """Format thống nhất cho /api/nordvpn/servers/formatted"""
+    return {
+        'name': server.get('name', ''),
+        'hostname': server.get('hostname', ''),
+        'country': server.get('country', {}).get('name', ''),
+        'country_code': server.get('country', {}).get('code', ''),
+        'city': server.get('country', {}).get('city', ''),
+        'ip': server.get('station', ''),
+        'load': server.get('load', 0),
+        'status': '✅ Online' if server.get('status') == 'online' else '❌ Offline',
+        'proxyhost': server.get('hostname', ''),
+        'proxyport': NORDVPN_PROXY_PORT
+    }
+
+
+catalog_payloads = CatalogPayloads(_format_server)
+
+
+def _payload_response(payload):
+    return Response(*negotiate(payload, request.headers.get('Accept-Encoding', ''),
+                               request.headers.get('If-None-Match', '')))
+
+
+def register_nordvpn_routes(app, save_gost_config, run_command, trigger_health_check, nordvpn_api_instance, proxy_api_instance, server_history_instance=None):
     """Đăng ký các routes NordVPN với Flask app"""
-    global nordvpn_api, proxy_api
+    global nordvpn_api, proxy_api, server_history
     nordvpn_api = nordvpn_api_instance
     proxy_api = proxy_api_instance
+    server_history = server_history_instance
     
 
     @app.route('/api/nordvpn/servers/formatted')
@@ -29,37 +60,11 @@ def register_nordvpn_routes(app, save_gost_config, run_command, trigger_health_c
         """Lấy danh sách server NordVPN với format thống nhất"""
         try:
             force_refresh = request.args.get('refresh', 'false').lower() == 'true'
-            country_filter = request.args.get('country', None)
-            servers = nordvpn_api.fetch_servers(force_refresh=force_refresh)
-            
-            # Format lại dữ liệu
-            formatted_servers = []
-            for server in servers:
-                formatted_server = {
-                    'name': server.get('name', ''),
-                    'hostname': server.get('hostname', ''),
-                    'country': server.get('country', {}).get('name', ''),
-                    'country_code': server.get('country', {}).get('code', ''),
-                    'city': server.get('country', {}).get('city', ''),
-                    'ip': server.get('station', ''),
-                    'load': server.get('load', 0),
-                    'status': '✅ Online' if server.get('status') == 'online' else '❌ Offline',
-                    'proxyhost': server.get('hostname', ''),
-                    'proxyport': 89  # NordVPN standard port
-                }
-                
-                # Filter by country if specified
-                if country_filter:
-                    if formatted_server['country_code'].lower() == country_filter.lower():
-                        formatted_servers.append(formatted_server)
-                else:
-                    formatted_servers.append(formatted_server)
-            
-            return jsonify({
-                'success': True,
-                'servers': formatted_servers,
-                'count': len(formatted_servers)
-            })
+            nordvpn_api.fetch_servers(force_refresh=force_refresh)
+            # Format + encode một lần cho mỗi version catalog và mỗi country, sau đó chỉ trả bytes/304
+            snapshot = nordvpn_api.catalog_index()
+            payload = catalog_payloads.formatted(snapshot.servers, snapshot.version, request.args.get('country'))
+            return _payload_response(payload)
         except Exception as e:
             return jsonify({
                 'success': False,
@@ -70,12 +75,13 @@ def register_nordvpn_routes(app, save_gost_config, run_command, trigger_health_c
     def api_nordvpn_countries():
         """Lấy danh sách quốc gia"""
         try:
-            countries = nordvpn_api.get_countries()
-            
-            return jsonify({
+            nordvpn_api.fetch_servers()
+            snapshot = nordvpn_api.catalog_index()
+            payload = catalog_payloads.payload(snapshot.servers, snapshot.version, 'countries', lambda: {
                 'success': True,
-                'countries': countries
+                'countries': nordvpn_api.get_countries()
             })
+            return _payload_response(payload)
         except Exception as e:
             return jsonify({
                 'success': False,
@@ -104,7 +110,7 @@ def register_nordvpn_routes(app, save_gost_config, run_command, trigger_health_c
         """Lấy server tốt nhất"""
         try:
             country_code = request.args.get('country')
-            server = nordvpn_api.get_best_server(country_code)
+            server = nordvpn_api.get_best_server(country_code, history=server_history)
             
             if server:
                 return jsonify({
@@ -140,20 +146,19 @@ def register_nordvpn_routes(app, save_gost_config, run_command, trigger_health_c
                     return jsonify({'success': False, 'error': f'No servers found for country {country_code}'}), 404
                 
                 import random
-                server = random.choice(servers)
+                online_servers = [s for s in servers if s.get('status') == 'online'] or servers
+                ranked = nordvpn_api.rank_servers(online_servers, server_history)
+                server = random.choice(ranked[:RANKED_POOL_SIZE])
                 proxy_host = server.get('hostname', '')
                 proxy_port = 89  # NordVPN standard port
                 server_name = server.get('name', '')
                 
             elif proxy_host and proxy_port:
                 # Case 2: proxy_host and proxy_port provided - use directly
-                # Find server by proxy_host to get server info
-                all_servers = nordvpn_api.get_all_servers()
-                server = None
-                for s in all_servers:
-                    if s.get('hostname', '').lower() == proxy_host.lower():
-                        server = s
-                        break
+                # Find server by proxy_host to get server info (index name/hostname, không decode cả catalog)
+                server = nordvpn_api.get_server_by_name(proxy_host)
+                if server and (server.get('hostname') or '').lower() != proxy_host.strip().lower():
+                    server = None
                 
                 if not server:
                     return jsonify({'success': False, 'error': f'Server with hostname {proxy_host} not found'}), 404
@@ -212,7 +217,9 @@ def register_nordvpn_routes(app, save_gost_config, run_command, trigger_health_c
                     available_servers = all_servers
                 
                 import random
-                server = random.choice(available_servers)
+                online_servers = [s for s in available_servers if s.get('status') == 'online'] or available_servers
+                ranked = nordvpn_api.rank_servers(online_servers, server_history)
+                server = random.choice(ranked[:RANKED_POOL_SIZE])
                 proxy_host = server.get('hostname', '')
                 proxy_port = 89  # NordVPN standard port
                 server_name = server.get('name', '')
@@ -3,7 +3,7 @@ ProtonVPN API Handler
 Xử lý các API endpoints liên quan đến ProtonVPN
 """
 
-from flask import request, jsonify
+from flask import request, jsonify, Response
 import sys
 import os
 
@@ -12,6 +12,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from protonvpn_api import ProtonVPNAPI
 from proxy_api import ProxyAPI
+from catalog_payloads import CatalogPayloads, negotiate
 
 # Import protonvpn_service để lấy credentials
 try:
@@ -22,12 +23,48 @@ except ImportError:
 # Initialize APIs
 protonvpn_api = None
 proxy_api = None
+server_history = None
 
-def register_protonvpn_routes(app, save_gost_config, run_command, trigger_health_check, protonvpn_api_instance, proxy_api_instance):
+
+def _format_server(server):
+    """Format thống nhất cho /api/protonvpn/servers/formatted"""
+    # Tính proxy port từ label
+    proxy_port = 4443
+    if 'servers' in server and len(server['servers']) > 0:
+        try:
+            label = int(server['servers'][0].get('label', '0'))
+            proxy_port = 4443 + label
+        except (ValueError, TypeError):
+            pass
+
+    return {
+        'name': server.get('name', ''),
+        'hostname': server.get('domain', ''),
+        'country': server.get('country_name', ''),
+        'country_code': server.get('country_code', ''),
+        'city': server.get('city', ''),
+        'ip': server.get('entry_ip', ''),
+        'load': server.get('load', 0),
+        'status': '✅ Online' if server.get('load', 0) < 100 else '❌ Offline',
+        'proxyhost': server.get('domain', ''),
+        'proxyport': proxy_port
+    }
+
+
+catalog_payloads = CatalogPayloads(_format_server)
+
+
+def _payload_response(payload):
+    return Response(*negotiate(payload, request.headers.get('Accept-Encoding', ''),
+                               request.headers.get('If-None-Match', '')))
+
+
+def register_protonvpn_routes(app, save_gost_config, run_command, trigger_health_check, protonvpn_api_instance, proxy_api_instance, server_history_instance=None):
     """Đăng ký các routes ProtonVPN với Flask app"""
-    global protonvpn_api, proxy_api
+    global protonvpn_api, proxy_api, server_history
     protonvpn_api = protonvpn_api_instance
     proxy_api = proxy_api_instance
+    server_history = server_history_instance
     
 
     @app.route('/api/protonvpn/servers/formatted')
@@ -41,46 +78,11 @@ def register_protonvpn_routes(app, save_gost_config, run_command, trigger_health
                 }), 400
             
             force_refresh = request.args.get('refresh', 'false').lower() == 'true'
-            country_filter = request.args.get('country', None)
-            servers = protonvpn_api.fetch_servers(force_refresh=force_refresh)
-            
-            # Format lại dữ liệu
-            formatted_servers = []
-            for server in servers:
-                # Tính proxy port từ label
-                proxy_port = 4443
-                if 'servers' in server and len(server['servers']) > 0:
-                    try:
-                        label = int(server['servers'][0].get('label', '0'))
-                        proxy_port = 4443 + label
-                    except (ValueError, TypeError):
-                        pass
-                
-                formatted_server = {
-                    'name': server.get('name', ''),
-                    'hostname': server.get('domain', ''),
-                    'country': server.get('country_name', ''),
-                    'country_code': server.get('country_code', ''),
-                    'city': server.get('city', ''),
-                    'ip': server.get('entry_ip', ''),
-                    'load': server.get('load', 0),
-                    'status': '✅ Online' if server.get('load', 0) < 100 else '❌ Offline',
-                    'proxyhost': server.get('domain', ''),
-                    'proxyport': proxy_port
-                }
-                
-                # Filter by country if specified
-                if country_filter:
-                    if formatted_server['country_code'].lower() == country_filter.lower():
-                        formatted_servers.append(formatted_server)
-                else:
-                    formatted_servers.append(formatted_server)
-            
-            return jsonify({
-                'success': True,
-                'servers': formatted_servers,
-                'count': len(formatted_servers)
-            })
+            protonvpn_api.fetch_servers(force_refresh=force_refresh)
+            # Format + encode một lần cho mỗi version catalog và mỗi country, sau đó chỉ trả bytes/304
+            snapshot = protonvpn_api.catalog_index()
+            payload = catalog_payloads.formatted(snapshot.servers, snapshot.version, request.args.get('country'))
+            return _payload_response(payload)
         except Exception as e:
             return jsonify({
                 'success': False,
@@ -97,11 +99,13 @@ def register_protonvpn_routes(app, save_gost_config, run_command, trigger_health
                     'error': 'ProtonVPN API not configured'
                 }), 400
             
-            countries = protonvpn_api.get_countries()
-            return jsonify({
+            protonvpn_api.fetch_servers()
+            snapshot = protonvpn_api.catalog_index()
+            payload = catalog_payloads.payload(snapshot.servers, snapshot.version, 'countries', lambda: {
                 'success': True,
-                'countries': countries
+                'countries': protonvpn_api.get_countries()
             })
+            return _payload_response(payload)
         except Exception as e:
             return jsonify({
                 'success': False,
@@ -143,7 +147,7 @@ def register_protonvpn_routes(app, save_gost_config, run_command, trigger_health
             
             country_code = request.args.get('country')
             tier = request.args.get('tier', type=int)
-            server = protonvpn_api.get_best_server(country_code, tier)
+            server = protonvpn_api.get_best_server(country_code, tier, history=server_history)
             
             if server:
                 return jsonify({
@@ -262,7 +266,7 @@ def register_protonvpn_routes(app, save_gost_config, run_command, trigger_health
             if country_code and not proxy_host and not proxy_port:
                 # Case 1: Only country_code provided - get best server from country (tối ưu)
                 # Sử dụng get_best_server để chọn server tốt nhất thay vì random
-                server = protonvpn_api.get_best_server(country_code=country_code)
+                server = protonvpn_api.get_best_server(country_code=country_code, history=server_history)
                 if not server:
                     # Fallback: lấy danh sách servers và chọn tốt nhất
                     servers = protonvpn_api.get_servers_by_country(country_code)
@@ -274,8 +278,7 @@ def register_protonvpn_routes(app, save_gost_config, run_command, trigger_health
                     if not online_servers:
                         online_servers = servers
                     
-                    online_servers.sort(key=lambda x: (x.get('load', 100), -x.get('score', 0)))
-                    server = online_servers[0]
+                    server = protonvpn_api.rank_servers(online_servers, server_history)[0]
                     print(f"✅ Selected best server for {country_code}: {server.get('domain', 'unknown')} (load: {server.get('load', 'N/A')}, score: {server.get('score', 'N/A')})")
                 proxy_host = server.get('domain', '')
                 # Calculate proxy port from label
@@ -290,13 +293,10 @@ def register_protonvpn_routes(app, save_gost_config, run_command, trigger_health
                 
             elif proxy_host and proxy_port:
                 # Case 2: proxy_host and proxy_port provided - use directly
-                # Find server by proxy_host to get server info
-                all_servers = protonvpn_api.get_all_servers()
-                server = None
-                for s in all_servers:
-                    if s.get('domain', '').lower() == proxy_host.lower():
-                        server = s
-                        break
+                # Find server by proxy_host to get server info (index name/domain, không decode cả catalog)
+                server = protonvpn_api.get_server_by_name(proxy_host)
+                if server and (server.get('domain') or '').lower() != proxy_host.strip().lower():
+                    server = None
                 
                 if not server:
                     return jsonify({'success': False, 'error': f'Server with domain {proxy_host} not found'}), 404
@@ -368,14 +368,8 @@ def register_protonvpn_routes(app, save_gost_config, run_command, trigger_health
                     if not online_servers:
                         online_servers = available_servers  # Fallback nếu không có online
                     
-                    # Sắp xếp theo load thấp nhất, nếu load bằng nhau thì theo score cao nhất
-                    online_servers.sort(key=lambda x: (
-                        x.get('load', 100),  # Load thấp nhất trước
-                        -x.get('score', 0)   # Score cao nhất sau
-                    ))
-                    
-                    # Chọn server tốt nhất (load thấp nhất, score cao nhất)
-                    server = online_servers[0]
+                    # Sắp xếp theo quality score đo được (server_history), rồi load thấp nhất, score cao nhất
+                    server = protonvpn_api.rank_servers(online_servers, server_history)[0]
                     print(f"✅ Selected best server: {server.get('domain', 'unknown')} (load: {server.get('load', 'N/A')}, score: {server.get('score', 'N/A')})")
                 else:
                     import random
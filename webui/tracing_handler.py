@@ -0,0 +1,63 @@
+"""
+Tracing Handler
+Mỗi request là một trace (trace id trả về ở header X-Trace-Id, nhận lại nếu client gửi lên)
+và /api/debug/traces để xem các trace chậm gần nhất cùng thời gian từng span
+(giới hạn localhost / X-Debug-Token như các route /api/debug/ khác)
+"""
+
+from flask import request, jsonify, g
+import os
+import re
+import sys
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import tracing
+from debug_handler import debug_guarded
+
+_TRACE_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+def register_tracing_routes(app):
+    """Đăng ký hook tracing và /api/debug/traces"""
+
+    @app.before_request
+    def _tracing_start():
+        incoming = request.headers.get(tracing.TRACE_HEADER, '')
+        rule = request.url_rule.rule if request.url_rule is not None else request.path
+        trace = tracing.start_trace(f"{request.method} {rule}",
+                                    incoming if _TRACE_ID_PATTERN.match(incoming) else None)
+        g.trace_id = trace.trace_id
+
+    @app.after_request
+    def _tracing_finish(response):
+        if 'trace_id' in g:
+            response.headers[tracing.TRACE_HEADER] = g.trace_id
+        tracing.finish_trace(response.status_code)
+        return response
+
+    @app.teardown_request
+    def _tracing_teardown(exc):
+        # Exception không được handle -> after_request không chạy
+        if exc is not None:
+            tracing.finish_trace(500)
+
+    @app.route('/api/debug/traces')
+    @debug_guarded
+    def api_debug_traces():
+        """
+        Các trace chậm gần nhất (>= TRACE_SLOW_MS), mới nhất trước.
+        ?limit=20, ?trace_id=<id>, ?min_ms=<ngưỡng cao hơn>
+        """
+        try:
+            limit = int(request.args.get('limit', 20))
+            min_ms = float(request.args['min_ms']) if 'min_ms' in request.args else None
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Invalid limit/min_ms'}), 400
+        return jsonify({
+            'success': True,
+            'slow_threshold_ms': tracing.BUFFER.slow_ms,
+            'capacity': tracing.BUFFER.capacity,
+            'traces': tracing.BUFFER.list(limit=max(1, limit), trace_id=request.args.get('trace_id'),
+                                          min_ms=min_ms)
+        })